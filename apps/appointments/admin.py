@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import DoctorWorkingHours
 
-# Register your models here.
+@admin.register(DoctorWorkingHours)
+class DoctorWorkingHoursAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'weekday', 'start_time', 'end_time']
+    list_filter = ['weekday']
+    list_select_related = ['doctor']
@@ -4,4 +4,7 @@ class AppointmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.appointments'
     label = 'appointments'
-    verbose_name = 'Appointments'
\ No newline at end of file
+    verbose_name = 'Appointments'
+
+    def ready(self):
+        import apps.appointments.signals
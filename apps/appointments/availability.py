@@ -0,0 +1,212 @@
+"""
+Slot-availability engine for doctors.
+
+Each doctor's day is divided into fixed-length slots and summarised as an
+integer bitmap where bit ``i`` is set when slot ``i`` can still be booked.
+Bitmaps are built from the doctor's working-hours template, unavailability
+entries and active appointments, cached per (doctor, day), and rebuilt for
+the affected day only whenever one of those rows changes (see signals.py).
+Booking validation and the free-slots endpoint read a single cached integer
+per day instead of querying the tables.
+
+The cache is only used when ``AVAILABILITY_CACHE_ENABLED`` is set, which
+requires a cache shared by every process: a per-process cache would only
+be refreshed in the process that handled the write, and the others would
+keep accepting bookings on days that were just blocked. Without it the
+bitmaps are built from the database on every read.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+SLOT_MINUTES = getattr(settings, 'APPOINTMENT_SLOT_MINUTES', 30)
+SLOTS_PER_DAY = (24 * 60) // SLOT_MINUTES
+BOOKING_WINDOW_DAYS = 30
+
+# Appointments in these states occupy their slot
+ACTIVE_STATUSES = ('pending', 'confirmed', 'scheduled')
+
+CACHE_ENABLED = getattr(settings, 'AVAILABILITY_CACHE_ENABLED', False)
+
+# Days drop out of the window after a month, so keys can expire on their own
+CACHE_TIMEOUT = 60 * 60 * 24 * (BOOKING_WINDOW_DAYS + 1)
+
+
+def _cache_key(doctor_id, day):
+    return f'availability:{doctor_id}:{day.isoformat()}'
+
+
+def _parse_time(value):
+    if isinstance(value, time):
+        return value
+    hours, minutes = value.split(':')
+    return time(int(hours), int(minutes))
+
+
+def _range_mask(start, end):
+    """Bitmap of the slots lying completely inside [start, end)."""
+    start, end = _parse_time(start), _parse_time(end)
+    first = -(-(start.hour * 60 + start.minute) // SLOT_MINUTES)
+    last = (end.hour * 60 + end.minute) // SLOT_MINUTES
+    if last <= first:
+        return 0
+    return ((1 << last) - 1) & ~((1 << first) - 1)
+
+
+def _default_templates():
+    """Weekday -> bitmap for doctors without their own working hours."""
+    templates = {}
+    for weekday, ranges in getattr(settings, 'APPOINTMENT_WORKING_HOURS', {}).items():
+        for start, end in ranges:
+            templates[int(weekday)] = templates.get(int(weekday), 0) | _range_mask(start, end)
+    return templates
+
+
+def _working_templates(doctor_id):
+    from .models import DoctorWorkingHours
+
+    templates = {}
+    rows = DoctorWorkingHours.objects.filter(doctor_id=doctor_id).values_list(
+        'weekday', 'start_time', 'end_time'
+    )
+    for weekday, start, end in rows:
+        templates[weekday] = templates.get(weekday, 0) | _range_mask(start, end)
+    return templates or _default_templates()
+
+
+def slot_index(value):
+    """Index of the slot containing the aware datetime ``value``."""
+    local = timezone.localtime(value)
+    return (local.hour * 60 + local.minute) // SLOT_MINUTES
+
+
+def slot_start(day, index):
+    """Aware datetime at which slot ``index`` of ``day`` begins."""
+    minutes = index * SLOT_MINUTES
+    return timezone.make_aware(datetime.combine(day, time(minutes // 60, minutes % 60)))
+
+
+def booking_window(today=None):
+    """Every day a patient may currently book, today included."""
+    today = today or timezone.localdate()
+    return [today + timedelta(days=offset) for offset in range(BOOKING_WINDOW_DAYS + 1)]
+
+
+def _build_days(doctor_id, days):
+    """Compute bitmaps for ``days`` from the database (three range queries)."""
+    from .models import Appointment, DoctorUnavailability
+
+    first, last = min(days), max(days)
+    templates = _working_templates(doctor_id)
+
+    blocked = set()
+    intervals = DoctorUnavailability.objects.filter(doctor_id=doctor_id).overlapping(first, last)
+    for start_date, end_date in intervals.values_list('start_date', 'end_date'):
+        day = max(start_date, first)
+        while day <= min(end_date, last):
+            blocked.add(day)
+            day += timedelta(days=1)
+
+    booked = {}
+    appointment_dates = Appointment.objects.filter(
+        doctor_id=doctor_id,
+        status__in=ACTIVE_STATUSES,
+        appointment_date__gte=slot_start(first, 0),
+        appointment_date__lt=slot_start(last + timedelta(days=1), 0),
+    ).values_list('appointment_date', flat=True)
+    for appointment_date in appointment_dates:
+        day = timezone.localtime(appointment_date).date()
+        booked[day] = booked.get(day, 0) | (1 << slot_index(appointment_date))
+
+    bitmaps = {}
+    for day in days:
+        if day in blocked:
+            bitmaps[day] = 0
+        else:
+            bitmaps[day] = templates.get(day.weekday(), 0) & ~booked.get(day, 0)
+    return bitmaps
+
+
+def get_day_bitmaps(doctor_id, days):
+    """Return {day: bitmap}, building and caching any days not yet cached."""
+    if not CACHE_ENABLED:
+        return _build_days(doctor_id, days)
+    keys = {_cache_key(doctor_id, day): day for day in days}
+    bitmaps = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+
+    missing = [day for day in days if day not in bitmaps]
+    if missing:
+        built = _build_days(doctor_id, missing)
+        for day, value in built.items():
+            # add() never replaces a bitmap that a refresh_days() after a
+            # concurrent write stored while these were being read
+            cache.add(_cache_key(doctor_id, day), value, CACHE_TIMEOUT)
+        bitmaps.update(built)
+    return bitmaps
+
+
+def refresh_days(doctor_id, days):
+    """Rebuild the cached bitmaps of the given days after a write."""
+    days = sorted(set(days))
+    if not CACHE_ENABLED or not days:
+        return
+    built = _build_days(doctor_id, days)
+    cache.set_many({_cache_key(doctor_id, day): value for day, value in built.items()}, CACHE_TIMEOUT)
+
+
+def refresh_window(doctor_id):
+    """Rebuild every day of the booking window, e.g. after new working hours."""
+    refresh_days(doctor_id, booking_window())
+
+
+def is_slot_free(doctor_id, when):
+    day = timezone.localtime(when).date()
+    bitmap = get_day_bitmaps(doctor_id, [day])[day]
+    return bool(bitmap >> slot_index(when) & 1)
+
+
+def check_slot(doctor_id, when):
+    """Raise ValidationError if the slot containing ``when`` cannot be booked."""
+    if is_slot_free(doctor_id, when):
+        return
+
+    # Only the failure path pays for working out why the slot is taken
+    from .models import DoctorUnavailability
+
+    day = timezone.localtime(when).date()
+    entry = DoctorUnavailability.objects.filter(doctor_id=doctor_id).overlapping(day, day).first()
+    if entry:
+        message = f"Doctor is not available on {day}"
+        if entry.reason:
+            message += f" ({entry.reason})"
+        raise ValidationError(message)
+
+    if not _working_templates(doctor_id).get(day.weekday(), 0) >> slot_index(when) & 1:
+        raise ValidationError('Doctor does not see patients at the selected time.')
+
+    raise ValidationError('This time slot is already booked. Please choose another time.')
+
+
+def free_slots(doctor_id, days=None):
+    """Return {day: [slot start datetimes]} for the open slots of ``days``."""
+    days = days or booking_window()
+    now = timezone.now()
+    bitmaps = get_day_bitmaps(doctor_id, days)
+
+    slots = {}
+    for day in days:
+        bitmap = bitmaps[day]
+        starts = []
+        index = 0
+        while bitmap:
+            if bitmap & 1:
+                start = slot_start(day, index)
+                if start > now:
+                    starts.append(start)
+            bitmap >>= 1
+            index += 1
+        slots[day] = starts
+    return slots
@@ -73,33 +73,20 @@ class AppointmentForm(forms.ModelForm):
         
         return appointment_date
 
-    # ADD THIS CLEAN METHOD FOR DOCTOR UNAVAILABILITY VALIDATION
-    def clean(self):
-        cleaned_data = super().clean()
-        doctor = cleaned_data.get('doctor')
-        appointment_date = cleaned_data.get('appointment_date')
-        
-        if doctor and appointment_date:
-            # Check if doctor is unavailable on this date
-            unavailable_dates = DoctorUnavailability.objects.filter(
-                doctor=doctor,
-                unavailable_date=appointment_date.date()
-            )
-            if unavailable_dates.exists():
-                reason = unavailable_dates.first().reason
-                error_msg = f"Doctor is not available on {appointment_date.date()}"
-                if reason:
-                    error_msg += f" ({reason})"
-                raise forms.ValidationError(error_msg)
-        
-        return cleaned_data
-
 class DoctorUnavailabilityForm(forms.ModelForm):
+    MAX_RANGE_DAYS = 365
+    
+    end_date = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control', 'min': ''}),
+        help_text="Leave empty to block a single day",
+    )
+    
     class Meta:
         model = DoctorUnavailability
-        fields = ['unavailable_date', 'reason']
+        fields = ['start_date', 'end_date', 'reason']
         widgets = {
-            'unavailable_date': forms.DateInput(attrs={
+            'start_date': forms.DateInput(attrs={
                 'type': 'date',
                 'class': 'form-control',
                 'min': '',  # Will be set via JavaScript
@@ -113,16 +100,29 @@ class DoctorUnavailabilityForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Set min date to today
-        from django.utils import timezone
         min_date = timezone.now().strftime('%Y-%m-%d')
-        self.fields['unavailable_date'].widget.attrs['min'] = min_date
+        self.fields['start_date'].widget.attrs['min'] = min_date
+        self.fields['end_date'].widget.attrs['min'] = min_date
     
-    def clean_unavailable_date(self):
-        unavailable_date = self.cleaned_data.get('unavailable_date')
+    def clean_start_date(self):
+        start_date = self.cleaned_data.get('start_date')
         
-        if unavailable_date:
-            from django.utils import timezone
-            if unavailable_date < timezone.now().date():
-                raise forms.ValidationError("Cannot mark past dates as unavailable.")
+        if start_date and start_date < timezone.now().date():
+            raise forms.ValidationError("Cannot mark past dates as unavailable.")
         
-        return unavailable_date
\ No newline at end of file
+        return start_date
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        
+        if start_date:
+            if not end_date:
+                end_date = cleaned_data['end_date'] = start_date
+            if end_date < start_date:
+                self.add_error('end_date', "End date cannot be before the start date.")
+            elif (end_date - start_date).days >= self.MAX_RANGE_DAYS:
+                self.add_error('end_date', f"A single entry cannot span more than {self.MAX_RANGE_DAYS} days.")
+        
+        return cleaned_data
@@ -0,0 +1,107 @@
+import threading
+from datetime import time, timedelta
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.appointments import availability, reservations
+from apps.appointments.models import Appointment, DoctorWorkingHours
+from healthcare.benchmarking import percentile, scratch_database
+
+
+class Command(BaseCommand):
+    help = "Fire simultaneous bookings at one doctor and check for double bookings (uses a scratch database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=200, help='Concurrent booking threads')
+        parser.add_argument('--slots', type=int, default=8, help='Distinct slots the patients compete for')
+        parser.add_argument(
+            '--without-reservations', action='store_true',
+            help='Save appointments directly, as before slot reservations existed',
+        )
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.run(options['patients'], options['slots'], options['without_reservations'])
+
+    def run(self, patient_count, slot_count, without_reservations):
+        doctor = User.objects.create_user('bench_doctor', last_name='Bench')
+        doctor.profile.user_type = 'doctor'
+        doctor.profile.status = 'approved'
+        doctor.profile.save()
+        patients = User.objects.bulk_create(
+            [User(username=f'bench_patient_{i}') for i in range(patient_count)]
+        )
+
+        day = timezone.localdate() + timedelta(days=1)
+        DoctorWorkingHours.objects.create(doctor=doctor, weekday=day.weekday(), start_time=time(0, 0), end_time=time(23, 59))
+        open_slots = availability.free_slots(doctor.id, [day])[day][:slot_count]
+        connection.close()
+
+        barrier = threading.Barrier(patient_count)
+        results = {'booked': 0, 'rejected': 0, 'errors': 0}
+        latencies = []
+        lock = threading.Lock()
+
+        def attempt(index):
+            appointment = Appointment(
+                patient_id=patients[index].id,
+                doctor_id=doctor.id,
+                appointment_date=open_slots[index % len(open_slots)],
+                status='pending',
+                reason='Benchmark',
+            )
+            barrier.wait()
+            started = perf_counter()
+            try:
+                if without_reservations:
+                    appointment.save()
+                else:
+                    reservations.book(appointment)
+                outcome = 'booked'
+            except (reservations.SlotTaken, ValidationError):
+                outcome = 'rejected'
+            except Exception as exc:
+                self.stderr.write(f'{type(exc).__name__}: {exc}')
+                outcome = 'errors'
+            finally:
+                connections.close_all()
+            with lock:
+                results[outcome] += 1
+                latencies.append(perf_counter() - started)
+
+        threads = [threading.Thread(target=attempt, args=(i,)) for i in range(patient_count)]
+        started = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - started
+
+        double_booked = (
+            Appointment.objects.filter(doctor=doctor, status__in=availability.ACTIVE_STATUSES)
+            .values('appointment_date')
+            .annotate(bookings=Count('id'))
+            .filter(bookings__gt=1)
+            .count()
+        )
+
+        self.stdout.write(f"Database:        {connection.vendor}")
+        self.stdout.write(f"Mode:            {'direct save' if without_reservations else 'slot reservations'}")
+        self.stdout.write(f"Attempts:        {patient_count} on {len(open_slots)} slot(s)")
+        self.stdout.write(f"Booked:          {results['booked']}")
+        self.stdout.write(f"Rejected:        {results['rejected']}")
+        self.stdout.write(f"Errors:          {results['errors']}")
+        self.stdout.write(f"Elapsed:         {elapsed:.3f}s")
+        self.stdout.write(f"Throughput:      {patient_count / elapsed:.1f} bookings/s")
+        self.stdout.write(f"p50 / p99:       {percentile(latencies, 0.5) * 1000:.1f}ms / {percentile(latencies, 0.99) * 1000:.1f}ms")
+
+        if double_booked:
+            self.stdout.write(self.style.ERROR(f"Double-booked slots: {double_booked}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Double-booked slots: 0"))
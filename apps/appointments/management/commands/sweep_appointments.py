@@ -0,0 +1,62 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from apps.appointments.models import Appointment
+
+# Target status -> statuses swept into it once the appointment has passed
+SWEEPS = (
+    ('expired', ('pending',)),
+    ('completed', ('confirmed', 'scheduled')),
+)
+
+
+class Command(BaseCommand):
+    help = "Expire unconfirmed and complete confirmed appointments whose date has passed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows moved per transaction')
+        parser.add_argument(
+            '--grace-minutes', type=int, default=60,
+            help='How long after its start an appointment is considered stale',
+        )
+        parser.add_argument('--daemon', action='store_true', help='Keep running and sweep every --interval seconds')
+        parser.add_argument('--interval', type=int, default=300, help='Seconds between sweeps in daemon mode')
+
+    def handle(self, *args, **options):
+        if not options['daemon']:
+            self.sweep(options['batch_size'], options['grace_minutes'])
+            return
+
+        self.stdout.write(f"Sweeping stale appointments every {options['interval']}s")
+        try:
+            while True:
+                close_old_connections()
+                self.sweep(options['batch_size'], options['grace_minutes'])
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Sweeper stopped.")
+
+    def sweep(self, batch_size, grace_minutes):
+        cutoff = timezone.now() - timedelta(minutes=grace_minutes)
+
+        for new_status, from_statuses in SWEEPS:
+            total = 0
+            while True:
+                # Index range scan on (status, appointment_date), oldest first
+                batch = list(
+                    Appointment.objects.filter(status__in=from_statuses, appointment_date__lt=cutoff)
+                    .order_by('appointment_date')
+                    .values_list('id', flat=True)[:batch_size]
+                )
+                if not batch:
+                    break
+                total += len(Appointment.objects.filter(id__in=batch).transition(new_status))
+                if len(batch) < batch_size:
+                    break
+
+            if total:
+                self.stdout.write(f"{total} appointment(s) marked {new_status}.")
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def reserve_existing_slots(apps, schema_editor):
+    """Create confirmed reservations for upcoming active appointments."""
+    Appointment = apps.get_model('appointments', 'Appointment')
+    SlotReservation = apps.get_model('appointments', 'SlotReservation')
+    slot_minutes = getattr(settings, 'APPOINTMENT_SLOT_MINUTES', 30)
+
+    seen = set()
+    reservations = []
+    upcoming = Appointment.objects.filter(
+        status__in=['pending', 'confirmed', 'scheduled'],
+        appointment_date__gte=timezone.now(),
+    ).order_by('created_at')
+    for appointment in upcoming.iterator():
+        local = timezone.localtime(appointment.appointment_date)
+        minutes = (local.hour * 60 + local.minute) // slot_minutes * slot_minutes
+        start = local.replace(hour=minutes // 60, minute=minutes % 60, second=0, microsecond=0)
+        # Historic double bookings keep the earliest appointment's claim
+        if (appointment.doctor_id, start) in seen:
+            continue
+        seen.add((appointment.doctor_id, start))
+        reservations.append(SlotReservation(
+            doctor_id=appointment.doctor_id,
+            slot_start=start,
+            patient_id=appointment.patient_id,
+            appointment_id=appointment.id,
+        ))
+    SlotReservation.objects.bulk_create(reservations, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_doctorworkinghours'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_start', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(blank=True, help_text='Hold expiry; empty once confirmed', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('appointment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservation', to='appointments.appointment')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_reservations', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'slot_start'), name='unique_doctor_slot')],
+            },
+        ),
+        migrations.RunPython(reserve_existing_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def dates_to_intervals(apps, schema_editor):
+    """Collapse runs of consecutive single-day entries with the same reason."""
+    DoctorUnavailability = apps.get_model('appointments', 'DoctorUnavailability')
+
+    current = None
+    redundant = []
+    for entry in DoctorUnavailability.objects.order_by('doctor_id', 'unavailable_date').iterator():
+        if (
+            current is not None
+            and entry.doctor_id == current.doctor_id
+            and entry.reason == current.reason
+            and entry.unavailable_date == current.end_date + timedelta(days=1)
+        ):
+            current.end_date = entry.unavailable_date
+            redundant.append(entry.pk)
+            continue
+        if current is not None:
+            current.save(update_fields=['start_date', 'end_date'])
+        current = entry
+        current.start_date = current.end_date = entry.unavailable_date
+    if current is not None:
+        current.save(update_fields=['start_date', 'end_date'])
+
+    DoctorUnavailability.objects.filter(pk__in=redundant).delete()
+
+
+def intervals_to_dates(apps, schema_editor):
+    DoctorUnavailability = apps.get_model('appointments', 'DoctorUnavailability')
+
+    for entry in DoctorUnavailability.objects.filter(end_date__gt=models.F('start_date')).iterator():
+        day = entry.start_date + timedelta(days=1)
+        while day <= entry.end_date:
+            DoctorUnavailability.objects.create(
+                doctor_id=entry.doctor_id,
+                unavailable_date=day,
+                start_date=day,
+                end_date=day,
+                reason=entry.reason,
+            )
+            day += timedelta(days=1)
+    DoctorUnavailability.objects.update(unavailable_date=models.F('start_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_slotreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorunavailability',
+            name='start_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='doctorunavailability',
+            name='end_date',
+            field=models.DateField(null=True, help_text='Last unavailable day (inclusive)'),
+        ),
+        migrations.AlterField(
+            model_name='doctorunavailability',
+            name='unavailable_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(dates_to_intervals, intervals_to_dates),
+        migrations.AlterUniqueTogether(
+            name='doctorunavailability',
+            unique_together=set(),
+        ),
+        migrations.RemoveField(
+            model_name='doctorunavailability',
+            name='unavailable_date',
+        ),
+        migrations.AlterField(
+            model_name='doctorunavailability',
+            name='start_date',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='doctorunavailability',
+            name='end_date',
+            field=models.DateField(help_text='Last unavailable day (inclusive)'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorunavailability',
+            index=models.Index(fields=['doctor', 'end_date', 'start_date'], name='unavailability_overlap_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorunavailability',
+            constraint=models.CheckConstraint(condition=models.Q(end_date__gte=models.F('start_date')), name='unavailability_end_after_start'),
+        ),
+    ]
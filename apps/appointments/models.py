@@ -1,22 +1,115 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import timedelta
+from .availability import ACTIVE_STATUSES, check_slot, refresh_days
+
+class DoctorUnavailabilityQuerySet(models.QuerySet):
+    def overlapping(self, start_date, end_date):
+        """Entries sharing at least one day with [start_date, end_date]"""
+        return self.filter(start_date__lte=end_date, end_date__gte=start_date)
 
 class DoctorUnavailability(models.Model):
     doctor = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'profile__user_type': 'doctor'})
-    unavailable_date = models.DateField()
+    start_date = models.DateField()
+    end_date = models.DateField(help_text="Last unavailable day (inclusive)")
     reason = models.CharField(max_length=200, blank=True, help_text="Reason for unavailability (e.g., Vacation, Leave)")
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = DoctorUnavailabilityQuerySet.as_manager()
+    
     class Meta:
         app_label = 'appointments'
-        unique_together = ['doctor', 'unavailable_date']
         verbose_name_plural = 'Doctor Unavailabilities'
+        indexes = [models.Index(fields=['doctor', 'end_date', 'start_date'], name='unavailability_overlap_idx')]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(end_date__gte=models.F('start_date')), name='unavailability_end_after_start'),
+        ]
+    
+    def __str__(self):
+        return f"Dr. {self.doctor.last_name} - {self.start_date} to {self.end_date} - {self.reason}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the blocked range so an edit can also free the days it no longer covers
+        instance._loaded_range = tuple(instance.__dict__.get(name) for name in ('doctor_id', 'start_date', 'end_date'))
+        return instance
+    
+    def days(self):
+        return [self.start_date + timedelta(days=offset) for offset in range((self.end_date - self.start_date).days + 1)]
+
+class DoctorWorkingHours(models.Model):
+    WEEKDAY_CHOICES = (
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    )
+    
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='working_hours', limit_choices_to={'profile__user_type': 'doctor'})
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    
+    class Meta:
+        app_label = 'appointments'
+        ordering = ['doctor', 'weekday', 'start_time']
+        indexes = [models.Index(fields=['doctor', 'weekday'])]
+        verbose_name_plural = 'Doctor Working Hours'
     
     def __str__(self):
-        return f"Dr. {self.doctor.last_name} - {self.unavailable_date} - {self.reason}"
+        return f"Dr. {self.doctor.last_name} - {self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+    
+    def clean(self):
+        if self.start_time and self.end_time and self.start_time >= self.end_time:
+            raise ValidationError('End time must be after start time.')
+
+class AppointmentQuerySet(models.QuerySet):
+    def transition(self, new_status):
+        """
+        Move every appointment in this queryset that may go to ``new_status``.
+        
+        One locking SELECT collects the affected rows and one UPDATE moves
+        them; the allowed source states are part of the UPDATE's WHERE
+        clause. Booking-time validation (past dates, availability) does not
+        apply to status changes and is skipped. Returns the moved rows as
+        (id, doctor_id, appointment_date) tuples.
+        """
+        allowed_from = Appointment.ALLOWED_TRANSITIONS.get(new_status, ())
+        with transaction.atomic():
+            moved = list(
+                self.filter(status__in=allowed_from)
+                .select_for_update()
+                .values_list('id', 'doctor_id', 'appointment_date')
+            )
+            if moved:
+                Appointment.objects.filter(
+                    id__in=[row[0] for row in moved],
+                    status__in=allowed_from,
+                ).update(status=new_status, updated_at=timezone.now())
+                if new_status not in ACTIVE_STATUSES:
+                    _release_slots(moved)
+        return moved
+
+def _release_slots(moved):
+    """Free the slots of appointments that stopped occupying them."""
+    from .reservations import release
+    
+    release([appointment_id for appointment_id, _, _ in moved])
+    today = timezone.localdate()
+    days = {}
+    for _, doctor_id, appointment_date in moved:
+        day = timezone.localtime(appointment_date).date()
+        # Past days are never offered for booking, so their bitmaps don't matter
+        if day >= today:
+            days.setdefault(doctor_id, set()).add(day)
+    for doctor_id, doctor_days in days.items():
+        transaction.on_commit(lambda doctor_id=doctor_id, doctor_days=doctor_days: refresh_days(doctor_id, doctor_days))
 
 class Appointment(models.Model):
     STATUS_CHOICES = (
@@ -25,8 +118,17 @@ class Appointment(models.Model):
         ('scheduled', 'Scheduled'),  # For backward compatibility
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
+        ('expired', 'Expired'),  # Never confirmed before its date passed
     )
     
+    # Target status -> statuses it may be reached from
+    ALLOWED_TRANSITIONS = {
+        'confirmed': ('pending', 'scheduled'),
+        'completed': ('confirmed', 'scheduled'),
+        'cancelled': ('pending', 'confirmed', 'scheduled'),
+        'expired': ('pending',),
+    }
+    
     patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='patient_appointments')
     doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='doctor_appointments')
     appointment_date = models.DateTimeField()
@@ -35,13 +137,33 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = AppointmentQuerySet.as_manager()
+    
     class Meta:
         app_label = 'appointments'
         ordering = ['-appointment_date']
+        indexes = [
+            # Keyset pagination of each side's appointment list
+            models.Index(fields=['patient', '-appointment_date', '-id'], name='appointment_patient_page_idx'),
+            models.Index(fields=['doctor', '-appointment_date', '-id'], name='appointment_doctor_page_idx'),
+            # Range scans of the stale-appointment sweeper
+            models.Index(fields=['status', 'appointment_date'], name='appointment_status_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.patient.username} with Dr. {self.doctor.last_name} on {self.appointment_date}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the booked slot so changes can be detected on save
+        instance._loaded_slot = (instance.__dict__.get('doctor_id'), instance.__dict__.get('appointment_date'))
+        return instance
+    
+    def slot_changed(self):
+        """True for new appointments and ones moved to another doctor or time"""
+        return getattr(self, '_loaded_slot', None) != (self.doctor_id, self.appointment_date)
+    
     def clean(self):
         # Validate appointment date is not in the past
         if self.appointment_date and self.appointment_date < timezone.now():
@@ -52,15 +174,42 @@ class Appointment(models.Model):
         if self.appointment_date and self.appointment_date > max_booking_date:
             raise ValidationError('Appointments can only be booked up to 30 days in advance.')
         
-        # Check if doctor is unavailable on this date
-        if self.doctor and self.appointment_date:
-            unavailable_dates = DoctorUnavailability.objects.filter(
-                doctor=self.doctor,
-                unavailable_date=self.appointment_date.date()
-            )
-            if unavailable_dates.exists():
-                raise ValidationError('Doctor is not available on the selected date.')
+        # Check the doctor's slot bitmap (working hours, unavailability, bookings)
+        if self.doctor_id and self.appointment_date and self.slot_changed():
+            check_slot(self.doctor_id, self.appointment_date)
     
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        # Rescheduling takes the slot reservation along; new appointments
+        # claim theirs through reservations.book()
+        rescheduled = not self._state.adding and self.status in ACTIVE_STATUSES and self.slot_changed()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if rescheduled:
+                from .reservations import move
+                
+                move(self)
+
+class SlotReservation(models.Model):
+    """
+    One row per booked (doctor, slot start). The unique constraint lets the
+    database arbitrate concurrent bookings: the first insert wins and every
+    other booker gets an IntegrityError. Rows without an appointment are
+    short-lived holds that expire at ``expires_at``.
+    """
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='slot_reservations')
+    slot_start = models.DateTimeField()
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='slot_holds')
+    appointment = models.OneToOneField(Appointment, on_delete=models.CASCADE, null=True, blank=True, related_name='reservation')
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="Hold expiry; empty once confirmed")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        app_label = 'appointments'
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'slot_start'], name='unique_doctor_slot'),
+        ]
+    
+    def __str__(self):
+        state = 'booked' if self.appointment_id else f'held until {self.expires_at}'
+        return f"Dr. {self.doctor.last_name} - {self.slot_start} - {state}"
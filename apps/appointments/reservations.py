@@ -0,0 +1,137 @@
+"""
+Hold/confirm protocol for appointment slots.
+
+A patient may first *hold* a slot (a SlotReservation without appointment
+that expires after APPOINTMENT_HOLD_SECONDS) and later *confirm* it by
+booking. Booking without a hold inserts a confirmed reservation directly.
+Rescheduling a booked appointment moves its reservation to the new slot.
+Either way the contended step is a single write against the
+(doctor, slot_start) unique constraint, so concurrent bookers are resolved
+by the database rather than by re-querying.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .availability import slot_index, slot_start
+from .models import SlotReservation
+
+HOLD_SECONDS = getattr(settings, 'APPOINTMENT_HOLD_SECONDS', 300)
+
+
+class SlotTaken(Exception):
+    """The requested slot is held or booked by someone else."""
+
+
+def reservation_start(when):
+    """Start of the slot containing ``when``; the reservation key."""
+    return slot_start(timezone.localtime(when).date(), slot_index(when))
+
+
+def _reclaim_expired(doctor_id, start, now):
+    """Drop an expired, unconfirmed hold on the slot (one conditional DELETE)."""
+    SlotReservation.objects.filter(
+        doctor_id=doctor_id,
+        slot_start=start,
+        appointment__isnull=True,
+        expires_at__lt=now,
+    ).delete()
+
+
+def hold_slot(doctor_id, patient_id, when):
+    """
+    Hold the slot containing ``when`` for the patient, or raise SlotTaken.
+
+    A patient holds one slot at a time: a new hold releases their other
+    unconfirmed holds in the same transaction, so moving through the date
+    and time pickers never locks out more than one slot.
+    """
+    start = reservation_start(when)
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=HOLD_SECONDS)
+
+    with transaction.atomic():
+        SlotReservation.objects.filter(patient_id=patient_id, appointment__isnull=True).exclude(
+            doctor_id=doctor_id, slot_start=start,
+        ).delete()
+
+        # Re-holding the same slot just extends the patient's own hold
+        own_hold = SlotReservation.objects.filter(
+            doctor_id=doctor_id,
+            slot_start=start,
+            patient_id=patient_id,
+            appointment__isnull=True,
+        )
+        if own_hold.update(expires_at=expires_at):
+            return own_hold.get()
+
+        _reclaim_expired(doctor_id, start, now)
+        try:
+            with transaction.atomic():
+                return SlotReservation.objects.create(
+                    doctor_id=doctor_id,
+                    slot_start=start,
+                    patient_id=patient_id,
+                    expires_at=expires_at,
+                )
+        except IntegrityError:
+            # Leaves the patient's previous hold in place
+            raise SlotTaken()
+
+
+def _claim(appointment, now):
+    """Confirm the patient's live hold on the appointment's slot, or insert a confirmed reservation."""
+    start = reservation_start(appointment.appointment_date)
+    claimed = SlotReservation.objects.filter(
+        doctor_id=appointment.doctor_id,
+        slot_start=start,
+        patient_id=appointment.patient_id,
+        appointment__isnull=True,
+        expires_at__gte=now,
+    ).update(appointment=appointment, expires_at=None)
+
+    if not claimed:
+        _reclaim_expired(appointment.doctor_id, start, now)
+        try:
+            with transaction.atomic():
+                SlotReservation.objects.create(
+                    doctor_id=appointment.doctor_id,
+                    slot_start=start,
+                    patient_id=appointment.patient_id,
+                    appointment=appointment,
+                )
+        except IntegrityError:
+            raise SlotTaken()
+
+
+def book(appointment):
+    """
+    Save a new ``appointment`` and claim its slot in the same transaction.
+
+    A live hold by the same patient is confirmed in place; otherwise a
+    confirmed reservation is inserted. Raises SlotTaken (rolling the
+    appointment back) when another patient owns the slot.
+    """
+    with transaction.atomic():
+        appointment.save()
+        _claim(appointment, timezone.now())
+
+    return appointment
+
+
+def move(appointment):
+    """
+    Move the reservation of a rescheduled ``appointment`` to its new slot.
+
+    Called by Appointment.save() inside its transaction, so the old slot is
+    only freed if the new one can be claimed; raises SlotTaken otherwise.
+    """
+    SlotReservation.objects.filter(appointment=appointment).delete()
+    _claim(appointment, timezone.now())
+
+
+def release(appointment_ids):
+    """Free the slots of appointments that no longer occupy them."""
+    SlotReservation.objects.filter(appointment_id__in=appointment_ids).delete()
@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Appointment, DoctorUnavailability, DoctorWorkingHours
+from . import availability, reservations
+
+def _refresh_on_commit(doctor_id, days):
+    transaction.on_commit(lambda: availability.refresh_days(doctor_id, days))
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def refresh_appointment_slots(sender, instance, **kwargs):
+    touched = {}
+    old_doctor_id, old_date = getattr(instance, '_loaded_slot', (None, None))
+    if old_doctor_id and old_date:
+        touched.setdefault(old_doctor_id, set()).add(timezone.localtime(old_date).date())
+    touched.setdefault(instance.doctor_id, set()).add(timezone.localtime(instance.appointment_date).date())
+    
+    for doctor_id, days in touched.items():
+        _refresh_on_commit(doctor_id, days)
+    
+    # The saved values are now what the database holds
+    instance._loaded_slot = (instance.doctor_id, instance.appointment_date)
+
+@receiver(post_save, sender=Appointment)
+def release_inactive_slot(sender, instance, created, **kwargs):
+    if not created and instance.status not in availability.ACTIVE_STATUSES:
+        reservations.release([instance.pk])
+
+@receiver(post_save, sender=DoctorUnavailability)
+@receiver(post_delete, sender=DoctorUnavailability)
+def refresh_unavailable_days(sender, instance, **kwargs):
+    # Both the range as loaded and as saved, so moved or shortened entries unblock their old days
+    ranges = {(instance.doctor_id, instance.start_date, instance.end_date)}
+    loaded = getattr(instance, '_loaded_range', None)
+    if loaded and None not in loaded:
+        ranges.add(loaded)
+    
+    window = availability.booking_window()
+    touched = {}
+    for doctor_id, start_date, end_date in ranges:
+        touched.setdefault(doctor_id, set()).update(day for day in window if start_date <= day <= end_date)
+    for doctor_id, days in touched.items():
+        _refresh_on_commit(doctor_id, days)
+    
+    # The saved values are now what the database holds
+    instance._loaded_range = (instance.doctor_id, instance.start_date, instance.end_date)
+
+@receiver(post_save, sender=DoctorWorkingHours)
+@receiver(post_delete, sender=DoctorWorkingHours)
+def refresh_working_hours(sender, instance, **kwargs):
+    doctor_id = instance.doctor_id
+    transaction.on_commit(lambda: availability.refresh_window(doctor_id))
@@ -1,3 +1,230 @@
+from datetime import datetime, time, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from . import availability, reservations
+from .models import Appointment, DoctorUnavailability, SlotReservation
+
+
+def make_user(username, user_type):
+    user = User.objects.create_user(username=username, last_name=username)
+    user.profile.user_type = user_type
+    user.profile.status = 'approved'
+    user.profile.save()
+    return user
+
+
+def next_weekday(days_ahead=2):
+    """A Monday to Saturday at least ``days_ahead`` days from today, inside the booking window."""
+    day = timezone.localdate() + timedelta(days=days_ahead)
+    while day.weekday() == 6:
+        day += timedelta(days=1)
+    return day
+
+
+def at(day, hour):
+    return timezone.make_aware(datetime.combine(day, time(hour)))
+
+
+class AvailabilityCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(availability, 'CACHE_ENABLED', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.doctor = make_user('doctor', 'doctor')
+        self.first = next_weekday()
+        self.second = next_weekday((self.first - timezone.localdate()).days + 1)
+
+    def cached(self, day):
+        return cache.get(availability._cache_key(self.doctor.id, day))
+
+    def test_shortened_range_frees_the_dropped_day(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = DoctorUnavailability.objects.create(
+                doctor=self.doctor, start_date=self.first, end_date=self.second,
+            )
+        availability.get_day_bitmaps(self.doctor.id, [self.first, self.second])
+        self.assertEqual(self.cached(self.first), 0)
+        self.assertEqual(self.cached(self.second), 0)
+
+        entry = DoctorUnavailability.objects.get(pk=entry.pk)
+        entry.end_date = self.first
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+
+        self.assertEqual(self.cached(self.first), 0)
+        self.assertNotEqual(self.cached(self.second), 0)
+        self.assertTrue(availability.is_slot_free(self.doctor.id, at(self.second, 10)))
+
+    def test_moved_range_blocks_the_new_day(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = DoctorUnavailability.objects.create(
+                doctor=self.doctor, start_date=self.first, end_date=self.first,
+            )
+        availability.get_day_bitmaps(self.doctor.id, [self.first, self.second])
+
+        entry = DoctorUnavailability.objects.get(pk=entry.pk)
+        entry.start_date = entry.end_date = self.second
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.save()
+
+        self.assertNotEqual(self.cached(self.first), 0)
+        self.assertEqual(self.cached(self.second), 0)
+
+    def test_deleted_range_frees_its_days(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = DoctorUnavailability.objects.create(
+                doctor=self.doctor, start_date=self.first, end_date=self.second,
+            )
+        availability.get_day_bitmaps(self.doctor.id, [self.first, self.second])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.delete()
+
+        self.assertNotEqual(self.cached(self.first), 0)
+        self.assertNotEqual(self.cached(self.second), 0)
+
+
+class BookingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user('doctor', 'doctor')
+        self.patient = make_user('patient', 'patient')
+        self.other = make_user('other', 'patient')
+        self.when = at(next_weekday(), 10)
+
+    def appointment(self, patient):
+        return Appointment(patient=patient, doctor=self.doctor, appointment_date=self.when, reason='Checkup')
+
+    def test_book_inserts_a_confirmed_reservation(self):
+        appointment = reservations.book(self.appointment(self.patient))
+        reservation = SlotReservation.objects.get()
+        self.assertEqual(reservation.appointment, appointment)
+        self.assertIsNone(reservation.expires_at)
+
+    def test_book_confirms_the_patients_own_hold(self):
+        hold = reservations.hold_slot(self.doctor.id, self.patient.id, self.when)
+        appointment = reservations.book(self.appointment(self.patient))
+        hold.refresh_from_db()
+        self.assertEqual(hold.appointment, appointment)
+
+    def test_slot_held_by_another_patient_is_taken(self):
+        reservations.hold_slot(self.doctor.id, self.other.id, self.when)
+        with self.assertRaises(reservations.SlotTaken):
+            reservations.book(self.appointment(self.patient))
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_unique_reservation_rejects_a_second_booking(self):
+        # Bypass the bitmap check so only the unique constraint stands in the way,
+        # as when two bookers read the slot as free at the same time
+        reservations.book(self.appointment(self.patient))
+        with mock.patch.object(Appointment, 'slot_changed', return_value=False):
+            with self.assertRaises(reservations.SlotTaken):
+                reservations.book(self.appointment(self.other))
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.assertEqual(SlotReservation.objects.get().patient, self.patient)
+
+    def test_expired_hold_is_reclaimed(self):
+        hold = reservations.hold_slot(self.doctor.id, self.other.id, self.when)
+        SlotReservation.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        reservations.book(self.appointment(self.patient))
+        self.assertEqual(SlotReservation.objects.get().patient, self.patient)
+
+    def test_rescheduling_moves_the_reservation(self):
+        booked = reservations.book(self.appointment(self.patient))
+        appointment = Appointment.objects.get(pk=booked.pk)
+        appointment.appointment_date = self.when + timedelta(hours=1)
+        appointment.save()
+        self.assertEqual(
+            SlotReservation.objects.get(appointment=appointment).slot_start,
+            reservations.reservation_start(appointment.appointment_date),
+        )
+        # The old slot is free for someone else
+        reservations.book(self.appointment(self.other))
+
+    def test_rescheduling_onto_a_held_slot_is_rolled_back(self):
+        booked = reservations.book(self.appointment(self.patient))
+        later = self.when + timedelta(hours=1)
+        reservations.hold_slot(self.doctor.id, self.other.id, later)
+        appointment = Appointment.objects.get(pk=booked.pk)
+        appointment.appointment_date = later
+        with self.assertRaises(reservations.SlotTaken):
+            appointment.save()
+        self.assertEqual(Appointment.objects.get(pk=booked.pk).appointment_date, self.when)
+        self.assertEqual(
+            SlotReservation.objects.get(appointment=booked).slot_start,
+            reservations.reservation_start(self.when),
+        )
+
+    def test_new_hold_releases_the_previous_one(self):
+        reservations.hold_slot(self.doctor.id, self.patient.id, self.when)
+        later = self.when + timedelta(hours=1)
+        reservations.hold_slot(self.doctor.id, self.patient.id, later)
+        self.assertEqual(
+            list(SlotReservation.objects.values_list('slot_start', flat=True)),
+            [reservations.reservation_start(later)],
+        )
+
+
+class TransitionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user('doctor', 'doctor')
+        self.patient = make_user('patient', 'patient')
+        day = next_weekday()
+        self.appointments = {}
+        # One appointment in every status, each in its own slot
+        for hour, (status, label) in zip((9, 10, 11, 12, 14, 15), Appointment.STATUS_CHOICES):
+            appointment = reservations.book(Appointment(
+                patient=self.patient, doctor=self.doctor, appointment_date=at(day, hour), reason='Checkup',
+            ))
+            Appointment.objects.filter(pk=appointment.pk).update(status=status)
+            self.appointments[status] = appointment.pk
+
+    def statuses(self):
+        return dict(Appointment.objects.values_list('id', 'status'))
+
+    def reset_statuses(self):
+        for status, pk in self.appointments.items():
+            Appointment.objects.filter(pk=pk).update(status=status)
+
+    def test_allowed_sources_move(self):
+        for new_status, allowed_from in Appointment.ALLOWED_TRANSITIONS.items():
+            with self.subTest(new_status=new_status):
+                with self.captureOnCommitCallbacks(execute=True):
+                    moved = Appointment.objects.filter(status__in=allowed_from).transition(new_status)
+                self.assertEqual(
+                    sorted(row[0] for row in moved),
+                    sorted(self.appointments[status] for status in allowed_from),
+                )
+                self.reset_statuses()
+
+    def test_disallowed_sources_stay(self):
+        before = self.statuses()
+        for new_status, allowed_from in Appointment.ALLOWED_TRANSITIONS.items():
+            with self.subTest(new_status=new_status):
+                rejected = Appointment.objects.exclude(status__in=allowed_from)
+                self.assertEqual(rejected.transition(new_status), [])
+        self.assertEqual(self.statuses(), before)
+
+    def test_unknown_target_moves_nothing(self):
+        before = self.statuses()
+        self.assertEqual(Appointment.objects.all().transition('pending'), [])
+        self.assertEqual(self.statuses(), before)
+
+    def test_leaving_the_active_states_releases_the_slot(self):
+        pk = self.appointments['confirmed']
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.filter(pk=pk).transition('cancelled')
+        self.assertEqual(Appointment.objects.get(pk=pk).status, 'cancelled')
+        self.assertFalse(SlotReservation.objects.filter(appointment_id=pk).exists())
 
-# Create your tests here.
+    def test_staying_active_keeps_the_slot(self):
+        pk = self.appointments['pending']
+        Appointment.objects.filter(pk=pk).transition('confirmed')
+        self.assertTrue(SlotReservation.objects.filter(appointment_id=pk).exists())
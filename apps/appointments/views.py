@@ -3,11 +3,15 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.http import JsonResponse
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_POST
 from django.utils import timezone
 from datetime import timedelta
 from .models import Appointment, DoctorUnavailability
 from .forms import AppointmentForm, DoctorUnavailabilityForm
-from apps.users.models import Profile
+from . import availability, reservations
+from apps.users import directory
+from healthcare.pagination import keyset_paginate
 
 @login_required
 def book_appointment(request):
@@ -17,25 +21,21 @@ def book_appointment(request):
             appointment = form.save(commit=False)
             appointment.patient = request.user
             appointment.status = 'pending'  # New appointments need confirmation
-            appointment.save()
-            messages.success(request, 'Appointment booked successfully! Waiting for doctor confirmation.')
-            return redirect('appointment_list')
+            try:
+                reservations.book(appointment)
+            except reservations.SlotTaken:
+                form.add_error('appointment_date', 'This time slot was just booked by another patient. Please choose another time.')
+                messages.error(request, 'Please correct the errors below.')
+            else:
+                messages.success(request, 'Appointment booked successfully! Waiting for doctor confirmation.')
+                return redirect('appointment_list')
         else:
             messages.error(request, 'Please correct the errors below.')
     else:
         form = AppointmentForm()
     
-    # Get all specializations that have approved doctors
-    specializations_with_doctors = Profile.objects.filter(
-        user_type='doctor', 
-        status='approved'
-    ).values_list('specialization', flat=True).distinct()
-    
-    # Create choices for specializations that actually have doctors
-    available_specializations = []
-    for spec_code, spec_name in Profile.SPECIALIZATION_CHOICES:
-        if spec_code in specializations_with_doctors:
-            available_specializations.append((spec_code, spec_name))
+    # Specializations that have approved doctors (cached directory)
+    available_specializations = directory.available_specializations()
     
     # If no specializations available, show message
     if not available_specializations:
@@ -48,15 +48,18 @@ def book_appointment(request):
 
 @login_required
 def appointment_list(request):
-    profile = Profile.objects.get(user=request.user)
+    profile = request.profile
     
     if profile.user_type == 'patient':
-        appointments = Appointment.objects.filter(patient=request.user)
+        appointments = Appointment.objects.filter(patient=request.user).select_related('doctor')
     else:
-        appointments = Appointment.objects.filter(doctor=request.user)
+        appointments = Appointment.objects.filter(doctor=request.user).select_related('patient')
+    
+    page = keyset_paginate(appointments, 'appointment_date', request.GET.get('cursor'))
     
     return render(request, 'appointments/list.html', {
-        'appointments': appointments,
+        'appointments': page,
+        'page': page,
         'user_type': profile.user_type
     })
 
@@ -64,36 +67,67 @@ def appointment_list(request):
 def update_appointment_status(request, appointment_id):
     """Update appointment status (confirm, cancel, complete)"""
     appointment = get_object_or_404(Appointment, id=appointment_id)
-    profile = Profile.objects.get(user=request.user)
+    profile = request.profile
     
     # Check permissions
-    if profile.user_type == 'patient' and appointment.patient != request.user:
+    if profile.user_type == 'patient' and appointment.patient_id != request.user.id:
         messages.error(request, 'You can only update your own appointments.')
         return redirect('appointment_list')
     
-    if profile.user_type == 'doctor' and appointment.doctor != request.user:
+    if profile.user_type == 'doctor' and appointment.doctor_id != request.user.id:
         messages.error(request, 'You can only update appointments assigned to you.')
         return redirect('appointment_list')
     
     if request.method == 'POST':
         new_status = request.POST.get('status')
         
-        if new_status in dict(Appointment.STATUS_CHOICES):
-            old_status = appointment.status
-            appointment.status = new_status
-            appointment.save()
-            
+        if new_status not in Appointment.ALLOWED_TRANSITIONS:
+            messages.error(request, 'Invalid status.')
+        elif profile.user_type == 'patient' and new_status != 'cancelled':
+            messages.error(request, 'Patients can only cancel appointments.')
+        elif Appointment.objects.filter(id=appointment.id).transition(new_status):
             status_display = dict(Appointment.STATUS_CHOICES)[new_status]
             messages.success(request, f'Appointment status updated to {status_display}.')
         else:
-            messages.error(request, 'Invalid status.')
+            messages.error(
+                request,
+                f'A {appointment.get_status_display().lower()} appointment cannot be changed to {new_status}.'
+            )
+    
+    return redirect('appointment_list')
+
+@login_required
+@require_POST
+def bulk_update_appointment_status(request):
+    """Confirm, cancel or complete several of a doctor's appointments at once"""
+    profile = request.profile
+    
+    if profile.user_type != 'doctor':
+        messages.error(request, 'Only doctors can update appointments in bulk.')
+        return redirect('appointment_list')
+    
+    new_status = request.POST.get('status')
+    appointment_ids = [value for value in request.POST.getlist('appointment_ids') if value.isdigit()]
+    
+    if new_status not in Appointment.ALLOWED_TRANSITIONS:
+        messages.error(request, 'Invalid status.')
+    elif not appointment_ids:
+        messages.error(request, 'Select at least one appointment.')
+    else:
+        moved = Appointment.objects.filter(doctor=request.user, id__in=appointment_ids).transition(new_status)
+        status_display = dict(Appointment.STATUS_CHOICES)[new_status]
+        skipped = len(appointment_ids) - len(moved)
+        if moved:
+            messages.success(request, f'{len(moved)} appointment(s) updated to {status_display}.')
+        if skipped:
+            messages.warning(request, f'{skipped} appointment(s) could not be changed to {status_display}.')
     
     return redirect('appointment_list')
 
 @login_required
 def manage_unavailability(request):
     """Doctors can manage their unavailable dates"""
-    profile = Profile.objects.get(user=request.user)
+    profile = request.profile
     
     if profile.user_type != 'doctor':
         messages.error(request, 'Only doctors can manage availability.')
@@ -105,23 +139,32 @@ def manage_unavailability(request):
             unavailability = form.save(commit=False)
             unavailability.doctor = request.user
             
-            # Check if date is already marked as unavailable
-            if DoctorUnavailability.objects.filter(
-                doctor=request.user, 
-                unavailable_date=unavailability.unavailable_date
-            ).exists():
-                messages.error(request, 'This date is already marked as unavailable.')
+            # Check if the range overlaps dates already marked as unavailable
+            overlapping = DoctorUnavailability.objects.filter(doctor=request.user).overlapping(
+                unavailability.start_date, unavailability.end_date
+            ).order_by('start_date').first()
+            if overlapping:
+                messages.error(
+                    request,
+                    f'These dates overlap an existing entry ({overlapping.start_date} to {overlapping.end_date}).'
+                )
             else:
                 unavailability.save()
-                messages.success(request, f'Marked {unavailability.unavailable_date} as unavailable.')
+                if unavailability.start_date == unavailability.end_date:
+                    messages.success(request, f'Marked {unavailability.start_date} as unavailable.')
+                else:
+                    messages.success(request, f'Marked {unavailability.start_date} to {unavailability.end_date} as unavailable.')
                 return redirect('manage_unavailability')
         else:
             messages.error(request, 'Please correct the errors below.')
     else:
         form = DoctorUnavailabilityForm()
     
-    # Get existing unavailability entries
-    unavailability_list = DoctorUnavailability.objects.filter(doctor=request.user).order_by('-unavailable_date')
+    # Get current and upcoming unavailability entries
+    unavailability_list = DoctorUnavailability.objects.filter(
+        doctor=request.user,
+        end_date__gte=timezone.localdate(),
+    ).order_by('start_date')
     
     return render(request, 'appointments/manage_unavailability.html', {
         'form': form,
@@ -138,50 +181,99 @@ def delete_unavailability(request, unavailability_id):
         return redirect('manage_unavailability')
     
     if request.method == 'POST':
-        date_str = unavailability.unavailable_date.strftime('%Y-%m-%d')
+        start_date, end_date = unavailability.start_date, unavailability.end_date
         unavailability.delete()
-        messages.success(request, f'Removed unavailability for {date_str}.')
+        if start_date == end_date:
+            messages.success(request, f'Removed unavailability for {start_date:%Y-%m-%d}.')
+        else:
+            messages.success(request, f'Removed unavailability for {start_date:%Y-%m-%d} to {end_date:%Y-%m-%d}.')
     
     return redirect('manage_unavailability')
 
 @login_required
 def get_doctors_by_specialization(request):
     """AJAX view to get doctors by specialization"""
-    specialization = request.GET.get('specialization')
-    
-    if specialization:
-        doctors = User.objects.filter(
-            profile__user_type='doctor',
-            profile__status='approved',
-            profile__specialization=specialization
-        ).select_related('profile')
-        
-        doctors_data = []
-        for doctor in doctors:
-            doctors_data.append({
-                'id': doctor.id,
-                'name': f"Dr. {doctor.get_full_name()}",
-                'specialization': doctor.profile.get_specialization_display(),
-                'hospital': doctor.profile.hospital_name,
-                'experience': f"{doctor.profile.experience} years experience"
-            })
-        
-        return JsonResponse({'doctors': doctors_data})
-    
-    return JsonResponse({'doctors': []})
+    return directory.doctors_response(request, request.GET.get('specialization'))
 
 @login_required
 def get_doctor_unavailable_dates(request, doctor_id):
-    """AJAX view to get doctor's unavailable dates"""
+    """AJAX view to get doctor's unavailable date ranges within a window"""
+    window = availability.booking_window()
+    start_date = parse_date(request.GET.get('start', '')) or window[0]
+    end_date = parse_date(request.GET.get('end', '')) or window[-1]
+    
+    if end_date < start_date or not User.objects.filter(id=doctor_id, profile__user_type='doctor').exists():
+        return JsonResponse({'ranges': []})
+    
+    entries = DoctorUnavailability.objects.filter(doctor_id=doctor_id).overlapping(
+        start_date, end_date
+    ).order_by('start_date').values_list('start_date', 'end_date', 'reason')
+    
+    # Merge touching entries and clip them to the requested window
+    ranges = []
+    for entry_start, entry_end, reason in entries:
+        entry_start, entry_end = max(entry_start, start_date), min(entry_end, end_date)
+        if ranges and entry_start <= ranges[-1]['end'] + timedelta(days=1):
+            last = ranges[-1]
+            last['end'] = max(last['end'], entry_end)
+            if reason and reason not in last['reasons']:
+                last['reasons'].append(reason)
+        else:
+            ranges.append({'start': entry_start, 'end': entry_end, 'reasons': [reason] if reason else []})
+    
+    return JsonResponse({'ranges': [
+        {
+            'start': entry['start'].strftime('%Y-%m-%d'),
+            'end': entry['end'].strftime('%Y-%m-%d'),
+            'reason': ', '.join(entry['reasons']),
+        }
+        for entry in ranges
+    ]})
+
+@login_required
+def get_doctor_free_slots(request, doctor_id):
+    """AJAX view to get a doctor's open slots, answered from the availability cache"""
+    if not User.objects.filter(id=doctor_id, profile__user_type='doctor').exists():
+        return JsonResponse({'slot_minutes': availability.SLOT_MINUTES, 'days': {}})
+    
+    window = availability.booking_window()
+    requested = request.GET.get('date')
+    if requested:
+        window = [day for day in window if day.isoformat() == requested]
+    
+    slots = availability.free_slots(doctor_id, window)
+    days = {
+        day.isoformat(): [timezone.localtime(start).strftime('%H:%M') for start in starts]
+        for day, starts in slots.items()
+    }
+    return JsonResponse({'slot_minutes': availability.SLOT_MINUTES, 'days': days})
+
+
+@login_required
+@require_POST
+def hold_slot(request, doctor_id):
+    """AJAX view to hold a slot while the patient completes the booking form"""
+    when = parse_datetime(request.POST.get('appointment_date', ''))
+    if when is None:
+        return JsonResponse({'error': 'Invalid appointment date.'}, status=400)
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    
+    # Same doctors and days as the booking form accepts
+    if not User.objects.filter(id=doctor_id, profile__user_type='doctor', profile__status='approved').exists():
+        return JsonResponse({'error': 'Doctor not found.'}, status=404)
+    if when <= timezone.now() or timezone.localtime(when).date() not in availability.booking_window():
+        return JsonResponse({'error': 'This time is outside the booking window.'}, status=400)
+    
+    if not availability.is_slot_free(doctor_id, when):
+        return JsonResponse({'error': 'This time slot is not available.'}, status=409)
+    
     try:
-        doctor = User.objects.get(id=doctor_id, profile__user_type='doctor')
-        unavailable_dates = DoctorUnavailability.objects.filter(
-            doctor=doctor
-        ).values_list('unavailable_date', flat=True)
-        
-        # Convert dates to string format for JavaScript
-        unavailable_dates_list = [date.strftime('%Y-%m-%d') for date in unavailable_dates]
-        
-        return JsonResponse({'unavailable_dates': unavailable_dates_list})
-    except User.DoesNotExist:
-        return JsonResponse({'unavailable_dates': []})
\ No newline at end of file
+        hold = reservations.hold_slot(doctor_id, request.user.id, when)
+    except reservations.SlotTaken:
+        return JsonResponse({'error': 'This time slot is being booked by another patient.'}, status=409)
+    
+    return JsonResponse({
+        'slot_start': timezone.localtime(hold.slot_start).isoformat(),
+        'expires_at': timezone.localtime(hold.expires_at).isoformat(),
+    })
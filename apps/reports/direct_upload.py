@@ -0,0 +1,129 @@
+"""
+Two-phase report uploads straight from the browser to S3.
+
+1. ``presign`` validates the announced file name and size and returns a
+   presigned POST scoped to a fresh object key, the file's content type and
+   the size limit, together with a signed token naming that key.
+2. The browser POSTs the file to the bucket; gunicorn never sees the bytes.
+3. ``complete`` (via DirectUploadReportForm) checks the token, then streams
+   the object once to sniff its format and hash it, and moves it to its
+   content address with a server-side copy (or drops it when that content
+   is already stored) before the MedicalReport row is created.
+
+A client that sends the file's SHA-256 with the presign request skips the
+transfer entirely when the patient already uploaded that content.
+
+Only available when media lives in S3 (set ``AWS_S3_ENDPOINT_URL`` to run
+against MinIO or moto); with local storage the regular form upload is used.
+"""
+import mimetypes
+import os
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+
+from . import uploads
+from .forms import MAX_REPORT_SIZE, validate_report_upload
+from .models import MedicalReport
+
+UPLOAD_DIR = 'medical_reports/uploads'
+URL_SECONDS = 10 * 60
+TOKEN_MAX_AGE = 60 * 60
+SALT = 'reports.direct-upload'
+
+
+def enabled():
+    # Only S3 storages have a bucket to presign against
+    return getattr(settings, 'REPORT_DIRECT_UPLOADS', False) and hasattr(default_storage, 'bucket_name')
+
+
+def _object_key(name):
+    return f'{default_storage.location}/{name}'.lstrip('/')
+
+
+def presign(user, file_name, size, content_hash=''):
+    """Return the presigned POST (url, fields) and completion token for a new upload."""
+    extension = validate_report_upload(file_name, size)
+    # Kept in the signed token; the stored copy is named after its content
+    original_name = os.path.basename(file_name)[:255]
+    
+    # Re-uploading content this patient already stored needs no transfer
+    existing = MedicalReport.objects.filter(
+        patient=user, content_hash=content_hash.lower()
+    ).exclude(content_hash='').values_list('report_file', flat=True).first()
+    if existing:
+        return {
+            'existing': True,
+            'token': signing.dumps(
+                {'name': existing, 'user': user.pk, 'hash': content_hash.lower(), 'original_name': original_name},
+                salt=SALT,
+            ),
+        }
+    
+    content_type = mimetypes.types_map.get(extension, 'application/octet-stream')
+    name = f'{UPLOAD_DIR}/{user.pk}/{uuid.uuid4().hex}{extension}'
+    
+    client = default_storage.connection.meta.client
+    post = client.generate_presigned_post(
+        Bucket=default_storage.bucket_name,
+        Key=_object_key(name),
+        Fields={'Content-Type': content_type},
+        Conditions=[
+            {'Content-Type': content_type},
+            ['content-length-range', 1, MAX_REPORT_SIZE],
+        ],
+        ExpiresIn=URL_SECONDS,
+    )
+    return {
+        'url': post['url'],
+        'fields': post['fields'],
+        'token': signing.dumps({'name': name, 'user': user.pk, 'original_name': original_name}, salt=SALT),
+    }
+
+
+def complete(token, user):
+    """Validate a finished upload; return its (storage name, content hash, original file name)."""
+    try:
+        data = signing.loads(token, salt=SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        raise ValidationError("The upload has expired. Please upload the file again.")
+    
+    name = data['name']
+    original_name = data.get('original_name') or os.path.basename(name)
+    if data['user'] != user.pk:
+        raise ValidationError("Invalid upload.")
+    
+    if 'hash' in data:
+        # Skipped transfer: the patient's own earlier report holds this content
+        if not MedicalReport.objects.filter(patient=user, content_hash=data['hash'], report_file=name).exists():
+            raise ValidationError("Invalid upload.")
+        return name, data['hash'], original_name
+    
+    if not default_storage.exists(name):
+        raise ValidationError("The file was not uploaded. Please try again.")
+    
+    size = default_storage.size(name)
+    if size > MAX_REPORT_SIZE:
+        default_storage.delete(name)
+        raise ValidationError(f"File size exceeds 10MB limit. Your file is {size / (1024*1024):.1f}MB.")
+    
+    extension = validate_report_upload(name, size)
+    with default_storage.open(name, 'rb') as stored:
+        content_hash, kind = uploads.fingerprint(stored)
+    if not uploads.matches_extension(kind, extension):
+        default_storage.delete(name)
+        raise ValidationError(f"The file content does not match its {extension} extension.")
+    
+    final_name = uploads.content_path(content_hash, extension)
+    if not default_storage.exists(final_name):
+        client = default_storage.connection.meta.client
+        client.copy_object(
+            Bucket=default_storage.bucket_name,
+            CopySource={'Bucket': default_storage.bucket_name, 'Key': _object_key(name)},
+            Key=_object_key(final_name),
+        )
+    default_storage.delete(name)
+    return final_name, content_hash, original_name
@@ -0,0 +1,55 @@
+"""
+Serving stored files without tying up a gunicorn worker.
+
+Views decide who may see a file; the bytes themselves are sent by something
+else. On S3 the client is redirected to a short-lived presigned URL. On
+local storage the response carries an ``X-Accel-Redirect`` header naming an
+``internal`` nginx location, and nginx streams the file (with Range support)
+after Django has returned. Without a configured prefix, e.g. under
+runserver, the file is streamed by Django itself.
+"""
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.utils.http import content_disposition_header
+
+ACCEL_PREFIX = getattr(settings, 'PROTECTED_MEDIA_ACCEL_PREFIX', '')
+PRESIGNED_URL_SECONDS = getattr(settings, 'PROTECTED_MEDIA_URL_SECONDS', 300)
+
+
+def serve_file(field_file, as_attachment=False, filename=None, cache_control=None):
+    """
+    Response delivering the stored ``field_file`` to an already authorized user.
+    
+    ``cache_control`` applies to the file itself; on S3 it is attached to the
+    presigned URL's response, as the redirect expires with its signature.
+    """
+    storage = field_file.storage
+    filename = filename or os.path.basename(field_file.name)
+    disposition = content_disposition_header(as_attachment, filename)
+    
+    if not isinstance(storage, FileSystemStorage):
+        # Object storage (S3 via django-storages): let the client fetch it directly
+        parameters = {'ResponseContentDisposition': disposition}
+        if cache_control:
+            parameters['ResponseCacheControl'] = cache_control
+        return HttpResponseRedirect(storage.url(
+            field_file.name,
+            parameters=parameters,
+            expire=PRESIGNED_URL_SECONDS,
+        ))
+    
+    if not ACCEL_PREFIX:
+        response = FileResponse(field_file.open('rb'), as_attachment=as_attachment, filename=filename)
+    else:
+        content_type, encoding = mimetypes.guess_type(filename)
+        response = HttpResponse(content_type=content_type or 'application/octet-stream')
+        response['X-Accel-Redirect'] = ACCEL_PREFIX.rstrip('/') + '/' + field_file.name.lstrip('/')
+        response['Content-Disposition'] = disposition
+        response['X-Content-Type-Options'] = 'nosniff'
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    return response
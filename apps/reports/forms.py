@@ -2,8 +2,26 @@ from django import forms
 from django.contrib.auth.models import User
 from .models import MedicalReport, DoctorResponse
 from apps.users.models import Profile
+from . import uploads
 import os
 
+MAX_REPORT_SIZE = 10 * 1024 * 1024  # 10MB
+ALLOWED_EXTENSIONS = ['.pdf', '.jpg', '.jpeg', '.png']
+
+
+def validate_report_upload(file_name, size):
+    """Size and format checks shared by regular and direct-to-storage uploads"""
+    if size > MAX_REPORT_SIZE:
+        raise forms.ValidationError(f"File size exceeds 10MB limit. Your file is {size / (1024*1024):.1f}MB.")
+    
+    file_extension = os.path.splitext(file_name)[1].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise forms.ValidationError(
+            f"Unsupported file format. Allowed formats: {', '.join(ALLOWED_EXTENSIONS)}. "
+            f"Your file: {file_extension}"
+        )
+    return file_extension
+
 class MedicalReportForm(forms.ModelForm):
     category = forms.ChoiceField(
         choices=(
@@ -65,34 +83,50 @@ class MedicalReportForm(forms.ModelForm):
         if not report_file:
             raise forms.ValidationError("Report file is required.")
         
-        # File size validation (10MB = 10 * 1024 * 1024 bytes)
-        max_size = 10 * 1024 * 1024  # 10MB
-        if report_file.size > max_size:
-            raise forms.ValidationError(f"File size exceeds 10MB limit. Your file is {report_file.size / (1024*1024):.1f}MB.")
-        
-        # File format validation
-        allowed_extensions = ['.pdf', '.jpg', '.jpeg', '.png']
-        file_name = report_file.name
-        file_extension = os.path.splitext(file_name)[1].lower()
+        file_extension = validate_report_upload(report_file.name, report_file.size)
         
-        if file_extension not in allowed_extensions:
+        # The format must match the file's content, not just its name
+        report_file.content_hash, kind = uploads.fingerprint(report_file)
+        if not uploads.matches_extension(kind, file_extension):
             raise forms.ValidationError(
-                f"Unsupported file format. Allowed formats: {', '.join(allowed_extensions)}. "
-                f"Your file: {file_extension}"
+                f"The file content does not match its {file_extension} extension."
             )
         
-        # Additional validation for specific file types
-        if file_extension == '.pdf':
-            # Check if it's actually a PDF (basic check)
-            if not file_name.lower().endswith('.pdf'):
-                raise forms.ValidationError("Invalid PDF file.")
-        elif file_extension in ['.jpg', '.jpeg', '.png']:
-            # Check if it's an image (basic check by extension)
-            if not (file_name.lower().endswith(('.jpg', '.jpeg', '.png'))):
-                raise forms.ValidationError("Invalid image file.")
-        
         return report_file
 
+    def save(self, commit=True):
+        report = super().save(commit=False)
+        report_file = self.cleaned_data['report_file']
+        # Identical content is stored once; re-uploads only reference it
+        report.content_hash = report_file.content_hash
+        report.original_name = os.path.basename(report_file.name)[:255]
+        report.report_file = uploads.store(
+            report_file, report.content_hash, os.path.splitext(report_file.name)[1]
+        )
+        if commit:
+            report.save()
+        return report
+
+class DirectUploadReportForm(MedicalReportForm):
+    """MedicalReportForm completing an upload the browser sent straight to storage"""
+    upload_token = forms.CharField(widget=forms.HiddenInput)
+    
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        del self.fields['report_file']
+    
+    def clean_upload_token(self):
+        from . import direct_upload
+        return direct_upload.complete(self.cleaned_data['upload_token'], self.user)
+    
+    def save(self, commit=True):
+        report = forms.ModelForm.save(self, commit=False)
+        report.report_file, report.content_hash, report.original_name = self.cleaned_data['upload_token']
+        if commit:
+            report.save()
+        return report
+
 class DoctorResponseForm(forms.ModelForm):
     prescription = forms.CharField(
         widget=forms.Textarea(attrs={
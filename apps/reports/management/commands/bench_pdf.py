@@ -0,0 +1,60 @@
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.reports import pdf_utils
+from apps.reports.models import DoctorResponse, MedicalReport
+from healthcare.benchmarking import percentile
+
+
+class Command(BaseCommand):
+    help = "Time doctor-response PDF generation with and without the shared styles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='PDFs rendered per mode')
+
+    def handle(self, *args, **options):
+        # Unsaved instances are enough for rendering, so no database is needed
+        now = timezone.now()
+        report = MedicalReport(
+            patient=User(first_name='Bench', last_name='Patient'),
+            title='Complete blood count',
+            category='blood_test',
+            uploaded_at=now,
+        )
+        response = DoctorResponse(
+            report=report,
+            doctor=User(first_name='Bench', last_name='Doctor'),
+            diagnosis='Mild iron deficiency anaemia.\nNo other abnormal findings.',
+            prescription='Ferrous sulfate | 200mg | Twice daily | 3 months\nVitamin C | 500mg | Once daily | 3 months',
+            recommendations='Repeat the blood count in three months.',
+            advice='Increase dietary iron intake.',
+            created_at=now,
+        )
+
+        def before():
+            # Rebuild the styles on every call, as before
+            pdf_utils.get_styles.cache_clear()
+            return pdf_utils.create_medical_response_pdf(report, response)
+
+        def after():
+            return pdf_utils.create_medical_response_pdf(report, response)
+
+        # Warm up the process-wide caches so "after" measures the steady state
+        after()
+
+        for label, render in (('Per-call layout', before), ('Shared styles', after)):
+            timings = []
+            size = 0
+            for _ in range(options['iterations']):
+                started = perf_counter()
+                size = len(render())
+                timings.append(perf_counter() - started)
+            self.stdout.write(
+                f"{label:<22} mean {sum(timings) / len(timings) * 1000:6.1f}ms  "
+                f"p50 {percentile(timings, 0.5) * 1000:6.1f}ms  "
+                f"p99 {percentile(timings, 0.99) * 1000:6.1f}ms  "
+                f"{size} bytes"
+            )
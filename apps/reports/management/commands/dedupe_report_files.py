@@ -0,0 +1,52 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from apps.reports import uploads
+from apps.reports.models import MedicalReport
+
+
+class Command(BaseCommand):
+    help = "Move report files to content-addressed storage and delete duplicate copies"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Reports read per query')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        moved = missing = 0
+        freed = set()
+
+        reports = MedicalReport.objects.filter(content_hash='').exclude(report_file='').order_by('id')
+        for report in reports.only('id', 'report_file').iterator(chunk_size=options['batch_size']):
+            old_name = report.report_file.name
+            if not default_storage.exists(old_name):
+                self.stderr.write(f"Report {report.id}: {old_name} is missing, skipped.")
+                missing += 1
+                continue
+
+            with default_storage.open(old_name, 'rb') as stored:
+                content_hash, _ = uploads.fingerprint(stored)
+                new_name = uploads.content_path(content_hash, os.path.splitext(old_name)[1])
+                if not dry_run and new_name != old_name:
+                    new_name = uploads.store(stored, content_hash, os.path.splitext(old_name)[1])
+
+            if not dry_run:
+                MedicalReport.objects.filter(id=report.id).update(report_file=new_name, content_hash=content_hash)
+            if new_name != old_name:
+                freed.add(old_name)
+            moved += 1
+
+        # Old copies can go once no report points at them any more
+        deleted = 0
+        for name in sorted(freed):
+            if dry_run or MedicalReport.objects.filter(report_file=name).exists():
+                continue
+            default_storage.delete(name)
+            deleted += 1
+
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(f"{prefix}{moved} report(s) content-addressed, {len(freed)} old file(s) replaced, "
+                          f"{deleted} deleted, {missing} missing.")
@@ -0,0 +1,53 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+from django.core.management.base import BaseCommand
+
+from apps.reports import text_extraction
+from apps.reports.models import MedicalReport
+
+
+class Command(BaseCommand):
+    help = "Extract the text of reports that are still pending (backfill and recovery)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Reports handed to a worker at a time')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='Worker processes')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry reports whose extraction failed')
+        parser.add_argument('--force', action='store_true', help='Extract every report again from the first page')
+
+    def handle(self, *args, **options):
+        if options['force']:
+            MedicalReport.objects.update(
+                extraction_status='pending', extracted_text='', extracted_pages=0,
+                page_count=None, extraction_started_at=None,
+            )
+        elif options['retry_failed']:
+            # Failed runs start over, as their saved progress may be what broke
+            MedicalReport.objects.filter(extraction_status='failed').update(
+                extraction_status='pending', extracted_text='', extracted_pages=0, extraction_started_at=None,
+            )
+
+        report_ids = list(
+            MedicalReport.objects.filter(text_extraction.runnable()).order_by('id').values_list('id', flat=True)
+        )
+        size = options['batch_size']
+        chunks = [report_ids[start:start + size] for start in range(0, len(report_ids), size)]
+
+        outcomes = Counter()
+        if options['workers'] <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                outcomes.update(text_extraction.extract_many(chunk))
+        else:
+            # PyPDF2 is pure Python, so chunks run in separate processes
+            with ProcessPoolExecutor(
+                max_workers=options['workers'], mp_context=get_context('spawn'), initializer=django.setup,
+            ) as pool:
+                for result in pool.map(text_extraction.extract_many, chunks):
+                    outcomes.update(result)
+
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(outcomes.items())) or 'nothing to do'
+        self.stdout.write(f"{len(report_ids)} report(s) processed: {summary}.")
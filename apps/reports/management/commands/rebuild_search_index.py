@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.reports import search
+from apps.reports.models import MedicalReport
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of reports from scratch"
+
+    def handle(self, *args, **options):
+        if not search.indexed():
+            self.stdout.write(f"The {connection.vendor} backend has no search index; nothing to do.")
+            return
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(f"{MedicalReport.objects.count()} report(s) indexed.")
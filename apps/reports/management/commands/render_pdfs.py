@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.reports import pdf_jobs
+
+
+class Command(BaseCommand):
+    help = "Render queued doctor-response PDFs (PDF_RENDER_MODE = 'background')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--daemon', action='store_true', help='Keep running and poll the queue every --interval seconds')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between polls of an empty queue in daemon mode')
+
+    def handle(self, *args, **options):
+        if not options['daemon']:
+            processed = pdf_jobs.run_pending()
+            self.stdout.write(f"{processed} PDF(s) rendered.")
+            return
+
+        self.stdout.write(f"Rendering queued PDFs, polling every {options['interval']}s")
+        try:
+            while True:
+                close_old_connections()
+                if not pdf_jobs.run_pending(limit=100):
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("PDF worker stopped.")
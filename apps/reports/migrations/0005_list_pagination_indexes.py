@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_doctorresponse_advice_doctorresponse_updated_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicalreport',
+            index=models.Index(fields=['patient', '-uploaded_at', '-id'], name='report_patient_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalreport',
+            index=models.Index(fields=['shared_with', '-uploaded_at', '-id'], name='report_shared_page_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0006_pdf_render_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalreport',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
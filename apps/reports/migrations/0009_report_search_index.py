@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE reports_search USING fts5("
+            "title, description, extracted_text, diagnosis, recommendations, "
+            "tokenize = 'porter unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO reports_search (rowid, title, description, extracted_text, diagnosis, recommendations) "
+            "SELECT r.id, r.title, r.description, r.extracted_text, "
+            "COALESCE(d.diagnosis, ''), COALESCE(d.recommendations, '') "
+            "FROM reports_medicalreport r LEFT JOIN reports_doctorresponse d ON d.report_id = r.id"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE reports_search ("
+            "report_id bigint PRIMARY KEY REFERENCES reports_medicalreport (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "INSERT INTO reports_search (report_id, document) "
+            "SELECT r.id, "
+            "setweight(to_tsvector('english', r.title), 'A') "
+            "|| setweight(to_tsvector('english', COALESCE(d.diagnosis, '')), 'B') "
+            "|| setweight(to_tsvector('english', r.description || ' ' || COALESCE(d.recommendations, '')), 'C') "
+            "|| setweight(to_tsvector('english', r.extracted_text), 'D') "
+            "FROM reports_medicalreport r LEFT JOIN reports_doctorresponse d ON d.report_id = r.id"
+        )
+        schema_editor.execute("CREATE INDEX reports_search_document_idx ON reports_search USING GIN (document)")
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE reports_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0008_report_text_extraction'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of the parser in prescriptions.py at the time of this migration
+COLUMNS = (('name', 200), ('dosage', 100), ('frequency', 200), ('duration', 100))
+
+
+def parse_prescriptions(apps, schema_editor):
+    DoctorResponse = apps.get_model('reports', 'DoctorResponse')
+    Medication = apps.get_model('reports', 'Medication')
+
+    batch = []
+    for response_id, text in DoctorResponse.objects.values_list('id', 'prescription').iterator(chunk_size=500):
+        lines = [line.strip() for line in (text or '').splitlines() if line.strip()]
+        if not any('|' in line for line in lines):
+            continue
+        for position, line in enumerate(lines):
+            parts = [part.strip() for part in line.split('|')][:len(COLUMNS)]
+            parts += [''] * (len(COLUMNS) - len(parts))
+            row = {column: value[:length] for (column, length), value in zip(COLUMNS, parts)}
+            row['name_key'] = ' '.join(row['name'].lower().split())[:200]
+            batch.append(Medication(response_id=response_id, position=position, **row))
+        if len(batch) >= 1000:
+            Medication.objects.bulk_create(batch)
+            batch = []
+    Medication.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0009_report_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Medication',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(help_text='Line of the prescription, from 0')),
+                ('name', models.CharField(max_length=200)),
+                ('name_key', models.CharField(max_length=200)),
+                ('dosage', models.CharField(blank=True, max_length=100)),
+                ('frequency', models.CharField(blank=True, max_length=200)),
+                ('duration', models.CharField(blank=True, max_length=100)),
+                ('response', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='medications', to='reports.doctorresponse')),
+            ],
+            options={
+                'ordering': ['response', 'position'],
+                'indexes': [models.Index(fields=['name_key', 'response'], name='medication_name_idx')],
+                'constraints': [models.UniqueConstraint(fields=('response', 'position'), name='unique_medication_position')],
+            },
+        ),
+        migrations.RunPython(parse_prescriptions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0010_medications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicalreport',
+            name='original_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -1,3 +1,6 @@
+import hashlib
+import os
+
 from django.db import models
 from django.contrib.auth.models import User
 import uuid
@@ -7,8 +10,27 @@ class MedicalReport(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     report_file = models.FileField(upload_to='medical_reports/')
+    # SHA-256 of the file; reports with identical files share one stored copy
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    # Name the file was uploaded with; the stored name is its content address
+    original_name = models.CharField(max_length=255, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     analysis_results = models.TextField(blank=True)
+    
+    # Text of PDF reports, filled in the background by text_extraction
+    EXTRACTION_STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    )
+    extracted_text = models.TextField(blank=True)
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    extraction_status = models.CharField(max_length=10, choices=EXTRACTION_STATUS_CHOICES, default='pending')
+    # Pages already in extracted_text; an interrupted extraction resumes here
+    extracted_pages = models.PositiveIntegerField(default=0)
+    extraction_started_at = models.DateTimeField(null=True, blank=True)
 
     # Category/Specialization for the report
     category = models.CharField(
@@ -34,9 +56,25 @@ class MedicalReport(models.Model):
     class Meta:
         app_label = 'reports'
         ordering = ['-uploaded_at']
+        indexes = [
+            # Keyset pagination of patients' and doctors' report lists
+            models.Index(fields=['patient', '-uploaded_at', '-id'], name='report_patient_page_idx'),
+            models.Index(fields=['shared_with', '-uploaded_at', '-id'], name='report_shared_page_idx'),
+            # Extraction workers and the backfill look up unfinished reports
+            models.Index(fields=['extraction_status', 'id'], name='report_extraction_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.patient.username}"
+    
+    @property
+    def file_key(self):
+        """Key that changes with the file: its content hash, else a hash of its stored name"""
+        return self.content_hash or hashlib.sha256(self.report_file.name.encode()).hexdigest()
+    
+    def download_name(self):
+        """File name to offer on download; reports stored before content addressing kept theirs"""
+        return self.original_name or os.path.basename(self.report_file.name)
 
 class DoctorResponse(models.Model):
     report = models.OneToOneField(MedicalReport, on_delete=models.CASCADE, related_name='doctor_response')
@@ -53,4 +91,79 @@ class DoctorResponse(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"Response for {self.report.title} by Dr. {self.doctor.last_name}"
\ No newline at end of file
+        return f"Response for {self.report.title} by Dr. {self.doctor.last_name}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored prescription so its medications are only re-parsed when it changes
+        instance._loaded_prescription = instance.__dict__.get('prescription')
+        return instance
+    
+    def prescription_changed(self):
+        """True for new responses and ones whose prescription text was edited"""
+        return getattr(self, '_loaded_prescription', None) != self.prescription
+
+class Medication(models.Model):
+    """One line of a DoctorResponse prescription, parsed when the response is saved"""
+    response = models.ForeignKey(DoctorResponse, on_delete=models.CASCADE, related_name='medications')
+    position = models.PositiveSmallIntegerField(help_text="Line of the prescription, from 0")
+    name = models.CharField(max_length=200)
+    # Lower-cased name with single spaces, for grouping and lookups by drug
+    name_key = models.CharField(max_length=200)
+    dosage = models.CharField(max_length=100, blank=True)
+    frequency = models.CharField(max_length=200, blank=True)
+    duration = models.CharField(max_length=100, blank=True)
+    
+    class Meta:
+        app_label = 'reports'
+        ordering = ['response', 'position']
+        indexes = [
+            # Patients on a drug, and per-doctor counts of each drug
+            models.Index(fields=['name_key', 'response'], name='medication_name_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['response', 'position'], name='unique_medication_position'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.dosage})" if self.dosage else self.name
+
+class PdfRenderJob(models.Model):
+    """A queued rendering of a DoctorResponse PDF, processed by ``render_pdfs``"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    
+    # Random ids so that job status URLs cannot be enumerated
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    response = models.ForeignKey(DoctorResponse, on_delete=models.CASCADE, related_name='render_jobs')
+    rendition = models.CharField(max_length=255, help_text="Storage name of the rendered PDF")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        app_label = 'reports'
+        ordering = ['created_at']
+        indexes = [
+            # Workers pick the oldest pending job
+            models.Index(fields=['status', 'created_at'], name='pdf_job_queue_idx'),
+        ]
+        constraints = [
+            # At most one queued or running job per version of a response
+            models.UniqueConstraint(
+                fields=['rendition'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_active_pdf_job',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"PDF job {self.id} ({self.status})"
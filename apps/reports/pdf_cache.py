@@ -0,0 +1,151 @@
+"""
+Cached PDF renditions of doctor responses.
+
+A rendition only changes when its DoctorResponse is edited or the patient
+and doctor details printed on it change, so it is stored in the default
+storage under a name derived from the response id, ``updated_at`` and those
+details: any change yields a new name and a stale file can never be served.
+When several requests miss at once, a cache lock lets one of them render
+while the others wait for its file (single flight).
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from apps.users.models import Profile
+from .pdf_utils import create_medical_response_pdf
+
+CACHE_DIR = 'pdf_cache/responses'
+LOCK_TIMEOUT = 60
+WAIT_SECONDS = 30
+# Waiters poll the lock, doubling the interval up to the maximum
+POLL_SECONDS = 0.1
+MAX_POLL_SECONDS = 1
+
+
+def rendition_name(response):
+    """
+    Storage name of the current rendition of ``response``.
+
+    Reads the patient and doctor with their profiles; load them with
+    ``select_related('report__patient__profile', 'doctor__profile')``.
+    """
+    patient_info, doctor_info = pdf_info(response.report, response)
+    key = json.dumps(
+        [response.pk, response.updated_at.isoformat(), patient_info, doctor_info], sort_keys=True,
+    )
+    return f'{CACHE_DIR}/{response.pk}/{hashlib.sha256(key.encode()).hexdigest()}.pdf'
+
+
+def pdf_info(report, response):
+    """Patient and doctor details printed on the PDF, as (patient_info, doctor_info)."""
+    # Handle missing Profile gracefully; select_related('...__profile') avoids the queries
+    try:
+        patient_profile = report.patient.profile
+        patient_info = {
+            'full_name': report.patient.get_full_name() or report.patient.username,
+            'contact': patient_profile.phone if patient_profile.phone else 'Not specified',
+            'address': patient_profile.address if patient_profile.address else 'Not specified',
+        }
+    except Profile.DoesNotExist:
+        patient_info = {
+            'full_name': report.patient.get_full_name() or report.patient.username,
+            'contact': 'Not specified',
+            'address': 'Not specified',
+        }
+    
+    try:
+        doctor_profile = response.doctor.profile
+        doctor_info = {
+            'full_name': response.doctor.get_full_name() or response.doctor.username,
+            'specialization': doctor_profile.get_specialization_display() if doctor_profile.specialization else 'Consultant',
+            'license': doctor_profile.license_number if doctor_profile.license_number else f'MED-{response.doctor.id:05d}',
+            'hospital': doctor_profile.hospital_name if doctor_profile.hospital_name else 'Not specified',
+            'experience': f"{doctor_profile.experience} years" if doctor_profile.experience else 'Not specified',
+        }
+    except Profile.DoesNotExist:
+        doctor_info = {
+            'full_name': response.doctor.get_full_name() or response.doctor.username,
+            'specialization': 'Consultant',
+            'license': f'MED-{response.doctor.id:05d}',
+            'hospital': 'Not specified',
+            'experience': 'Not specified',
+        }
+    
+    return patient_info, doctor_info
+
+
+def render_response_pdf(report, response):
+    """Lay out the PDF for ``response`` (no caching)."""
+    return create_medical_response_pdf(report, response, *pdf_info(report, response))
+
+
+def _read(name):
+    if not default_storage.exists(name):
+        return None
+    with default_storage.open(name, 'rb') as rendition:
+        return rendition.read()
+
+
+def get_stored_pdf(response):
+    """Return the stored PDF bytes for the current version of ``response``, or None."""
+    return _read(rendition_name(response))
+
+
+def store_pdf(response, content):
+    """Store freshly rendered bytes as the current rendition of ``response``."""
+    name = rendition_name(response)
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(content))
+
+
+def get_response_pdf(report, response):
+    """Return the PDF bytes for ``response``, rendering at most once per version."""
+    name = rendition_name(response)
+    content = _read(name)
+    if content is not None:
+        return content
+
+    lock_key = f'pdf_cache:lock:{name}'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            # Another request may have finished while we took the lock
+            content = _read(name)
+            if content is None:
+                content = render_response_pdf(report, response)
+                default_storage.save(name, ContentFile(content))
+            return content
+        finally:
+            cache.delete(lock_key)
+
+    # Someone else is rendering this version. The lock is released only once
+    # their file is stored, so storage is read once the lock is gone rather
+    # than on every poll
+    deadline = time.monotonic() + WAIT_SECONDS
+    delay = POLL_SECONDS
+    while time.monotonic() < deadline and cache.get(lock_key) is not None:
+        time.sleep(delay)
+        delay = min(delay * 2, MAX_POLL_SECONDS)
+    content = _read(name)
+    if content is not None:
+        return content
+    # The renderer gave up without producing a file, or is taking too long
+    return render_response_pdf(report, response)
+
+
+def invalidate(response):
+    """Delete every stored rendition of ``response`` except the current one."""
+    directory = f'{CACHE_DIR}/{response.pk}'
+    current = rendition_name(response)
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        name = f'{directory}/{filename}'
+        if name != current:
+            default_storage.delete(name)
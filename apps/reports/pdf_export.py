@@ -0,0 +1,124 @@
+"""
+Bulk export of consultation PDFs as a streamed ZIP archive.
+
+PDFs already in the rendition store are read from storage; the rest are laid
+out in ``PDF_EXPORT_WORKERS`` worker processes (reportlab is pure Python, so
+threads would serialise on the GIL). The processes belong to one export:
+they are started when its first PDF has to be rendered and shut down when
+it ends, so idle web workers hold no extra processes. Each PDF is written
+to the archive as soon as it is available and the archive is streamed to
+the client while it is being built: at most ``IN_FLIGHT`` documents are
+held in memory at any time, however many are exported.
+"""
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+
+from . import pdf_cache
+from .pdf_utils import create_medical_response_pdf, generate_pdf_filename
+
+EXPORT_WORKERS = getattr(settings, 'PDF_EXPORT_WORKERS', 2)
+IN_FLIGHT = max(1, EXPORT_WORKERS * 2)
+MAX_EXPORT = 500
+
+
+def _new_pool():
+    """Process pool for one export; the caller shuts it down."""
+    # Fresh interpreters rather than forks, so no database connection is
+    # shared with the parent; workers only need the models importable
+    return ProcessPoolExecutor(
+        max_workers=EXPORT_WORKERS,
+        mp_context=get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+class _StreamWriter:
+    """Unseekable file object collecting what zipfile writes until it is drained."""
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_queryset(responses):
+    """DoctorResponses with everything the PDFs print, ready for ``stream_zip``."""
+    return responses.select_related(
+        'report__patient__profile', 'doctor__profile'
+    ).defer('report__extracted_text').prefetch_related('medications').order_by('-created_at')[:MAX_EXPORT]
+
+
+def _archive_name(report, response):
+    # Several consultations can share patient, doctor and day
+    return f'{report.id}_{generate_pdf_filename(report, response)}'
+
+
+def _documents(responses):
+    """Yield (archive name, PDF bytes) in completion order, rendering misses in parallel."""
+    pool = None
+    pending = {}
+    try:
+        for response in responses:
+            report = response.report
+            content = pdf_cache.get_stored_pdf(response)
+            if content is not None:
+                yield _archive_name(report, response), content
+                continue
+            
+            patient_info, doctor_info = pdf_cache.pdf_info(report, response)
+            if not EXPORT_WORKERS:
+                content = create_medical_response_pdf(report, response, patient_info, doctor_info)
+                pdf_cache.store_pdf(response, content)
+                yield _archive_name(report, response), content
+                continue
+            
+            pool = pool or _new_pool()
+            future = pool.submit(create_medical_response_pdf, report, response, patient_info, doctor_info)
+            pending[future] = (report, response)
+            
+            # Bound the documents held in memory
+            while len(pending) >= IN_FLIGHT:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _finish(future, *pending.pop(future))
+        
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _finish(future, *pending.pop(future))
+    finally:
+        if pool is not None:
+            # Also reached when the client went away: drop renders that have
+            # not started, and let the processes exit after the running ones
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _finish(future, report, response):
+    content = future.result()
+    pdf_cache.store_pdf(response, content)
+    return _archive_name(report, response), content
+
+
+def stream_zip(responses):
+    """Generator of ZIP archive chunks containing one PDF per response."""
+    stream = _StreamWriter()
+    # PDFs are already compressed; storing them keeps the CPU for rendering
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, content in _documents(responses):
+            archive.writestr(name, content)
+            yield stream.drain()
+    yield stream.drain()
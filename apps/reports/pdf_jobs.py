@@ -0,0 +1,97 @@
+"""
+Background rendering of doctor-response PDFs.
+
+With ``PDF_RENDER_MODE = 'background'`` a download that misses the rendition
+store does not render on the web worker: it queues a PdfRenderJob row and
+returns at once, and the ``render_pdfs`` management command picks jobs off
+the queue and stores the result through pdf_cache. Clients poll the job's
+status and fetch the PDF from storage once it is done. The default
+``'inline'`` mode renders within the request as before.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import pdf_cache
+from .models import PdfRenderJob
+
+RENDER_MODE = getattr(settings, 'PDF_RENDER_MODE', 'inline')
+MAX_ATTEMPTS = 3
+
+# A running job whose worker died is retried after this long
+STALE_AFTER = timedelta(minutes=5)
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+def offloaded():
+    return RENDER_MODE == 'background'
+
+
+def submit(response):
+    """Queue a rendering of the current version of ``response`` (at most one at a time)."""
+    name = pdf_cache.rendition_name(response)
+    job = PdfRenderJob.objects.filter(rendition=name, status__in=ACTIVE_STATUSES).first()
+    if job:
+        return job
+    try:
+        with transaction.atomic():
+            return PdfRenderJob.objects.create(response=response, rendition=name)
+    except IntegrityError:
+        # Another request queued the same version first
+        return PdfRenderJob.objects.get(rendition=name, status__in=ACTIVE_STATUSES)
+
+
+def claim_next():
+    """
+    Atomically take the oldest runnable job and mark it running.
+    
+    The claim is a conditional UPDATE, so concurrent workers never run the
+    same job and no row locks are held while rendering.
+    """
+    now = timezone.now()
+    runnable = PdfRenderJob.objects.filter(
+        Q(status='pending') | Q(status='running', started_at__lt=now - STALE_AFTER)
+    ).order_by('created_at')
+    for job in runnable.only('id', 'status', 'started_at')[:10]:
+        claimed = PdfRenderJob.objects.filter(
+            id=job.id, status=job.status, started_at=job.started_at
+        ).update(status='running', started_at=now, attempts=F('attempts') + 1)
+        if claimed:
+            return PdfRenderJob.objects.select_related(
+                'response__report__patient__profile', 'response__doctor__profile'
+            ).prefetch_related('response__medications').get(id=job.id)
+    return None
+
+
+def run(job):
+    """Render ``job`` into the rendition store and record the outcome."""
+    response = job.response
+    try:
+        pdf_cache.get_response_pdf(response.report, response)
+    except Exception as exc:
+        job.status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'pending'
+        job.error = f'{type(exc).__name__}: {exc}'
+    else:
+        job.status = 'done'
+        job.error = ''
+        # The response may have been edited while queued; point at what was stored
+        job.rendition = pdf_cache.rendition_name(response)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'rendition', 'finished_at'])
+    return job
+
+
+def run_pending(limit=None):
+    """Process queued jobs until the queue is empty or ``limit`` jobs ran."""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run(job)
+        processed += 1
+    return processed
@@ -0,0 +1,82 @@
+"""
+Structured medications parsed from DoctorResponse prescriptions.
+
+Doctors write prescriptions as free text, one medication per line in the
+form ``Name | Dosage | Frequency | Duration``. The text is split into
+Medication rows once, whenever a response is saved with a new prescription
+(see signals.py), so the PDF, the detail page and the prescribing queries
+below read rows instead of re-parsing text. Prescriptions without any pipe
+are prose and produce no rows.
+"""
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from .models import Medication
+
+COLUMNS = ('name', 'dosage', 'frequency', 'duration')
+
+
+def name_key(name):
+    """Lower-cased name with single spaces, used to group and look up drugs."""
+    return ' '.join(name.lower().split())[:Medication._meta.get_field('name_key').max_length]
+
+
+def parse(text):
+    """Split a prescription into dicts of COLUMNS, or [] for a prose prescription."""
+    lines = [line.strip() for line in (text or '').splitlines()]
+    lines = [line for line in lines if line]
+    if not any('|' in line for line in lines):
+        return []
+
+    rows = []
+    for line in lines:
+        # Extra columns are dropped; lines without a pipe keep only a name
+        parts = [part.strip() for part in line.split('|')][:len(COLUMNS)]
+        parts += [''] * (len(COLUMNS) - len(parts))
+        row = {
+            column: value[:Medication._meta.get_field(column).max_length]
+            for column, value in zip(COLUMNS, parts)
+        }
+        row['name_key'] = name_key(row['name'])
+        rows.append(row)
+    return rows
+
+
+def sync(response):
+    """Replace the medication rows of a saved ``response`` with its current prescription."""
+    with transaction.atomic():
+        Medication.objects.filter(response=response).delete()
+        Medication.objects.bulk_create(
+            Medication(response=response, position=position, **row)
+            for position, row in enumerate(parse(response.prescription))
+        )
+    # Drop rows prefetched before the edit
+    getattr(response, '_prefetched_objects_cache', {}).pop('medications', None)
+
+
+def for_response(response):
+    """Medication rows of ``response``, in prescription order."""
+    if response.pk is None:
+        # Unsaved responses (previews, benchmarks) have no rows yet
+        return [Medication(position=position, **row) for position, row in enumerate(parse(response.prescription))]
+    return list(response.medications.all())
+
+
+def patients_on(drug, doctor=None):
+    """Patients prescribed ``drug``, most recently prescribed first, optionally by one doctor."""
+    medications = Medication.objects.filter(name_key=name_key(drug))
+    if doctor is not None:
+        medications = medications.filter(response__doctor=doctor)
+    return medications.values(
+        'response__report__patient', 'response__report__patient__first_name',
+        'response__report__patient__last_name', 'response__report__patient__username',
+    ).annotate(
+        prescriptions=Count('response', distinct=True), last_prescribed=Max('response__created_at'),
+    ).order_by('-last_prescribed')
+
+
+def top_prescriptions(doctor, limit=10):
+    """The drugs ``doctor`` prescribes most often, with how many responses include each."""
+    return Medication.objects.filter(response__doctor=doctor).exclude(name_key='').values('name_key').annotate(
+        name=Min('name'), prescriptions=Count('response', distinct=True),
+    ).order_by('-prescriptions', 'name_key')[:limit]
@@ -0,0 +1,119 @@
+"""
+Preview derivatives of report files.
+
+Each report file gets a ``thumb`` and a ``screen`` WebP rendition, made the
+first time one is requested and stored under a key derived from the file's
+content hash. The same content always maps to the same key and a stored
+derivative never changes, so previews are shared between reports that
+reference identical files. Preview URLs carry the same key, which lets them
+be served with year-long cache headers: a report whose file changes gets
+new URLs.
+
+Images are scaled with Pillow. PDFs are previewed by rasterising their
+first page with PDFium, straight at the variant's size; files PDFium cannot
+open get a generated placeholder card instead.
+"""
+import threading
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageDraw, ImageOps, UnidentifiedImageError
+import pypdfium2 as pdfium
+
+from . import uploads
+
+# Files Pillow cannot decode, including oversized ("decompression bomb") images;
+# the warning is raised when warnings are errors, as they are under -W error
+DECODE_ERRORS = (UnidentifiedImageError, OSError, Image.DecompressionBombError, Image.DecompressionBombWarning)
+
+PREVIEW_DIR = 'previews'
+VARIANTS = {
+    'thumb': (320, 320),
+    'screen': (1280, 1280),
+}
+QUALITY = 80
+
+
+def preview_name(report, variant):
+    key = report.file_key
+    return f'{PREVIEW_DIR}/{key[:2]}/{key}/{variant}.webp'
+
+
+# PDFium is not thread-safe; rendering threads take turns
+_pdfium_lock = threading.Lock()
+
+
+def _first_pdf_page_image(data, size):
+    """First page of a PDF rendered to fit ``size``, or None."""
+    with _pdfium_lock:
+        try:
+            document = pdfium.PdfDocument(data)
+        except pdfium.PdfiumError:
+            return None
+        try:
+            if len(document) == 0:
+                return None
+            page = document[0]
+            width, height = page.get_size()
+            if width <= 0 or height <= 0:
+                return None
+            scale = min(size[0] / width, size[1] / height)
+            # Copied out of PDFium's bitmap before the document is closed
+            return page.render(scale=scale).to_pil().copy()
+        except pdfium.PdfiumError:
+            return None
+        finally:
+            document.close()
+
+
+def _placeholder(size, label):
+    """A plain document card for files that cannot be rendered."""
+    width = size[0]
+    height = int(width * 1.414)
+    card = Image.new('RGB', (width, height), '#f5f5f5')
+    draw = ImageDraw.Draw(card)
+    margin = width // 10
+    draw.rectangle([margin, margin, width - margin, height - margin], fill='white', outline='#bdbdbd', width=2)
+    for offset in range(5):
+        y = margin * 3 + offset * margin
+        draw.line([margin * 2, y, width - margin * 2, y], fill='#e0e0e0', width=max(1, width // 80))
+    draw.text((margin * 2, height - margin * 3), label, fill='#1a237e')
+    return card
+
+
+def render(data, variant):
+    """WebP bytes of ``variant`` for a file with the given content."""
+    size = VARIANTS[variant]
+    if uploads.sniff(data[:uploads.SNIFF_BYTES]) == 'pdf':
+        image = _first_pdf_page_image(data, size) or _placeholder(size, 'PDF document')
+    else:
+        try:
+            image = Image.open(BytesIO(data))
+            image.load()
+        except DECODE_ERRORS:
+            image = _placeholder(size, 'Preview unavailable')
+    
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    image.thumbnail(size, Image.LANCZOS)
+    
+    output = BytesIO()
+    image.save(output, 'WEBP', quality=QUALITY, method=4)
+    return output.getvalue()
+
+
+def get_preview(report, variant):
+    """Storage name of ``variant`` for ``report``'s file, rendering it on first request."""
+    name = preview_name(report, variant)
+    if default_storage.exists(name):
+        return name
+    
+    with report.report_file.open('rb') as original:
+        data = original.read()
+    content = render(data, variant)
+    
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name
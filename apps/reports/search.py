@@ -0,0 +1,146 @@
+"""
+Full-text search over reports and their doctor responses.
+
+Each report has one row in the ``reports_search`` index covering its title,
+description and extracted text plus the diagnosis and recommendations of its
+response. On SQLite the index is an FTS5 table keyed by report id; on
+PostgreSQL it is a table of weighted ``tsvector`` documents with a GIN index
+(both created in migration 0009). The row of a report is rebuilt from a
+single SELECT whenever the report or its response is saved (see signals.py)
+and when text extraction finishes. Other database backends have no index and
+fall back to a slow ``icontains`` scan.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import MedicalReport
+
+MAX_RESULTS = 50
+
+# Relative weight of title, description, extracted text, diagnosis, recommendations
+_BM25_WEIGHTS = (10.0, 2.0, 1.0, 5.0, 2.0)
+
+_SQLITE_SOURCE = """
+    SELECT r.id, r.title, r.description, r.extracted_text,
+           COALESCE(d.diagnosis, ''), COALESCE(d.recommendations, '')
+    FROM reports_medicalreport r
+    LEFT JOIN reports_doctorresponse d ON d.report_id = r.id
+"""
+
+_POSTGRES_SOURCE = """
+    SELECT r.id,
+           setweight(to_tsvector('english', r.title), 'A')
+           || setweight(to_tsvector('english', COALESCE(d.diagnosis, '')), 'B')
+           || setweight(to_tsvector('english', r.description || ' ' || COALESCE(d.recommendations, '')), 'C')
+           || setweight(to_tsvector('english', r.extracted_text), 'D')
+    FROM reports_medicalreport r
+    LEFT JOIN reports_doctorresponse d ON d.report_id = r.id
+"""
+
+_WORDS = re.compile(r'\w+')
+
+
+def indexed():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def index_report(report_id):
+    """Rebuild the index row of one report from its current data."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("DELETE FROM reports_search WHERE rowid = %s", [report_id])
+            cursor.execute(
+                "INSERT INTO reports_search (rowid, title, description, extracted_text, diagnosis, recommendations)"
+                f" {_SQLITE_SOURCE} WHERE r.id = %s",
+                [report_id],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f"INSERT INTO reports_search (report_id, document) {_POSTGRES_SOURCE} WHERE r.id = %s"
+                " ON CONFLICT (report_id) DO UPDATE SET document = EXCLUDED.document",
+                [report_id],
+            )
+
+
+def remove_report(report_id):
+    # PostgreSQL rows go with the report through their foreign key
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM reports_search WHERE rowid = %s", [report_id])
+
+
+def rebuild():
+    """Re-index every report in one statement."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("DELETE FROM reports_search")
+            cursor.execute(
+                "INSERT INTO reports_search (rowid, title, description, extracted_text, diagnosis, recommendations)"
+                f" {_SQLITE_SOURCE}"
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("TRUNCATE reports_search")
+            cursor.execute(f"INSERT INTO reports_search (report_id, document) {_POSTGRES_SOURCE}")
+
+
+def _fts5_query(words):
+    # Quoted terms cannot be read as FTS5 operators; the last one matches as a prefix
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _visibility(user):
+    if user.is_staff:
+        return '', []
+    return ' AND (r.patient_id = %s OR r.shared_with_id = %s)', [user.id, user.id]
+
+
+def _ranked_ids(user, query, limit):
+    words = _WORDS.findall(query)
+    visible, params = _visibility(user)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            weights = ', '.join(str(weight) for weight in _BM25_WEIGHTS)
+            cursor.execute(
+                "SELECT r.id FROM reports_search s JOIN reports_medicalreport r ON r.id = s.rowid"
+                f" WHERE reports_search MATCH %s{visible}"
+                f" ORDER BY bm25(reports_search, {weights}), r.uploaded_at DESC LIMIT %s",
+                [_fts5_query(words), *params, limit],
+            )
+        else:
+            cursor.execute(
+                "SELECT r.id FROM reports_search s JOIN reports_medicalreport r ON r.id = s.report_id,"
+                " websearch_to_tsquery('english', %s) q"
+                f" WHERE s.document @@ q{visible}"
+                " ORDER BY ts_rank(s.document, q) DESC, r.uploaded_at DESC LIMIT %s",
+                [query, *params, limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _scan(user, query, limit):
+    reports = MedicalReport.objects.all()
+    if not user.is_staff:
+        reports = reports.filter(Q(patient=user) | Q(shared_with=user))
+    for word in _WORDS.findall(query):
+        reports = reports.filter(
+            Q(title__icontains=word) | Q(description__icontains=word) | Q(extracted_text__icontains=word)
+            | Q(doctor_response__diagnosis__icontains=word) | Q(doctor_response__recommendations__icontains=word)
+        )
+    return list(reports.select_related('patient', 'shared_with', 'doctor_response').defer('extracted_text')[:limit])
+
+
+def search(user, query, limit=MAX_RESULTS):
+    """Reports visible to ``user`` that match ``query``, best match first."""
+    if not _WORDS.search(query):
+        return []
+    if not indexed():
+        return _scan(user, query, limit)
+    ids = _ranked_ids(user, query, limit)
+    reports = MedicalReport.objects.select_related(
+        'patient', 'shared_with', 'doctor_response'
+    ).defer('extracted_text').in_bulk(ids)
+    return [reports[report_id] for report_id in ids if report_id in reports]
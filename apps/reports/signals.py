@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import MedicalReport, DoctorResponse
+from . import prescriptions, search
+
+@receiver(post_save, sender=MedicalReport)
+def index_saved_report(sender, instance, **kwargs):
+    search.index_report(instance.pk)
+
+@receiver(post_delete, sender=MedicalReport)
+def unindex_deleted_report(sender, instance, **kwargs):
+    search.remove_report(instance.pk)
+
+@receiver(post_save, sender=DoctorResponse)
+@receiver(post_delete, sender=DoctorResponse)
+def index_response_report(sender, instance, **kwargs):
+    search.index_report(instance.report_id)
+
+@receiver(post_save, sender=DoctorResponse)
+def parse_prescription(sender, instance, **kwargs):
+    if instance.prescription_changed():
+        prescriptions.sync(instance)
+    # The saved prescription is now what the database holds
+    instance._loaded_prescription = instance.prescription
@@ -1,3 +1,925 @@
-from django.test import TestCase
+import hashlib
+import shutil
+import struct
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import Future
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import boto3
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from moto import mock_aws
+from PIL import Image
+from PyPDF2 import PdfReader
+from reportlab.pdfgen import canvas
+
+from . import (
+    direct_upload, downloads, pdf_cache, pdf_export, pdf_jobs, pdf_utils, prescriptions, previews, search,
+    text_extraction, uploads,
+)
+from .models import DoctorResponse, MedicalReport, Medication, PdfRenderJob
+
+
+def make_user(username, user_type, **fields):
+    user = User.objects.create_user(username=username, **fields)
+    user.profile.user_type = user_type
+    user.profile.status = 'approved'
+    user.profile.save()
+    return user
+
+
+def make_response(report, doctor, **fields):
+    fields = {
+        'diagnosis': 'Mild iron deficiency anaemia.',
+        'prescription': 'Ferrous sulfate | 200mg | Twice daily | 3 months',
+        'recommendations': 'Repeat the blood count in three months.',
+        **fields,
+    }
+    return DoctorResponse.objects.create(report=report, doctor=doctor, **fields)
+
+
+class MediaTestCase(TestCase):
+    """Stores files under a temporary MEDIA_ROOT, removed after the class"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+
+BUCKET = 'test-reports'
+
+S3_SETTINGS = {
+    'STORAGES': {
+        'default': {'BACKEND': 'storages.backends.s3.S3Storage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    'AWS_STORAGE_BUCKET_NAME': BUCKET,
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'AWS_S3_REGION_NAME': 'us-east-1',
+    'AWS_S3_ENDPOINT_URL': None,
+}
+
+
+class S3TestCase(TestCase):
+    """Default storage is S3, served by moto's in-process stand-in"""
+
+    def setUp(self):
+        cache.clear()
+        self.enterContext(override_settings(**S3_SETTINGS))
+        self.enterContext(mock_aws())
+        self.s3 = boto3.client('s3', region_name='us-east-1')
+        self.s3.create_bucket(Bucket=BUCKET)
+
+    def keys(self):
+        return sorted(item['Key'] for item in self.s3.list_objects_v2(Bucket=BUCKET).get('Contents', []))
+
+
+PDF_BYTES = b'%PDF-1.4\n1 0 obj << >> endobj\ntrailer << >>\n%%EOF\n'
+
+
+class ResponsePdfTests(TestCase):
+    def setUp(self):
+        self.patient = make_user('patient', 'patient', first_name='Asha', last_name='Rao')
+        self.doctor = make_user('doctor', 'doctor', first_name='Vikram', last_name='Sen')
+        self.report = MedicalReport.objects.create(patient=self.patient, title='Complete blood count')
+        self.response = make_response(self.report, self.doctor)
+
+    def pages(self):
+        pdf = pdf_utils.create_medical_response_pdf(self.report, self.response)
+        return [page.extract_text() for page in PdfReader(BytesIO(pdf)).pages]
+
+    def test_first_page_has_the_response(self):
+        first = self.pages()[0]
+        for text in ('Asha Rao', 'Dr. Vikram Sen', 'Complete blood count', 'Mild iron deficiency anaemia.', 'Ferrous sulfate', '200mg'):
+            self.assertIn(text, first)
+
+    def test_last_page_has_the_notes_and_signatures(self):
+        last = self.pages()[-1]
+        self.assertIn('IMPORTANT MEDICAL INFORMATION', last)
+        for number, (title, content) in enumerate(pdf_utils.IMPORTANT_NOTES, 1):
+            self.assertIn(f'{number}. {title}', last)
+        self.assertIn("Doctor's Signature", last)
+        self.assertIn('Dr. Vikram Sen', last)
+
+    def test_footer_dates_the_response_not_the_rendering(self):
+        updated_at = timezone.localtime(self.response.updated_at).strftime('%Y-%m-%d at %H:%M:%S')
+        self.assertIn(f'Last Updated: {updated_at}', self.pages()[-1])
+
+    def test_styles_are_shared(self):
+        self.assertIs(pdf_utils.get_styles(), pdf_utils.get_styles())
+
+
+class PdfCacheTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patient = make_user('patient', 'patient', first_name='Asha', last_name='Rao')
+        self.doctor = make_user('doctor', 'doctor', first_name='Vikram', last_name='Sen')
+        self.report = MedicalReport.objects.create(patient=self.patient, title='Complete blood count')
+        make_response(self.report, self.doctor)
+
+    def response(self):
+        return DoctorResponse.objects.select_related('report__patient__profile', 'doctor__profile').get()
+
+    def test_miss_renders_and_stores_then_hits(self):
+        response = self.response()
+        with mock.patch.object(pdf_cache, 'render_response_pdf', wraps=pdf_cache.render_response_pdf) as render:
+            first = pdf_cache.get_response_pdf(response.report, response)
+            second = pdf_cache.get_response_pdf(response.report, response)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertTrue(default_storage.exists(pdf_cache.rendition_name(response)))
+        self.assertEqual(pdf_cache.get_stored_pdf(response), first)
+
+    def test_response_edit_changes_the_rendition(self):
+        response = self.response()
+        before = pdf_cache.rendition_name(response)
+        pdf_cache.get_response_pdf(response.report, response)
+        response.diagnosis = 'Resolved.'
+        response.save()
+        self.assertNotEqual(pdf_cache.rendition_name(response), before)
+        self.assertIsNone(pdf_cache.get_stored_pdf(response))
+
+        pdf_cache.get_response_pdf(response.report, response)
+        pdf_cache.invalidate(response)
+        self.assertFalse(default_storage.exists(before))
+
+    def test_printed_details_change_the_rendition(self):
+        before = pdf_cache.rendition_name(self.response())
+        User.objects.filter(pk=self.patient.pk).update(last_name='Rao-Iyer')
+        self.assertNotEqual(pdf_cache.rendition_name(self.response()), before)
+
+        before = pdf_cache.rendition_name(self.response())
+        self.doctor.profile.hospital_name = 'City Hospital'
+        self.doctor.profile.save()
+        self.assertNotEqual(pdf_cache.rendition_name(self.response()), before)
+
+    def test_download_serves_the_stored_rendition(self):
+        self.client.force_login(self.patient)
+        with mock.patch.object(pdf_cache, 'render_response_pdf', wraps=pdf_cache.render_response_pdf) as render:
+            first = self.client.get(reverse('download_response_pdf', args=[self.report.id]))
+            second = self.client.get(reverse('download_response_pdf', args=[self.report.id]))
+        self.assertEqual(first['Content-Type'], 'application/pdf')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(render.call_count, 1)
+
+    def test_rendition_is_stable_without_changes(self):
+        self.assertEqual(pdf_cache.rendition_name(self.response()), pdf_cache.rendition_name(self.response()))
+
+    def test_waiter_reads_storage_once_the_lock_is_released(self):
+        response = self.response()
+        name = pdf_cache.rendition_name(response)
+        lock_key = f'pdf_cache:lock:{name}'
+        cache.add(lock_key, 1)
+        polls = []
+
+        def sleep(seconds):
+            polls.append(seconds)
+            if len(polls) == 3:
+                # The other request finishes rendering
+                default_storage.save(name, ContentFile(b'%PDF rendered elsewhere'))
+                cache.delete(lock_key)
+
+        with mock.patch.object(pdf_cache.time, 'sleep', sleep), \
+                mock.patch.object(pdf_cache, '_read', wraps=pdf_cache._read) as read, \
+                mock.patch.object(pdf_cache, 'render_response_pdf') as render:
+            content = pdf_cache.get_response_pdf(response.report, response)
+        self.assertEqual(content, b'%PDF rendered elsewhere')
+        render.assert_not_called()
+        self.assertEqual(polls, [0.1, 0.2, 0.4])
+        # One read before taking the lock failed, one after it was released
+        self.assertEqual(read.call_count, 2)
+
+    def test_waiter_renders_when_the_renderer_gives_up(self):
+        response = self.response()
+        lock_key = f'pdf_cache:lock:{pdf_cache.rendition_name(response)}'
+        cache.add(lock_key, 1)
+        with mock.patch.object(pdf_cache.time, 'sleep', lambda seconds: cache.delete(lock_key)):
+            content = pdf_cache.get_response_pdf(response.report, response)
+        self.assertTrue(content.startswith(b'%PDF'))
+
+
+@mock.patch.object(pdf_jobs, 'RENDER_MODE', 'background')
+class PdfRenderJobTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patient = make_user('patient', 'patient')
+        self.doctor = make_user('doctor', 'doctor')
+        self.report = MedicalReport.objects.create(patient=self.patient, title='Complete blood count')
+        self.response = make_response(self.report, self.doctor)
+        self.client.force_login(self.patient)
+
+    def download(self, **headers):
+        return self.client.get(reverse('download_response_pdf', args=[self.report.id]), **headers)
+
+    def test_download_queues_one_job_per_version(self):
+        first = self.download(HTTP_ACCEPT='application/json')
+        second = self.download()
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.status_code, 202)
+        job = PdfRenderJob.objects.get()
+        self.assertEqual(first.json()['job_id'], str(job.id))
+        self.assertContains(second, reverse('pdf_render_status', args=[job.id]), status_code=202)
+
+    def test_worker_renders_and_download_serves_the_file(self):
+        self.download()
+        self.assertEqual(pdf_jobs.run_pending(), 1)
+        job = PdfRenderJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ('done', 1))
+
+        status = self.client.get(reverse('pdf_render_status', args=[job.id])).json()
+        self.assertEqual(status['download_url'], reverse('download_response_pdf', args=[self.report.id]))
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(pdf_jobs.run_pending(), 0)
+
+    def test_failed_render_is_retried_then_given_up(self):
+        job = pdf_jobs.submit(self.response)
+        with mock.patch.object(pdf_cache, 'render_response_pdf', side_effect=ValueError('bad layout')):
+            for attempt in range(pdf_jobs.MAX_ATTEMPTS):
+                pdf_jobs.run_pending(limit=1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', pdf_jobs.MAX_ATTEMPTS))
+        self.assertEqual(job.error, 'ValueError: bad layout')
+        self.assertIsNone(pdf_jobs.claim_next())
+
+    def test_status_is_private_to_the_patient(self):
+        job = pdf_jobs.submit(self.response)
+        self.client.force_login(make_user('other', 'patient'))
+        self.assertEqual(self.client.get(reverse('pdf_render_status', args=[job.id])).status_code, 404)
+
+
+class ExportTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patient = make_user('patient', 'patient', first_name='Asha', last_name='Rao')
+        self.doctor = make_user('doctor', 'doctor', last_name='Sen')
+        self.reports = []
+        for number in range(3):
+            report = MedicalReport.objects.create(patient=self.patient, title=f'Report {number}')
+            make_response(report, self.doctor)
+            self.reports.append(report)
+        self.client.force_login(self.patient)
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_response_pdfs'), params)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        return response, {name: archive.read(name) for name in archive.namelist()}
+
+    def test_archive_has_one_pdf_per_consultation(self):
+        with mock.patch.object(pdf_export, 'EXPORT_WORKERS', 0):
+            response, files = self.export()
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(sorted(name.split('_', 1)[0] for name in files), sorted(str(report.id) for report in self.reports))
+        for content in files.values():
+            self.assertIn('IMPORTANT MEDICAL INFORMATION', PdfReader(BytesIO(content)).pages[-1].extract_text())
+
+    def test_rendered_pdfs_are_stored_and_reused(self):
+        with mock.patch.object(pdf_export, 'EXPORT_WORKERS', 0):
+            first = self.export()[1]
+            with mock.patch.object(pdf_export, 'create_medical_response_pdf') as render:
+                second = self.export()[1]
+        render.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_pool_lives_for_one_export(self):
+        pool = mock.Mock()
+        pool.submit.side_effect = lambda fn, *args: _done(fn(*args))
+        with mock.patch.object(pdf_export, 'EXPORT_WORKERS', 2), \
+                mock.patch.object(pdf_export, '_new_pool', return_value=pool), \
+                mock.patch.object(pdf_export, 'wait', lambda futures, return_when: (set(futures), set())):
+            files = self.export()[1]
+        self.assertEqual(len(files), 3)
+        self.assertEqual(pool.submit.call_count, 3)
+        pool.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+
+    def test_patients_only_export_their_own(self):
+        other = make_user('other', 'patient')
+        self.client.force_login(other)
+        response = self.client.get(reverse('export_response_pdfs'))
+        self.assertRedirects(response, reverse('report_list'), fetch_redirect_response=False)
+
+    def test_malformed_filters_are_rejected(self):
+        for params in ({'patient': 'abc'}, {'doctor': '1;'}, {'start': '2024-13-01'}, {'end': 'yesterday'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('export_response_pdfs'), params).status_code, 400)
+
+    def test_truncated_export_says_so(self):
+        with mock.patch.object(pdf_export, 'MAX_EXPORT', 2), mock.patch.object(pdf_export, 'EXPORT_WORKERS', 0):
+            response, files = self.export()
+        self.assertEqual(len(files), 2)
+        self.assertEqual(response['X-Export-Truncated'], '2')
+
+
+def _done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+class ReportFileAccessTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patient = make_user('patient', 'patient')
+        self.doctor = make_user('doctor', 'doctor')
+        self.report = MedicalReport.objects.create(
+            patient=self.patient, shared_with=self.doctor, title='Scan', original_name='Scan März.pdf',
+            report_file=SimpleUploadedFile('scan.pdf', PDF_BYTES),
+        )
+        self.url = reverse('download_report_file', args=[self.report.id])
+
+    def get(self, user):
+        self.client.force_login(user)
+        return self.client.get(self.url)
+
+    def test_patient_shared_doctor_and_staff_may_download(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        for user in (self.patient, self.doctor, staff):
+            with self.subTest(user=user.username):
+                response = self.get(user)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(b''.join(response.streaming_content), PDF_BYTES)
+
+    def test_other_users_get_404(self):
+        for user in (make_user('other', 'patient'), make_user('other_doctor', 'doctor')):
+            with self.subTest(user=user.username):
+                self.assertEqual(self.get(user).status_code, 404)
+
+    def test_anonymous_users_are_sent_to_login(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('login', response['Location'])
+
+    def test_download_keeps_the_uploaded_name(self):
+        response = self.get(self.patient)
+        self.assertIn("filename*=utf-8''Scan%20M%C3%A4rz.pdf", response['Content-Disposition'])
+
+    def test_nginx_sends_the_file_when_configured(self):
+        with mock.patch.object(downloads, 'ACCEL_PREFIX', '/protected-media/'):
+            response = self.get(self.patient)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.report.report_file.name}')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response.content, b'')
+
+
+class S3DownloadTests(S3TestCase):
+    def test_download_redirects_to_a_presigned_url(self):
+        patient = make_user('patient', 'patient')
+        report = MedicalReport.objects.create(
+            patient=patient, title='Scan', original_name='scan.pdf',
+            report_file=SimpleUploadedFile('scan.pdf', PDF_BYTES),
+        )
+        self.client.force_login(patient)
+        response = self.client.get(reverse('download_report_file', args=[report.id]))
+        self.assertEqual(response.status_code, 302)
+        url = response['Location']
+        self.assertIn(f'{BUCKET}', url)
+        self.assertIn('X-Amz-Signature=', url)
+        self.assertIn('response-content-disposition=', url)
+        self.assertEqual(self.keys(), [report.report_file.name])
+
+
+@override_settings(REPORT_DIRECT_UPLOADS=True)
+class DirectUploadTests(S3TestCase):
+    def setUp(self):
+        super().setUp()
+        self.patient = make_user('patient', 'patient')
+        self.client.force_login(self.patient)
+
+    def presign(self, data=PDF_BYTES, filename='Blood work.pdf', **extra):
+        response = self.client.post(
+            reverse('presign_report_upload'), {'filename': filename, 'size': len(data), **extra}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def upload(self, upload, data=PDF_BYTES):
+        # moto intercepts the browser's POST to the bucket as well
+        response = requests.post(upload['url'], data=upload['fields'], files={'file': ('upload', data)})
+        self.assertLess(response.status_code, 300, response.text)
+
+    def complete(self, token):
+        return self.client.post(reverse('complete_report_upload'), {
+            'title': 'Blood work', 'category': 'general', 'upload_token': token,
+        })
+
+    def test_presign_upload_complete(self):
+        upload = self.presign()
+        self.upload(upload)
+        response = self.complete(upload['token'])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), {'redirect': reverse('report_list')})
+
+        report = MedicalReport.objects.get(patient=self.patient)
+        content_hash = hashlib.sha256(PDF_BYTES).hexdigest()
+        self.assertEqual(report.content_hash, content_hash)
+        self.assertEqual(report.original_name, 'Blood work.pdf')
+        self.assertEqual(report.report_file.name, f'medical_reports/{content_hash[:2]}/{content_hash}.pdf')
+        # The temporary upload is gone; only the content-addressed copy remains
+        self.assertEqual(self.keys(), [report.report_file.name])
+
+    def test_known_content_skips_the_transfer(self):
+        upload = self.presign()
+        self.upload(upload)
+        self.complete(upload['token'])
+
+        upload = self.presign(filename='Copy.pdf', sha256=hashlib.sha256(PDF_BYTES).hexdigest())
+        self.assertTrue(upload['existing'])
+        self.assertNotIn('url', upload)
+        self.assertEqual(self.complete(upload['token']).status_code, 200)
+
+        first, second = MedicalReport.objects.order_by('id')
+        self.assertEqual(second.report_file.name, first.report_file.name)
+        self.assertEqual(second.original_name, 'Copy.pdf')
+        self.assertEqual(len(self.keys()), 1)
+
+    def test_content_must_match_the_extension(self):
+        upload = self.presign()
+        self.upload(upload, data=b'not really a pdf')
+        response = self.complete(upload['token'])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('upload_token', response.json()['errors'])
+        self.assertFalse(MedicalReport.objects.exists())
+        self.assertEqual(self.keys(), [])
+
+    def test_token_belongs_to_its_uploader(self):
+        upload = self.presign()
+        self.upload(upload)
+        self.client.force_login(make_user('other', 'patient'))
+        self.assertEqual(self.complete(upload['token']).status_code, 400)
+        self.assertFalse(MedicalReport.objects.exists())
+
+    def test_missing_upload_is_rejected(self):
+        upload = self.presign()
+        self.assertEqual(self.complete(upload['token']).status_code, 400)
+
+    def test_disabled_without_s3(self):
+        with override_settings(STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': S3_SETTINGS['STORAGES']['staticfiles'],
+        }):
+            self.assertFalse(direct_upload.enabled())
+            response = self.client.post(reverse('presign_report_upload'), {'filename': 'a.pdf', 'size': 10})
+        self.assertEqual(response.status_code, 400)
+
+
+class UploadDedupeTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patient = make_user('patient', 'patient')
+        self.client.force_login(self.patient)
+
+    def upload(self, name, data=PDF_BYTES):
+        return self.client.post(reverse('upload_report'), {
+            'title': name, 'category': 'general', 'report_file': SimpleUploadedFile(name, data),
+        })
+
+    def test_identical_content_is_stored_once(self):
+        self.assertRedirects(self.upload('first.pdf'), reverse('report_list'), fetch_redirect_response=False)
+        self.assertRedirects(self.upload('second.pdf'), reverse('report_list'), fetch_redirect_response=False)
+
+        first, second = MedicalReport.objects.order_by('id')
+        content_hash = hashlib.sha256(PDF_BYTES).hexdigest()
+        self.assertEqual(first.content_hash, content_hash)
+        self.assertEqual(first.report_file.name, uploads.content_path(content_hash, '.pdf'))
+        self.assertEqual(second.report_file.name, first.report_file.name)
+        self.assertEqual([first.original_name, second.original_name], ['first.pdf', 'second.pdf'])
+        _, files = default_storage.listdir(f'medical_reports/{content_hash[:2]}')
+        self.assertEqual(files, [f'{content_hash}.pdf'])
+
+    def test_content_must_match_the_extension(self):
+        response = self.upload('scan.pdf', data=b'\x89PNG\r\n\x1a\n' + b'\0' * 32)
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response.context['form'], 'report_file', 'The file content does not match its .pdf extension.'
+        )
+        self.assertFalse(MedicalReport.objects.exists())
+
+    def test_upload_handler_fingerprints_the_stream(self):
+        handler = uploads.FingerprintTemporaryFileUploadHandler()
+        handler.new_file('file', 'scan.pdf', 'application/pdf', len(PDF_BYTES))
+        handler.receive_data_chunk(PDF_BYTES[:10], 0)
+        handler.receive_data_chunk(PDF_BYTES[10:], 10)
+        uploaded = handler.file_complete(len(PDF_BYTES))
+        self.assertEqual(uploaded.content_hash, hashlib.sha256(PDF_BYTES).hexdigest())
+        self.assertEqual(uploaded.sniffed_type, 'pdf')
+        self.assertEqual(uploads.fingerprint(uploaded), (uploaded.content_hash, 'pdf'))
+        uploaded.close()
+
+    def test_command_moves_legacy_files_to_their_content_address(self):
+        legacy = [
+            MedicalReport.objects.create(
+                patient=self.patient, title=name, report_file=default_storage.save(f'medical_reports/{name}', ContentFile(PDF_BYTES))
+            )
+            for name in ('a.pdf', 'b.pdf')
+        ]
+        old_names = [report.report_file.name for report in legacy]
+
+        call_command('dedupe_report_files', '--dry-run', stdout=StringIO())
+        self.assertFalse(MedicalReport.objects.exclude(content_hash='').exists())
+
+        out = StringIO()
+        call_command('dedupe_report_files', stdout=out)
+        self.assertIn('2 report(s) content-addressed', out.getvalue())
+        content_hash = hashlib.sha256(PDF_BYTES).hexdigest()
+        self.assertEqual(
+            set(MedicalReport.objects.values_list('report_file', 'content_hash')),
+            {(uploads.content_path(content_hash, '.pdf'), content_hash)},
+        )
+        for name in old_names:
+            self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(uploads.content_path(content_hash, '.pdf')))
+
+
+def text_pdf():
+    """One A4 page: a black band across the top and a line of text"""
+    buffer = BytesIO()
+    page = canvas.Canvas(buffer)
+    page.rect(0, 742, 595, 100, fill=1)
+    page.drawString(72, 600, 'Haemoglobin 13.5 g/dL')
+    page.save()
+    return buffer.getvalue()
+
+
+def png(size, color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def png_header(width, height):
+    """A PNG announcing ``width`` x ``height`` pixels and carrying none of them"""
+    def chunk(kind, body):
+        return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body))
+
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IEND', b'')
+
+
+def webp(data):
+    return Image.open(BytesIO(data))
+
+
+class PreviewRenderTests(TestCase):
+    def test_pdf_first_page_is_rasterised(self):
+        image = webp(previews.render(text_pdf(), 'thumb'))
+        # A4 portrait fitted into 320x320
+        self.assertEqual(image.height, 320)
+        self.assertAlmostEqual(image.width, 226, delta=1)
+        image = image.convert('L')
+        self.assertLess(image.getpixel((113, 10)), 40)
+        self.assertGreater(image.getpixel((113, 300)), 215)
+
+    def test_unreadable_pdf_gets_a_placeholder(self):
+        self.assertEqual(
+            previews.render(b'%PDF-1.4 truncated', 'thumb'),
+            previews.render(b'%PDF-1.4 also truncated', 'thumb'),
+        )
+
+    def test_images_are_scaled_down(self):
+        image = webp(previews.render(png((2000, 1000)), 'screen'))
+        self.assertEqual(image.size, (1280, 640))
+        self.assertEqual(image.format, 'WEBP')
+
+    def test_decompression_bomb_gets_a_placeholder(self):
+        bomb = previews.render(png_header(50000, 50000), 'thumb')
+        self.assertEqual(bomb, previews.render(b'not an image', 'thumb'))
+
+
+class ReportPreviewTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patient = make_user('patient', 'patient')
+        self.report = MedicalReport.objects.create(
+            patient=self.patient, title='Scan', report_file=SimpleUploadedFile('scan.pdf', text_pdf()),
+        )
+
+    def get(self, user, variant='thumb', key=None):
+        self.client.force_login(user)
+        return self.client.get(reverse('report_preview', args=[self.report.id, variant, key or self.report.file_key]))
+
+    def test_owner_gets_a_cacheable_webp(self):
+        response = self.get(self.patient)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(webp(b''.join(response.streaming_content)).height, 320)
+
+    def test_other_users_and_unknown_variants_get_404(self):
+        self.assertEqual(self.get(make_user('other', 'patient')).status_code, 404)
+        self.assertEqual(self.get(self.patient, variant='huge').status_code, 404)
+
+    def test_urls_follow_the_file_content(self):
+        self.assertEqual(self.report.file_key, hashlib.sha256(self.report.report_file.name.encode()).hexdigest())
+        stale_key = self.report.file_key
+        self.report.content_hash = hashlib.sha256(b'new content').hexdigest()
+        self.report.save()
+
+        response = self.get(self.patient, key=stale_key)
+        self.assertRedirects(
+            response, reverse('report_preview', args=[self.report.id, 'thumb', self.report.content_hash]),
+            fetch_redirect_response=False,
+        )
+        self.assertNotIn('immutable', response.get('Cache-Control', ''))
+
+    def test_list_links_the_current_preview(self):
+        self.client.force_login(self.patient)
+        response = self.client.get(reverse('report_list'))
+        self.assertContains(response, reverse('report_preview', args=[self.report.id, 'thumb', self.report.file_key]))
+
+    def test_preview_is_rendered_once(self):
+        self.get(self.patient)
+        with mock.patch.object(previews, 'render') as render:
+            self.assertEqual(self.get(self.patient).status_code, 200)
+        render.assert_not_called()
+
+
+def pages_pdf(*pages):
+    buffer = BytesIO()
+    document = canvas.Canvas(buffer)
+    for text in pages:
+        document.drawString(72, 720, text)
+        document.showPage()
+    document.save()
+    return buffer.getvalue()
+
+
+class TextExtractionTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patient = make_user('patient', 'patient')
+
+    def report(self, data, name='report.pdf', **fields):
+        return MedicalReport.objects.create(
+            patient=self.patient, title='Report', report_file=SimpleUploadedFile(name, data), **fields
+        )
+
+    def test_normalize(self):
+        self.assertEqual(
+            text_extraction.normalize('ﬁbro-\nsis   seen\n\n\t \nHb\x00 13'),
+            'fibrosis seen\nHb 13',
+        )
+
+    def test_upload_is_extracted_after_commit(self):
+        self.client.force_login(self.patient)
+        with mock.patch('healthcare.background.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('upload_report'), {
+                    'title': 'Bloods', 'category': 'general',
+                    'report_file': SimpleUploadedFile('bloods.pdf', pages_pdf('Haemoglobin 13.5')),
+                })
+        report = MedicalReport.objects.get()
+        submit.assert_called_once_with(text_extraction.extract, report.id)
+
+    def test_extracts_every_page(self):
+        report = self.report(pages_pdf('Haemoglobin 13.5', 'Platelets normal', 'Follow up in May'))
+        self.assertEqual(text_extraction.extract(report.id), 'done')
+
+        report.refresh_from_db()
+        self.assertEqual(report.extraction_status, 'done')
+        self.assertEqual((report.page_count, report.extracted_pages), (3, 3))
+        self.assertEqual(report.extracted_text, 'Haemoglobin 13.5\n\nPlatelets normal\n\nFollow up in May')
+        self.assertEqual(report.analysis_results, 'Text extracted from 3 page(s), 8 words.')
+        # Finished reports are never claimed again
+        self.assertIsNone(text_extraction.extract(report.id))
+
+    def test_interrupted_run_resumes_after_the_last_saved_page(self):
+        report = self.report(
+            pages_pdf('First page', 'Second page', 'Third page'),
+            extraction_status='running', extraction_started_at=timezone.now() - text_extraction.STALE_AFTER * 2,
+            extracted_text='Saved earlier', extracted_pages=2,
+        )
+        self.assertEqual(text_extraction.extract(report.id), 'done')
+        report.refresh_from_db()
+        self.assertEqual(report.extracted_text, 'Saved earlier\n\nThird page')
+
+    def test_live_run_is_not_taken_over(self):
+        report = self.report(
+            pages_pdf('First page'),
+            extraction_status='running', extraction_started_at=timezone.now() - timedelta(seconds=5),
+        )
+        self.assertIsNone(text_extraction.extract(report.id))
+
+    def test_run_stops_when_its_claim_is_lost(self):
+        report = self.report(pages_pdf('First page', 'Second page'))
+        normalize = text_extraction.normalize
+
+        def taken_over(text):
+            MedicalReport.objects.filter(id=report.id).update(extraction_started_at=timezone.now())
+            return normalize(text)
+
+        with mock.patch.object(text_extraction, 'SAVE_EVERY', 1), \
+                mock.patch.object(text_extraction, 'normalize', taken_over):
+            self.assertIsNone(text_extraction.extract(report.id))
+        report.refresh_from_db()
+        self.assertEqual(report.extracted_pages, 0)
+
+    def test_images_are_skipped_and_broken_pdfs_fail(self):
+        image = self.report(png((10, 10)), name='scan.png')
+        broken = self.report(b'%PDF-1.4 truncated')
+        self.assertEqual(text_extraction.extract_many([image.id, broken.id]), {'skipped': 1, 'failed': 1})
+        broken.refresh_from_db()
+        self.assertEqual(broken.analysis_results, 'Text could not be extracted from this report.')
+
+    def test_command_backfills_pending_and_failed_reports(self):
+        self.report(pages_pdf('Pending report'))
+        self.report(pages_pdf('Failed before'), extraction_status='failed')
+
+        out = StringIO()
+        call_command('extract_report_text', '--workers', '1', stdout=out)
+        self.assertIn('1 report(s) processed: 1 done.', out.getvalue())
+
+        out = StringIO()
+        call_command('extract_report_text', '--workers', '1', '--retry-failed', stdout=out)
+        self.assertIn('1 report(s) processed: 1 done.', out.getvalue())
+        self.assertFalse(MedicalReport.objects.exclude(extraction_status='done').exists())
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = make_user('patient', 'patient')
+        self.doctor = make_user('doctor', 'doctor', last_name='House')
+
+    def report(self, title, patient=None, **fields):
+        return MedicalReport.objects.create(patient=patient or self.patient, title=title, **fields)
+
+    def titles(self, query, user=None):
+        return [report.title for report in search.search(user or self.patient, query)]
+
+    def test_title_outranks_report_text(self):
+        self.report('Routine bloods', extracted_text='Mild anaemia noted')
+        self.report('Anaemia follow-up')
+        self.assertEqual(self.titles('anaemia'), ['Anaemia follow-up', 'Routine bloods'])
+
+    def test_last_word_matches_as_a_prefix(self):
+        self.report('Cardiology referral')
+        self.assertEqual(self.titles('cardio'), ['Cardiology referral'])
+        self.assertEqual(self.titles('cardio referral'), [])
+        self.assertEqual(self.titles('referral cardio'), ['Cardiology referral'])
+
+    def test_operators_and_punctuation_are_plain_words(self):
+        self.report('Knee OR hip')
+        self.assertEqual(self.titles('"knee" OR (hip'), ['Knee OR hip'])
+        self.assertEqual(self.titles('*** ""'), [])
+
+    def test_only_visible_reports_are_found(self):
+        self.report('Chest X-ray', shared_with=self.doctor)
+        self.report('Chest CT', patient=make_user('other', 'patient'))
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.assertEqual(self.titles('chest'), ['Chest X-ray'])
+        self.assertEqual(self.titles('chest', self.doctor), ['Chest X-ray'])
+        self.assertEqual(sorted(self.titles('chest', staff)), ['Chest CT', 'Chest X-ray'])
+
+    def test_index_follows_responses_and_deletes(self):
+        report = self.report('Skin check', shared_with=self.doctor)
+        self.assertEqual(self.titles('melanoma'), [])
+        response = make_response(report, self.doctor, diagnosis='Benign melanoma excluded')
+        self.assertEqual(self.titles('melanoma'), ['Skin check'])
+        response.delete()
+        self.assertEqual(self.titles('melanoma'), [])
+        report.delete()
+        self.assertEqual(self.titles('skin'), [])
+
+    def test_extraction_updates_the_index(self):
+        report = self.report('Scan')
+        MedicalReport.objects.filter(id=report.id).update(extracted_text='Hairline fracture')
+        self.assertEqual(self.titles('fracture'), [])
+        search.index_report(report.id)
+        self.assertEqual(self.titles('fracture'), ['Scan'])
+
+    def test_unindexed_backends_scan(self):
+        self.report('Eye exam', extracted_text='Glaucoma screening', shared_with=self.doctor)
+        make_response(MedicalReport.objects.get(), self.doctor, diagnosis='Early glaucoma')
+        self.report('Eye exam', patient=make_user('other', 'patient'))
+        with mock.patch.object(search, 'indexed', return_value=False):
+            self.assertEqual(self.titles('EYE glaucoma'), ['Eye exam'])
+
+    def test_rebuild_command(self):
+        self.report('Allergy panel')
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM reports_search")
+        self.assertEqual(self.titles('allergy'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertEqual(out.getvalue().strip(), '1 report(s) indexed.')
+        self.assertEqual(self.titles('allergy'), ['Allergy panel'])
+
+    def test_search_page(self):
+        self.report('Thyroid panel', description='TSH raised')
+        self.client.force_login(self.patient)
+        response = self.client.get(reverse('search_reports'), {'q': 'thyroid'})
+        self.assertContains(response, 'Thyroid panel')
+        self.assertContains(self.client.get(reverse('search_reports'), {'q': 'kidney'}), 'No reports match')
+
+
+class PrescriptionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_user('doctor', 'doctor', last_name='House')
+
+    def respond(self, patient, prescription, doctor=None):
+        report = MedicalReport.objects.create(patient=patient, title='Report')
+        return make_response(report, doctor or self.doctor, prescription=prescription)
+
+    def test_parse(self):
+        self.assertEqual(prescriptions.parse(
+            '  Paracetamol | 500mg | Once daily | 5 days | with food \n\n'
+            'Amoxicillin  Forte|250mg\n'
+            'Rest\n'
+        ), [
+            {'name': 'Paracetamol', 'dosage': '500mg', 'frequency': 'Once daily', 'duration': '5 days',
+             'name_key': 'paracetamol'},
+            {'name': 'Amoxicillin  Forte', 'dosage': '250mg', 'frequency': '', 'duration': '',
+             'name_key': 'amoxicillin forte'},
+            {'name': 'Rest', 'dosage': '', 'frequency': '', 'duration': '', 'name_key': 'rest'},
+        ])
+
+    def test_prose_has_no_rows(self):
+        self.assertEqual(prescriptions.parse('Take paracetamol as needed.\nRest for a week.'), [])
+        self.assertEqual(prescriptions.parse(''), [])
+        self.assertEqual(prescriptions.parse(None), [])
+
+    def test_long_values_are_truncated(self):
+        row, = prescriptions.parse('x' * 500 + ' | ' + '5' * 500)
+        self.assertEqual(len(row['name']), 200)
+        self.assertEqual(len(row['name_key']), 200)
+        self.assertEqual(len(row['dosage']), 100)
+
+    def test_rows_follow_prescription_edits(self):
+        response = self.respond(make_user('patient', 'patient'), 'Ibuprofen | 400mg\nOmeprazole | 20mg')
+        self.assertEqual([str(m) for m in prescriptions.for_response(response)], ['Ibuprofen (400mg)', 'Omeprazole (20mg)'])
+
+        response = DoctorResponse.objects.get(id=response.id)
+        response.diagnosis = 'Gastritis'
+        with mock.patch.object(prescriptions, 'sync') as sync:
+            response.save()
+        sync.assert_not_called()
+
+        response.prescription = 'Omeprazole | 40mg'
+        response.save()
+        self.assertEqual([str(m) for m in prescriptions.for_response(response)], ['Omeprazole (40mg)'])
+        self.assertEqual(Medication.objects.count(), 1)
+
+    def test_unsaved_response_is_parsed_on_the_fly(self):
+        response = DoctorResponse(prescription='Cetirizine | 10mg')
+        medications = prescriptions.for_response(response)
+        self.assertEqual([(m.position, m.name, m.dosage) for m in medications], [(0, 'Cetirizine', '10mg')])
+        self.assertFalse(Medication.objects.exists())
+
+    def test_patients_on_and_top_prescriptions(self):
+        alice = make_user('alice', 'patient', first_name='Alice', last_name='Smith')
+        bob = make_user('bob', 'patient')
+        other_doctor = make_user('other_doctor', 'doctor')
+        self.respond(alice, 'Metformin | 500mg')
+        self.respond(alice, 'METFORMIN | 1g\nAtorvastatin | 20mg')
+        self.respond(bob, 'metformin | 500mg')
+        self.respond(bob, 'Atorvastatin | 10mg', doctor=other_doctor)
+
+        patients = list(prescriptions.patients_on('  Metformin '))
+        self.assertEqual(
+            [(row['response__report__patient__username'], row['prescriptions']) for row in patients],
+            [('bob', 1), ('alice', 2)],
+        )
+        self.assertEqual(len(prescriptions.patients_on('atorvastatin', doctor=self.doctor)), 1)
+        self.assertEqual(
+            [(row['name'], row['prescriptions']) for row in prescriptions.top_prescriptions(self.doctor)],
+            [('METFORMIN', 3), ('Atorvastatin', 1)],
+        )
+
+    def test_medication_views(self):
+        alice = make_user('alice', 'patient', first_name='Alice', last_name='Smith')
+        self.respond(alice, 'Metformin | 500mg')
+
+        self.client.force_login(self.doctor)
+        data = self.client.get(reverse('patients_on_medication'), {'drug': 'metformin'}).json()
+        self.assertEqual(data['drug'], 'metformin')
+        self.assertEqual([(p['id'], p['name'], p['prescriptions']) for p in data['patients']], [(alice.id, 'Alice Smith', 1)])
+        data = self.client.get(reverse('top_medications')).json()
+        self.assertEqual(data, {'doctor': self.doctor.id, 'medications': [{'name': 'Metformin', 'prescriptions': 1}]})
+
+        self.client.force_login(alice)
+        self.assertEqual(self.client.get(reverse('top_medications')).status_code, 404)
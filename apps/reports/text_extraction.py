@@ -0,0 +1,137 @@
+"""
+Background extraction of the text of PDF reports.
+
+Reports are saved with ``extraction_status = 'pending'`` and handed to the
+shared background pool once the upload commits. ``extract`` claims a report
+with a conditional UPDATE, reads the stored PDF from storage one page at a
+time and appends each page's normalized text, saving its progress every
+``SAVE_EVERY`` pages. A run that dies part-way is picked up again after
+``STALE_AFTER`` and resumes from the last saved page; finished reports are
+never claimed again. The ``extract_report_text`` command backfills existing
+reports and anything the web process did not get to.
+"""
+import os
+import re
+import unicodedata
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PyPDF2 import PdfReader
+
+from healthcare import background
+from . import search
+from .models import MedicalReport
+
+SAVE_EVERY = 10
+
+# A running extraction that has not saved progress for this long is retried
+STALE_AFTER = timedelta(minutes=5)
+
+_HYPHENATED = re.compile(r'(\w)-\n(\w)')
+_SPACES = re.compile(r'[^\S\n]+')
+
+
+def normalize(text):
+    """NFKC-normalize ``text``, rejoin hyphenated words and collapse whitespace."""
+    text = unicodedata.normalize('NFKC', text).replace('\x00', '')
+    text = _HYPHENATED.sub(r'\1\2', text)
+    lines = (_SPACES.sub(' ', line).strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def runnable(now=None):
+    """Reports an extraction may claim: pending ones and abandoned runs."""
+    now = now or timezone.now()
+    return Q(extraction_status='pending') | Q(
+        extraction_status='running', extraction_started_at__lt=now - STALE_AFTER
+    )
+
+
+def schedule(report):
+    """Extract ``report`` in the background once the current transaction commits."""
+    transaction.on_commit(lambda: background.submit(extract, report.id))
+
+
+def _claim(report_id):
+    now = timezone.now()
+    claimed = MedicalReport.objects.filter(runnable(now), id=report_id).update(
+        extraction_status='running', extraction_started_at=now
+    )
+    return now if claimed else None
+
+
+def _save(report_id, token, **fields):
+    """
+    Store progress while still holding the claim made at ``token``.
+
+    Returns the new token, or None if another worker has taken the report
+    over, in which case this run must stop.
+    """
+    now = timezone.now()
+    saved = MedicalReport.objects.filter(
+        id=report_id, extraction_status='running', extraction_started_at=token
+    ).update(extraction_started_at=now, **fields)
+    return now if saved else None
+
+
+def _summary(pages, text):
+    if not text:
+        return f"No text layer found in this PDF ({pages} page(s)); it may be a scanned document."
+    return f"Text extracted from {pages} page(s), {len(text.split())} words."
+
+
+def extract(report_id):
+    """Extract the text of one report; returns its final status, or None if not claimed."""
+    token = _claim(report_id)
+    if token is None:
+        return None
+
+    report = MedicalReport.objects.only(
+        'id', 'report_file', 'extracted_text', 'extracted_pages'
+    ).get(id=report_id)
+    if os.path.splitext(report.report_file.name)[1].lower() != '.pdf':
+        _save(report_id, token, extraction_status='skipped')
+        return 'skipped'
+
+    parts = [report.extracted_text] if report.extracted_text else []
+    try:
+        with report.report_file.open('rb') as stored:
+            # PdfReader seeks to the pages it needs instead of loading the file
+            reader = PdfReader(stored)
+            if reader.is_encrypted and not reader.decrypt(''):
+                raise ValueError('PDF is password protected')
+            page_count = len(reader.pages)
+
+            for number in range(report.extracted_pages, page_count):
+                page_text = normalize(reader.pages[number].extract_text())
+                if page_text:
+                    parts.append(page_text)
+                done = number + 1
+                if done % SAVE_EVERY == 0 or done == page_count:
+                    token = _save(
+                        report_id, token,
+                        extracted_text='\n\n'.join(parts), extracted_pages=done, page_count=page_count,
+                    )
+                    if token is None:
+                        return None
+    except Exception:
+        _save(report_id, token, extraction_status='failed',
+              analysis_results="Text could not be extracted from this report.")
+        return 'failed'
+
+    text = '\n\n'.join(parts)
+    if _save(report_id, token, extraction_status='done', page_count=page_count,
+             analysis_results=_summary(page_count, text)):
+        search.index_report(report_id)
+    return 'done'
+
+
+def extract_many(report_ids):
+    """Extract each of ``report_ids`` in turn; returns a Counter of the outcomes."""
+    outcomes = Counter()
+    for report_id in report_ids:
+        outcomes[extract(report_id) or 'claimed elsewhere'] += 1
+    return outcomes
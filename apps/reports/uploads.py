@@ -0,0 +1,100 @@
+"""
+Content fingerprinting and content-addressed storage of report files.
+
+The upload handlers below replace Django's defaults (FILE_UPLOAD_HANDLERS).
+While the request body streams in, the handler that stores a file also
+feeds every chunk to SHA-256 and keeps its first bytes, so the uploaded
+file arrives in the form with ``content_hash`` and ``sniffed_type`` set and
+no second pass over the data is needed.
+
+Files are stored under ``medical_reports/<hh>/<sha256><ext>``: uploading
+content that is already stored writes nothing and the new report simply
+references the existing file.
+"""
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+STORAGE_DIR = 'medical_reports'
+SNIFF_BYTES = 16
+
+# Leading bytes of each accepted format -> extensions that may carry it
+SIGNATURES = (
+    (b'%PDF-', 'pdf', ('.pdf',)),
+    (b'\x89PNG\r\n\x1a\n', 'png', ('.png',)),
+    (b'\xff\xd8\xff', 'jpeg', ('.jpg', '.jpeg')),
+)
+
+
+def sniff(head):
+    """Format detected from the first bytes of a file, or None."""
+    for magic, kind, _ in SIGNATURES:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def matches_extension(kind, extension):
+    return any(kind == sig_kind and extension in extensions for _, sig_kind, extensions in SIGNATURES)
+
+
+class _FingerprintMixin:
+    """Hash and sniff the chunks this handler stores, as they pass through"""
+    
+    def new_file(self, *args, **kwargs):
+        self.digest = hashlib.sha256()
+        self.head = b''
+        super().new_file(*args, **kwargs)
+    
+    def receive_data_chunk(self, raw_data, start):
+        passed_on = super().receive_data_chunk(raw_data, start)
+        if passed_on is None:
+            # This handler kept the chunk, so it owns the fingerprint
+            if len(self.head) < SNIFF_BYTES:
+                self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+            self.digest.update(raw_data)
+        return passed_on
+    
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.content_hash = self.digest.hexdigest()
+            uploaded.sniffed_type = sniff(self.head)
+        return uploaded
+
+
+class FingerprintMemoryFileUploadHandler(_FingerprintMixin, MemoryFileUploadHandler):
+    pass
+
+
+class FingerprintTemporaryFileUploadHandler(_FingerprintMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def fingerprint(file):
+    """(sha256 hex, sniffed type) of ``file``, reusing what the upload handler computed."""
+    if hasattr(file, 'content_hash'):
+        return file.content_hash, file.sniffed_type
+    
+    digest = hashlib.sha256()
+    head = b''
+    file.seek(0)
+    for chunk in file.chunks():
+        if len(head) < SNIFF_BYTES:
+            head += chunk[:SNIFF_BYTES - len(head)]
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest(), sniff(head)
+
+
+def content_path(content_hash, extension):
+    return f'{STORAGE_DIR}/{content_hash[:2]}/{content_hash}{extension.lower()}'
+
+
+def store(file, content_hash, extension):
+    """Store ``file`` at its content address unless already there; return the storage name."""
+    name = content_path(content_hash, extension)
+    if default_storage.exists(name):
+        return name
+    return default_storage.save(name, file)
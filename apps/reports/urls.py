@@ -3,11 +3,20 @@ from . import views
 
 urlpatterns = [
     path('upload/', views.upload_report, name='upload_report'),
+    path('upload/presign/', views.presign_report_upload, name='presign_report_upload'),
+    path('upload/complete/', views.complete_report_upload, name='complete_report_upload'),
     path('list/', views.report_list, name='report_list'),
+    path('search/', views.search_reports, name='search_reports'),
     path('detail/<int:report_id>/', views.report_detail, name='report_detail'),
+    path('file/<int:report_id>/', views.download_report_file, name='download_report_file'),
+    path('preview/<int:report_id>/<str:variant>/<str:key>/', views.report_preview, name='report_preview'),
     path('response/<int:report_id>/', views.add_doctor_response, name='add_doctor_response'),
     path('get-doctors/', views.get_doctors_by_category, name='get_doctors_by_category'),
+    path('medications/patients/', views.patients_on_medication, name='patients_on_medication'),
+    path('medications/top/', views.top_medications, name='top_medications'),
     path('edit-response/<int:report_id>/', views.edit_doctor_response, name='edit_doctor_response'),
     path('download-pdf/<int:report_id>/', views.download_response_pdf, name='download_response_pdf'),  
+    path('pdf-status/<uuid:job_id>/', views.pdf_render_status, name='pdf_render_status'),
+    path('export-pdfs/', views.export_response_pdfs, name='export_response_pdfs'),
     
 ]
\ No newline at end of file
@@ -2,11 +2,19 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.http import JsonResponse, HttpResponse
-from .models import MedicalReport, DoctorResponse
-from .forms import MedicalReportForm, DoctorResponseForm
-from .pdf_utils import create_medical_response_pdf, generate_pdf_filename
-from apps.users.models import Profile
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.fields.files import FieldFile
+from django.http import Http404, JsonResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import MedicalReport, DoctorResponse, PdfRenderJob
+from .forms import MedicalReportForm, DirectUploadReportForm, DoctorResponseForm
+from .pdf_utils import generate_pdf_filename
+from . import direct_upload, downloads, pdf_cache, pdf_export, pdf_jobs, prescriptions, previews, search, text_extraction
+from apps.users import directory
+from healthcare.pagination import keyset_paginate
 
 
 @login_required
@@ -16,8 +24,8 @@ def upload_report(request):
         if form.is_valid():
             report = form.save(commit=False)
             report.patient = request.user
-            report.analysis_results = "Report uploaded successfully. Basic analysis feature available for text-based reports."
             report.save()
+            text_extraction.schedule(report)
             
             if report.shared_with:
                 messages.success(request, f'Report uploaded and shared with Dr. {report.shared_with.last_name}!')
@@ -30,27 +38,57 @@ def upload_report(request):
     else:
         form = MedicalReportForm()
     
-    # Get all categories that have approved doctors
-    categories_with_doctors = Profile.objects.filter(
-        user_type='doctor', 
-        status='approved'
-    ).values_list('specialization', flat=True).distinct()
-    
-    # Create choices for categories that actually have doctors
-    available_categories = []
-    for spec_code, spec_name in Profile.SPECIALIZATION_CHOICES:
-        if spec_code in categories_with_doctors:
-            available_categories.append((spec_code, spec_name))
+    # Categories that have approved doctors (cached directory)
+    available_categories = directory.available_specializations()
     
     return render(request, 'reports/upload.html', {
         'form': form,
         'available_categories': available_categories,
+        'direct_upload': direct_upload.enabled(),
     })
 
+@login_required
+def presign_report_upload(request):
+    """AJAX view issuing a presigned POST for uploading a report file to storage"""
+    if request.method != 'POST' or not direct_upload.enabled():
+        return JsonResponse({'error': 'Direct uploads are not available.'}, status=400)
+    
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid file size.'}, status=400)
+    try:
+        upload = direct_upload.presign(
+            request.user, request.POST.get('filename', ''), size, request.POST.get('sha256', '')
+        )
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+    return JsonResponse(upload)
+
+@login_required
+def complete_report_upload(request):
+    """AJAX view creating the report once its file is in storage"""
+    if request.method != 'POST' or not direct_upload.enabled():
+        return JsonResponse({'error': 'Direct uploads are not available.'}, status=400)
+    
+    form = DirectUploadReportForm(request.POST, user=request.user)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    
+    report = form.save(commit=False)
+    report.patient = request.user
+    report.save()
+    text_extraction.schedule(report)
+    
+    if report.shared_with:
+        messages.success(request, f'Report uploaded and shared with Dr. {report.shared_with.last_name}!')
+    else:
+        messages.success(request, 'Report uploaded successfully!')
+    return JsonResponse({'redirect': reverse('report_list')})
+
 @login_required
 def report_list(request):
-    from apps.users.models import Profile
-    profile = Profile.objects.get(user=request.user)
+    profile = request.profile
     
     if profile.user_type == 'patient':
         reports = MedicalReport.objects.filter(patient=request.user)
@@ -60,23 +98,35 @@ def report_list(request):
         reports = MedicalReport.objects.filter(shared_with=request.user)
         show_upload_button = False  # Doctors cannot upload reports
     
+    page = keyset_paginate(reports.select_related('shared_with', 'doctor_response').defer('extracted_text'), 'uploaded_at', request.GET.get('cursor'))
+    
     return render(request, 'reports/list.html', {
-        'reports': reports,
+        'reports': page,
+        'page': page,
         'user_type': profile.user_type,
         'show_upload_button': show_upload_button,  # Pass this to template
     })
 
+@login_required
+def search_reports(request):
+    """Full-text search over the reports the user can see"""
+    query = request.GET.get('q', '').strip()
+    reports = search.search(request.user, query) if query else []
+    return render(request, 'reports/search.html', {
+        'query': query,
+        'reports': reports,
+        'max_results': search.MAX_RESULTS,
+    })
+
 @login_required
 def report_detail(request, report_id):
-    from apps.users.models import Profile
-    
     # Allow admin/staff to view any report
     if request.user.is_staff:
         report = get_object_or_404(MedicalReport, id=report_id)
         user_type = 'admin'
         can_respond = False
     else:
-        profile = Profile.objects.get(user=request.user)
+        profile = request.profile
         
         if profile.user_type == 'patient':
             report = get_object_or_404(MedicalReport, id=report_id, patient=request.user)
@@ -104,11 +154,51 @@ def report_detail(request, report_id):
         'can_respond': can_respond,
     })
 
+@login_required
+def download_report_file(request, report_id):
+    """Serve the uploaded report file to the patient, the shared doctor or staff"""
+    if request.user.is_staff:
+        report = get_object_or_404(MedicalReport, id=report_id)
+    else:
+        report = get_object_or_404(
+            MedicalReport.objects.filter(Q(patient=request.user) | Q(shared_with=request.user)),
+            id=report_id,
+        )
+    
+    if not report.report_file:
+        raise Http404("This report has no file.")
+    return downloads.serve_file(report.report_file, filename=report.download_name())
+
+@login_required
+def report_preview(request, report_id, variant, key):
+    """Serve a thumbnail or screen-size WebP preview of the report file"""
+    if variant not in previews.VARIANTS:
+        raise Http404("Unknown preview size.")
+    if request.user.is_staff:
+        report = get_object_or_404(MedicalReport, id=report_id)
+    else:
+        report = get_object_or_404(
+            MedicalReport.objects.filter(Q(patient=request.user) | Q(shared_with=request.user)),
+            id=report_id,
+        )
+    
+    if not report.report_file:
+        raise Http404("This report has no file.")
+    if key != report.file_key:
+        # A URL for an earlier file; only the current one may be cached for good
+        return redirect('report_preview', report.id, variant, report.file_key)
+    # Derivatives are keyed by file content and never change
+    preview = FieldFile(report, report.report_file.field, previews.get_preview(report, variant))
+    return downloads.serve_file(
+        preview,
+        filename=f'report_{report.id}_{variant}.webp',
+        cache_control='private, max-age=31536000, immutable',
+    )
+
 @login_required
 def add_doctor_response(request, report_id):
     if request.method == 'POST':
-        from apps.users.models import Profile
-        profile = Profile.objects.get(user=request.user)
+        profile = request.profile
         
         if profile.user_type != 'doctor':
             messages.error(request, 'Only doctors can add responses.')
@@ -143,8 +233,7 @@ def add_doctor_response(request, report_id):
 def edit_doctor_response(request, report_id):
     """Allow doctors to edit their existing responses"""
     if request.method == 'POST':
-        from apps.users.models import Profile
-        profile = Profile.objects.get(user=request.user)
+        profile = request.profile
         
         if profile.user_type != 'doctor':
             messages.error(request, 'Only doctors can edit responses.')
@@ -162,7 +251,8 @@ def edit_doctor_response(request, report_id):
         
         form = DoctorResponseForm(request.POST, instance=report.doctor_response)
         if form.is_valid():
-            form.save()
+            response = form.save()
+            pdf_cache.invalidate(response)
             messages.success(request, 'Your response has been updated successfully!')
             return redirect('report_detail', report_id=report_id)
         else:
@@ -173,38 +263,64 @@ def edit_doctor_response(request, report_id):
 @login_required
 def get_doctors_by_category(request):
     """AJAX view to get doctors by category"""
-    category = request.GET.get('category')
+    return directory.doctors_response(request, request.GET.get('category'))
+
+def _prescriber(request):
+    """The doctor whose prescriptions a medication query covers; staff may pick any (None = all)"""
+    if request.user.is_staff:
+        doctor_id = request.GET.get('doctor')
+        return get_object_or_404(User, id=doctor_id) if doctor_id else None
+    if request.profile.user_type != 'doctor':
+        raise Http404
+    return request.user
+
+@login_required
+def patients_on_medication(request):
+    """AJAX view listing the patients prescribed a drug, most recent first"""
+    drug = request.GET.get('drug', '').strip()
+    if not drug:
+        return JsonResponse({'error': 'Give a drug name.'}, status=400)
     
-    if category:
-        doctors = User.objects.filter(
-            profile__user_type='doctor',
-            profile__status='approved',
-            profile__specialization=category
-        ).select_related('profile')
-        
-        doctors_data = []
-        for doctor in doctors:
-            doctors_data.append({
-                'id': doctor.id,
-                'name': f"Dr. {doctor.get_full_name()}",
-                'specialization': doctor.profile.get_specialization_display(),
-                'hospital': doctor.profile.hospital_name,
-                'experience': f"{doctor.profile.experience} years experience"
-            })
-        
-        return JsonResponse({'doctors': doctors_data})
+    doctor = _prescriber(request)
+    patients = [
+        {
+            'id': row['response__report__patient'],
+            'name': f"{row['response__report__patient__first_name']} {row['response__report__patient__last_name']}".strip()
+                    or row['response__report__patient__username'],
+            'prescriptions': row['prescriptions'],
+            'last_prescribed': row['last_prescribed'].isoformat(),
+        }
+        for row in prescriptions.patients_on(drug, doctor)
+    ]
+    return JsonResponse({'drug': prescriptions.name_key(drug), 'patients': patients})
+
+@login_required
+def top_medications(request):
+    """AJAX view with the drugs a doctor prescribes most often"""
+    doctor = _prescriber(request)
+    if doctor is None:
+        return JsonResponse({'error': 'Give a doctor id.'}, status=400)
+    try:
+        limit = min(int(request.GET.get('limit', 10)), 100)
+    except ValueError:
+        limit = 10
     
-    return JsonResponse({'doctors': []})
+    medications = [
+        {'name': row['name'], 'prescriptions': row['prescriptions']}
+        for row in prescriptions.top_prescriptions(doctor, limit)
+    ]
+    return JsonResponse({'doctor': doctor.id, 'medications': medications})
 
 @login_required
 def download_response_pdf(request, report_id):
     """Download doctor's response as a professional PDF"""
-    # Get the report
+    # Get the report, with everything printed on the PDF
+    reports = MedicalReport.objects.select_related('patient__profile', 'doctor_response__doctor__profile')
     if request.user.is_staff:
-        report = get_object_or_404(MedicalReport, id=report_id)
+        report = get_object_or_404(reports, id=report_id)
     else:
         # For patients, they can only download their own reports
-        report = get_object_or_404(MedicalReport, id=report_id, patient=request.user)
+        report = get_object_or_404(reports, id=report_id, patient=request.user)
     
     # Check if there's a response
     if not hasattr(report, 'doctor_response'):
@@ -213,45 +329,93 @@ def download_response_pdf(request, report_id):
     
     response = report.doctor_response
     
-    # Get additional information for the PDF - handle missing Profile gracefully
-    try:
-        patient_profile = Profile.objects.get(user=report.patient)
-        patient_info = {
-            'full_name': report.patient.get_full_name() or report.patient.username,
-            'contact': patient_profile.phone if patient_profile.phone else 'Not specified',
-            'address': patient_profile.address if patient_profile.address else 'Not specified',
-        }
-    except Profile.DoesNotExist:
-        patient_info = {
-            'full_name': report.patient.get_full_name() or report.patient.username,
-            'contact': 'Not specified',
-            'address': 'Not specified',
-        }
-    
-    try:
-        doctor_profile = Profile.objects.get(user=response.doctor)
-        doctor_info = {
-            'full_name': response.doctor.get_full_name() or response.doctor.username,
-            'specialization': doctor_profile.get_specialization_display() if doctor_profile.specialization else 'Consultant',
-            'license': doctor_profile.license_number if doctor_profile.license_number else f'MED-{response.doctor.id:05d}',
-            'hospital': doctor_profile.hospital_name if doctor_profile.hospital_name else 'Not specified',
-            'experience': f"{doctor_profile.experience} years" if doctor_profile.experience else 'Not specified',
-        }
-    except Profile.DoesNotExist:
-        doctor_info = {
-            'full_name': response.doctor.get_full_name() or response.doctor.username,
-            'specialization': 'Consultant',
-            'license': f'MED-{response.doctor.id:05d}',
-            'hospital': 'Not specified',
-            'experience': 'Not specified',
-        }
-    
-    # Generate PDF
-    pdf_content = create_medical_response_pdf(report, response, patient_info, doctor_info)
+    # Rendered once per version of the response, then served from storage
+    if pdf_jobs.offloaded():
+        pdf_content = pdf_cache.get_stored_pdf(response)
+        if pdf_content is None:
+            # Leave the rendering to the background worker and let the client poll
+            job = pdf_jobs.submit(response)
+            status_url = reverse('pdf_render_status', args=[job.id])
+            if 'application/json' in request.headers.get('Accept', ''):
+                return JsonResponse({'job_id': str(job.id), 'status': job.status, 'status_url': status_url}, status=202)
+            return render(request, 'reports/pdf_pending.html', {
+                'report': report,
+                'job': job,
+                'status_url': status_url,
+            }, status=202)
+    else:
+        pdf_content = pdf_cache.get_response_pdf(report, response)
     
     # Create response
     response_pdf = HttpResponse(pdf_content, content_type='application/pdf')
     filename = generate_pdf_filename(report, response)
     response_pdf['Content-Disposition'] = f'attachment; filename="{filename}"'
     
-    return response_pdf
\ No newline at end of file
+    return response_pdf
+
+
+@login_required
+def pdf_render_status(request, job_id):
+    """AJAX view reporting the progress of a background PDF rendering"""
+    jobs = PdfRenderJob.objects.select_related('response__report')
+    if not request.user.is_staff:
+        jobs = jobs.filter(response__report__patient=request.user)
+    job = get_object_or_404(jobs, id=job_id)
+    
+    data = {'job_id': str(job.id), 'status': job.status}
+    if job.status == 'done':
+        data['download_url'] = reverse('download_response_pdf', args=[job.response.report_id])
+    elif job.status == 'failed':
+        data['error'] = 'The PDF could not be generated. Please try again later.'
+    return JsonResponse(data)
+
+
+@login_required
+def export_response_pdfs(request):
+    """Download every consultation PDF matching the filters as one ZIP archive"""
+    for name in ('patient', 'doctor'):
+        value = request.GET.get(name, '')
+        if value and not value.isdigit():
+            return HttpResponseBadRequest(f'Invalid {name} id.')
+    dates = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name, '')
+        try:
+            dates[name] = parse_date(value) if value else None
+        except ValueError:
+            dates[name] = None
+        if value and dates[name] is None:
+            return HttpResponseBadRequest(f'Invalid {name} date.')
+    
+    responses = DoctorResponse.objects.all()
+    if request.user.is_staff:
+        if request.GET.get('patient'):
+            responses = responses.filter(report__patient_id=request.GET['patient'])
+    else:
+        # Patients can only export their own consultations
+        responses = responses.filter(report__patient=request.user)
+    
+    if request.GET.get('doctor'):
+        responses = responses.filter(doctor_id=request.GET['doctor'])
+    if dates['start']:
+        responses = responses.filter(created_at__date__gte=dates['start'])
+    if dates['end']:
+        responses = responses.filter(created_at__date__lte=dates['end'])
+    
+    truncated = responses.order_by()[pdf_export.MAX_EXPORT:pdf_export.MAX_EXPORT + 1].exists()
+    responses = pdf_export.export_queryset(responses)
+    if not responses:
+        messages.error(request, 'No consultations match the selected filters.')
+        return redirect('report_list')
+    
+    archive = StreamingHttpResponse(pdf_export.stream_zip(responses), content_type='application/zip')
+    archive['Content-Disposition'] = f'attachment; filename="Medical_Consultations_{timezone.localdate():%Y%m%d}.zip"'
+    if truncated:
+        # The download itself cannot show a message; it appears on the next page
+        archive['X-Export-Truncated'] = str(pdf_export.MAX_EXPORT)
+        messages.warning(
+            request,
+            f'Only the newest {pdf_export.MAX_EXPORT} consultations were exported. '
+            'Narrow the dates to export the rest.',
+        )
+    return archive
@@ -1,7 +1,10 @@
+from collections import Counter
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
 from .models import Profile
+from . import backends, directory, stats
 
 class ProfileInline(admin.StackedInline):
     model = Profile
@@ -37,12 +40,25 @@ class ProfileAdmin(admin.ModelAdmin):
     list_editable = ['status']
     actions = ['approve_doctors', 'reject_doctors']
     
+    def set_doctor_status(self, queryset, status):
+        doctors = queryset.filter(user_type='doctor')
+        # update() sends no signals, so invalidate the directory and cached users
+        # and move the dashboard counters explicitly
+        rows = list(doctors.values_list('user_id', 'specialization', 'status'))
+        doctors.update(status=status)
+        directory.invalidate({specialization for user_id, specialization, old in rows})
+        backends.invalidate([user_id for user_id, specialization, old in rows])
+        deltas = Counter()
+        for user_id, specialization, old in rows:
+            deltas.update(stats.profile_change(('doctor', old), ('doctor', status)))
+        stats.adjust(deltas)
+    
     def approve_doctors(self, request, queryset):
-        queryset.filter(user_type='doctor').update(status='approved')
+        self.set_doctor_status(queryset, 'approved')
         self.message_user(request, "Selected doctors have been approved.")
     approve_doctors.short_description = "Approve selected doctors"
     
     def reject_doctors(self, request, queryset):
-        queryset.filter(user_type='doctor').update(status='rejected')
+        self.set_doctor_status(queryset, 'rejected')
         self.message_user(request, "Selected doctors have been rejected.")
-    reject_doctors.short_description = "Reject selected doctors"
\ No newline at end of file
+    reject_doctors.short_description = "Reject selected doctors"
@@ -0,0 +1,74 @@
+"""
+Authentication backend that loads each user together with their profile.
+
+Almost every view checks ``profile.user_type``, so the session user is
+fetched with ``select_related('profile')`` and ProfileMiddleware hands that
+profile to the view without a second query. With
+``AUTH_USER_CACHE_TIMEOUT`` set, the profile is also cached across requests
+and the user is read by primary key alone. The user row is never cached:
+its password hash stays out of the cache and the session hash is always
+checked against the database. signals.py and the admin actions invalidate
+the cached profile on every change.
+"""
+import copy
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+
+CACHE_TIMEOUT = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 0)
+
+
+def _cache_key(user_id):
+    return f'auth_profile:{user_id}'
+
+
+def _cacheable(profile):
+    """Copy of ``profile`` without its loaded user, so no password hash is pickled"""
+    profile = copy.copy(profile)
+    profile._state.fields_cache.pop('user', None)
+    return profile
+
+
+def invalidate(user_ids):
+    """Drop the cached profiles of ``user_ids`` after a change to them or their users."""
+    if CACHE_TIMEOUT:
+        cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+class ProfileBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.select_related('profile').get(
+                **{UserModel.USERNAME_FIELD: username}
+            )
+        except UserModel.DoesNotExist:
+            # Hash anyway so a missing user takes as long as a wrong password
+            UserModel().set_password(password)
+            raise PermissionDenied
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        # Stop here rather than let ModelBackend, listed after this backend for
+        # sessions created before it, hash the same password a second time
+        raise PermissionDenied
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        profile = cache.get(_cache_key(user_id)) if CACHE_TIMEOUT else None
+        users = UserModel._default_manager
+        try:
+            user = users.get(pk=user_id) if profile else users.select_related('profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        if profile:
+            user.profile = profile
+        elif CACHE_TIMEOUT and hasattr(user, 'profile'):
+            cache.set(_cache_key(user_id), _cacheable(user.profile), CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
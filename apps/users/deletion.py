@@ -0,0 +1,51 @@
+"""
+Background deletion of users.
+
+Deleting a user cascades through their appointments, reports and doctor
+responses, which is too slow to run inside the admin's request.
+``request_deletion`` deactivates the users and stamps their profiles, one
+UPDATE each, and queues the cascade on the background pool once the
+transaction commits. ``delete_pending`` runs that cascade, one user per
+transaction; the ``delete_pending_users`` command calls it for whatever a
+restart left queued.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from healthcare import background
+
+from . import backends
+from .models import Profile
+
+
+def request_deletion(user_ids):
+    """Schedule the non-staff users of ``user_ids`` for deletion and return how many."""
+    with transaction.atomic():
+        users = User.objects.filter(id__in=user_ids, is_staff=False)
+        ids = list(users.values_list('id', flat=True))
+        if not ids:
+            return 0
+        users.update(is_active=False)
+        Profile.objects.filter(user_id__in=ids, deletion_requested_at__isnull=True).update(
+            deletion_requested_at=timezone.now()
+        )
+        transaction.on_commit(lambda: background.submit(delete_pending, ids))
+    # update() sends no signals; deactivated users must not stay logged in from the cache
+    backends.invalidate(ids)
+    return len(ids)
+
+
+def delete_pending(user_ids=None):
+    """Delete users whose deletion was requested, optionally only ``user_ids``; returns how many."""
+    pending = Profile.objects.filter(deletion_requested_at__isnull=False)
+    if user_ids is not None:
+        pending = pending.filter(user_id__in=user_ids)
+
+    deleted = 0
+    for user_id in list(pending.values_list('user_id', flat=True)):
+        # Short transactions keep the cascade from locking a whole batch at once
+        with transaction.atomic():
+            counts = User.objects.filter(id=user_id, profile__deletion_requested_at__isnull=False).delete()[1]
+        deleted += counts.get(User._meta.label, 0)
+    return deleted
@@ -0,0 +1,93 @@
+"""
+Cached directory of approved doctors.
+
+The booking and report-upload pages both look doctors up by specialization
+and list the specializations that have at least one approved doctor. Both
+answers are cached here, one key per specialization plus one for the list,
+and invalidated by signals.py (Profile/User changes) and by the admin
+approval actions, which use queryset.update() and bypass signals.
+"""
+import hashlib
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .models import Profile
+
+CACHE_TIMEOUT = 60 * 60 * 24
+SPECIALIZATIONS_KEY = 'doctor_directory:specializations'
+
+
+def _doctors_key(specialization):
+    return f'doctor_directory:doctors:{specialization}'
+
+
+def _etag(payload):
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def get_doctors(specialization):
+    """Return (etag, doctors) for the approved doctors of a specialization."""
+    key = _doctors_key(specialization)
+    entry = cache.get(key)
+    if entry is None:
+        doctors = User.objects.filter(
+            profile__user_type='doctor',
+            profile__status='approved',
+            profile__specialization=specialization
+        ).select_related('profile')
+        
+        doctors_data = []
+        for doctor in doctors:
+            doctors_data.append({
+                'id': doctor.id,
+                'name': f"Dr. {doctor.get_full_name()}",
+                'specialization': doctor.profile.get_specialization_display(),
+                'hospital': doctor.profile.hospital_name,
+                'experience': f"{doctor.profile.experience} years experience"
+            })
+        entry = (_etag(doctors_data), doctors_data)
+        cache.set(key, entry, CACHE_TIMEOUT)
+    return entry
+
+
+def available_specializations():
+    """Specialization choices that have at least one approved doctor."""
+    choices = cache.get(SPECIALIZATIONS_KEY)
+    if choices is None:
+        with_doctors = set(Profile.objects.filter(
+            user_type='doctor',
+            status='approved'
+        ).values_list('specialization', flat=True).distinct())
+        choices = [
+            (spec_code, spec_name)
+            for spec_code, spec_name in Profile.SPECIALIZATION_CHOICES
+            if spec_code in with_doctors
+        ]
+        cache.set(SPECIALIZATIONS_KEY, choices, CACHE_TIMEOUT)
+    return choices
+
+
+def invalidate(specializations):
+    """Drop cached entries for the given specializations and the list."""
+    keys = [_doctors_key(spec) for spec in set(specializations) if spec]
+    cache.delete_many(keys + [SPECIALIZATIONS_KEY])
+
+
+def doctors_response(request, specialization):
+    """JSON response for the AJAX doctor lookups, honouring If-None-Match."""
+    if not specialization:
+        return JsonResponse({'doctors': []})
+    
+    etag, doctors = get_doctors(specialization)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({'doctors': doctors})
+    response['ETag'] = etag
+    # Browsers keep the copy but must revalidate it every time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -216,4 +216,11 @@ class CustomUserCreationForm(UserCreationForm):
             
             profile.save()
             
-        return user
\ No newline at end of file
+        return user
+
+class UserImportForm(CustomUserCreationForm):
+    """Registration rules for one row of ``import_users``"""
+
+    def validate_unique(self):
+        # import_users checks the usernames of a whole chunk in one query
+        pass
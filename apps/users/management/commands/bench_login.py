@@ -0,0 +1,71 @@
+from time import perf_counter
+
+from django.contrib.auth import authenticate, login
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from healthcare.benchmarking import percentile, scratch_database
+
+# Hashing dominates a real login; a cheap hasher leaves the database work visible
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def resave_profile(sender, instance, **kwargs):
+    # What the removed save_user_profile signal did on every User.save()
+    profile = instance.profile
+    profile.save(update_fields=[field.name for field in profile._meta.concrete_fields if not field.primary_key])
+
+
+class Command(BaseCommand):
+    help = "Time password logins and count the queries each one runs (uses a scratch database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Users logging in, once each')
+        parser.add_argument('--resave-profile', action='store_true',
+                            help='Re-save the profile on every User.save(), as before dirty-field tracking')
+        parser.add_argument('--real-hasher', action='store_true',
+                            help='Use the configured password hashers instead of a cheap one')
+
+    def handle(self, *args, **options):
+        hashers = {} if options['real_hasher'] else {'PASSWORD_HASHERS': FAST_HASHERS}
+        with override_settings(**hashers), scratch_database():
+            if options['resave_profile']:
+                post_save.connect(resave_profile, sender=User, dispatch_uid='bench_login_resave_profile')
+            try:
+                self.run(options['users'], options['resave_profile'])
+            finally:
+                post_save.disconnect(sender=User, dispatch_uid='bench_login_resave_profile')
+
+    def run(self, user_count, resave_profile):
+        for i in range(user_count):
+            User.objects.create_user(f'bench_user_{i}', password='bench-password')
+
+        factory = RequestFactory()
+        latencies = []
+        queries = profile_writes = 0
+        started = perf_counter()
+        for i in range(user_count):
+            request = factory.post('/users/login/')
+            request.session = SessionStore()
+            with CaptureQueriesContext(connection) as captured:
+                begun = perf_counter()
+                user = authenticate(request, username=f'bench_user_{i}', password='bench-password')
+                login(request, user)
+                latencies.append(perf_counter() - begun)
+            queries += len(captured)
+            profile_writes += sum(1 for query in captured if query['sql'].startswith('UPDATE "users_profile"'))
+        elapsed = perf_counter() - started
+
+        self.stdout.write(f"Database:        {connection.vendor}")
+        self.stdout.write(f"Mode:            {'profile re-saved on User.save()' if resave_profile else 'dirty-field tracking'}")
+        self.stdout.write(f"Logins:          {user_count}")
+        self.stdout.write(f"Elapsed:         {elapsed:.3f}s")
+        self.stdout.write(f"Throughput:      {user_count / elapsed:.1f} logins/s")
+        self.stdout.write(f"p50 / p99:       {percentile(latencies, 0.5) * 1000:.2f}ms / {percentile(latencies, 0.99) * 1000:.2f}ms")
+        self.stdout.write(f"Queries/login:   {queries / user_count:.1f}")
+        self.stdout.write(f"Profile UPDATEs: {profile_writes}")
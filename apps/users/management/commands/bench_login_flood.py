@@ -0,0 +1,105 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import time, timedelta
+from time import perf_counter, sleep
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from apps.appointments.models import DoctorWorkingHours
+from apps.users import throttle
+from healthcare.benchmarking import percentile, scratch_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure booking latency while a login flood hits a fixed pool of workers, "
+        "with and without the login throttle (uses a scratch database)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=3, help='Request workers, as gunicorn --workers')
+        parser.add_argument('--flood-rate', type=float, default=5, help='Failed login attempts per second')
+        parser.add_argument('--bookings', type=int, default=100, help='Free-slot requests, one every --interval seconds')
+        parser.add_argument('--interval', type=float, default=0.1, help='Seconds between booking requests')
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=['testserver']), scratch_database():
+            self.setup()
+            for label, flood_rate, enabled in (
+                ('No flood', 0, True),
+                ('Flood, throttle off', options['flood_rate'], False),
+                ('Flood, throttle on', options['flood_rate'], True),
+            ):
+                throttle.ENABLED = enabled
+                cache.clear()
+                self.run(label, options['workers'], flood_rate, options['bookings'], options['interval'])
+
+    def setup(self):
+        self.doctor = User.objects.create_user('bench_doctor', last_name='Bench')
+        self.doctor.profile.user_type = 'doctor'
+        self.doctor.profile.status = 'approved'
+        self.doctor.profile.save()
+        for weekday in range(7):
+            DoctorWorkingHours.objects.create(doctor=self.doctor, weekday=weekday, start_time=time(8, 0), end_time=time(18, 0))
+        self.patient = User.objects.create_user('bench_patient')
+        self.patient.profile.user_type = 'patient'
+        self.patient.profile.save()
+        self.day = (timezone.localdate() + timedelta(days=1)).isoformat()
+
+    def run(self, label, workers, flood_rate, booking_count, interval):
+        local = threading.local()
+
+        def attempt_login(index):
+            client = getattr(local, 'attacker', None) or Client(REMOTE_ADDR='203.0.113.7')
+            local.attacker = client
+            try:
+                # Credential stuffing: a different account each time, all from one address
+                return client.post('/accounts/login/', {'username': f'victim{index}', 'password': 'guess'}).status_code
+            finally:
+                connections.close_all()
+
+        def book():
+            client = getattr(local, 'patient', None)
+            if client is None:
+                client = local.patient = Client()
+                client.force_login(self.patient)
+            try:
+                return client.get(f'/appointments/get-free-slots/{self.doctor.id}/', {'date': self.day}).status_code
+            finally:
+                connections.close_all()
+
+        # Both kinds of request arrive at a steady rate over the same window
+        duration = booking_count * interval
+        schedule = [(index * interval, book, ()) for index in range(booking_count)]
+        if flood_rate:
+            schedule += [(index / flood_rate, attempt_login, (index,)) for index in range(int(duration * flood_rate))]
+        schedule.sort(key=lambda event: event[0])
+
+        latencies = []
+        floods = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            started = perf_counter()
+            for at, request, args in schedule:
+                sleep(max(0, started + at - perf_counter()))
+                submitted = perf_counter()
+                future = pool.submit(request, *args)
+                if request is book:
+                    future.add_done_callback(lambda _, submitted=submitted: latencies.append(perf_counter() - submitted))
+                else:
+                    floods.append(future)
+            wait(floods)
+        login_statuses = [future.result() for future in floods]
+        elapsed = perf_counter() - started
+
+        self.stdout.write(label)
+        self.stdout.write(f"  Login attempts:  {len(login_statuses)} ({login_statuses.count(429)} throttled)")
+        self.stdout.write(f"  Booking p50/p99: {percentile(latencies, 0.5) * 1000:.1f}ms / {percentile(latencies, 0.99) * 1000:.1f}ms")
+        self.stdout.write(f"  Elapsed:         {elapsed:.2f}s")
+        if throttle.ENABLED and flood_rate:
+            self.stdout.write(f"  Hashing saved:   {throttle.stats()['saved_cpu_seconds']:.1f}s CPU")
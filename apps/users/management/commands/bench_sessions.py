@@ -0,0 +1,76 @@
+from datetime import time, timedelta
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from apps.appointments import availability
+from apps.appointments.models import DoctorWorkingHours
+from apps.users import backends
+from healthcare.benchmarking import percentile, scratch_database
+
+ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+}
+
+
+class Command(BaseCommand):
+    help = "Compare per-request queries and latency of the session tiers on an authenticated page (uses a scratch database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per configuration')
+
+    def handle(self, *args, **options):
+        # The page reads availability; keep it off the database as with Redis
+        availability.CACHE_ENABLED = True
+        with override_settings(ALLOWED_HOSTS=['testserver']), scratch_database():
+            patient, url = self.setup()
+            self.stdout.write(f"Database: {connection.vendor}, page: {url}")
+            self.stdout.write(f"{'Sessions':<10} {'Profile cache':<14} {'Queries':>8} {'Session':>8} {'p50':>9} {'p99':>9}")
+            for tier, engine in ENGINES.items():
+                for user_cache in (0, 300):
+                    backends.CACHE_TIMEOUT = user_cache
+                    cache.clear()
+                    with override_settings(SESSION_ENGINE=engine):
+                        self.run(tier, user_cache, patient, url, options['requests'])
+
+    def setup(self):
+        doctor = User.objects.create_user('bench_doctor', last_name='Bench')
+        doctor.profile.user_type = 'doctor'
+        doctor.profile.status = 'approved'
+        doctor.profile.save()
+        for weekday in range(7):
+            DoctorWorkingHours.objects.create(doctor=doctor, weekday=weekday, start_time=time(8, 0), end_time=time(18, 0))
+        patient = User.objects.create_user('bench_patient')
+        patient.profile.user_type = 'patient'
+        patient.profile.save()
+        day = (timezone.localdate() + timedelta(days=1)).isoformat()
+        return patient, f'/appointments/get-free-slots/{doctor.id}/?date={day}'
+
+    def run(self, tier, user_cache, patient, url, request_count):
+        client = Client()
+        client.force_login(patient)
+        # Warm the session, profile and availability caches
+        client.get(url)
+
+        latencies = []
+        queries = session_queries = 0
+        for _ in range(request_count):
+            with CaptureQueriesContext(connection) as captured:
+                started = perf_counter()
+                client.get(url)
+                latencies.append(perf_counter() - started)
+            queries += len(captured)
+            session_queries += sum(1 for query in captured if 'django_session' in query['sql'])
+
+        self.stdout.write(
+            f"{tier:<10} {'on' if user_cache else 'off':<14} {queries / request_count:>8.1f} "
+            f"{session_queries / request_count:>8.1f} {percentile(latencies, 0.5) * 1000:>7.2f}ms "
+            f"{percentile(latencies, 0.99) * 1000:>7.2f}ms"
+        )
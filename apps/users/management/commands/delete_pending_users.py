@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.users import deletion
+
+
+class Command(BaseCommand):
+    help = "Delete users whose deletion was requested but not carried out (recovery after a restart)"
+
+    def handle(self, *args, **options):
+        deleted = deletion.delete_pending()
+        self.stdout.write(f"{deleted} user(s) deleted.")
@@ -0,0 +1,197 @@
+import csv
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from multiprocessing import get_context
+from pathlib import Path
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+
+from apps.users import directory, stats
+from apps.users.forms import UserImportForm
+from apps.users.models import Profile
+
+FORMATS = ('csv', 'jsonl')
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        reader = csv.DictReader(source)
+        for row in reader:
+            yield reader.line_num, row, None
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as source:
+        for line, text in enumerate(source, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as error:
+                yield line, {}, f"Invalid JSON: {error}"
+                continue
+            if not isinstance(row, dict):
+                yield line, {}, "Expected a JSON object."
+                continue
+            yield line, row, None
+
+
+def form_errors(form):
+    errors = []
+    for field, messages in form.errors.items():
+        # The file has a single password column for the form's two fields
+        field = 'password' if field in ('password1', 'password2') else field
+        for message in messages:
+            error = message if field == '__all__' else f"{field}: {message}"
+            if error not in errors:
+                errors.append(error)
+    return '; '.join(errors)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users and their profiles from a CSV or JSONL file, validated with the registration "
+        "form's rules. Columns: username, email, password, first_name, last_name, user_type, phone, "
+        "specialization, license_number, experience, hospital_name"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or JSONL with one object per line')
+        parser.add_argument('--format', choices=FORMATS, help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users created per transaction')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help='Processes hashing passwords')
+        parser.add_argument('--approve-doctors', action='store_true',
+                            help='Import doctors as approved instead of pending approval')
+        parser.add_argument('--errors', help='Write rejected rows to this CSV file instead of stderr')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without creating anyone')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist.")
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise CommandError("Cannot tell the format from the extension; pass --format csv or --format jsonl.")
+        rows = read_csv(path) if file_format == 'csv' else read_jsonl(path)
+
+        self.approve_doctors = options['approve_doctors']
+        self.dry_run = options['dry_run']
+        self.created = self.rejected = 0
+        errors = open(options['errors'], 'w', newline='', encoding='utf-8') if options['errors'] else nullcontext(sys.stderr)
+        with errors as output:
+            self.report = csv.writer(output)
+            if options['workers'] <= 1 or self.dry_run:
+                self.hash_passwords = lambda passwords: list(map(make_password, passwords))
+                self.run(rows, options['batch_size'])
+            else:
+                # Hashing is deliberately slow and CPU bound, so it is spread over processes
+                with ProcessPoolExecutor(
+                    max_workers=options['workers'], mp_context=get_context('spawn'), initializer=django.setup,
+                ) as pool:
+                    self.hash_passwords = lambda passwords: list(
+                        pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (options['workers'] * 4)))
+                    )
+                    self.run(rows, options['batch_size'])
+
+        verb = 'would be imported' if self.dry_run else 'imported'
+        self.stdout.write(f"{self.created} user(s) {verb}, {self.rejected} row(s) rejected.")
+
+    def reject(self, line, username, errors):
+        if not self.rejected:
+            self.report.writerow(['line', 'username', 'errors'])
+        self.rejected += 1
+        self.report.writerow([line, username, errors])
+
+    def run(self, rows, batch_size):
+        seen = set()
+        chunk = []
+        for line, row, error in rows:
+            username = str(row.get('username') or '')
+            if error:
+                self.reject(line, username, error)
+                continue
+            password = row.get('password') or ''
+            form = UserImportForm(data={**row, 'password1': password, 'password2': password})
+            if not form.is_valid():
+                self.reject(line, username, form_errors(form))
+                continue
+            username = form.cleaned_data['username']
+            if username in seen:
+                self.reject(line, username, "username: Appears earlier in the file.")
+                continue
+            seen.add(username)
+            chunk.append((line, form.cleaned_data))
+            if len(chunk) >= batch_size:
+                self.flush(chunk)
+                chunk = []
+        if chunk:
+            self.flush(chunk)
+
+    def flush(self, chunk):
+        existing = set(User.objects.filter(
+            username__in=[data['username'] for line, data in chunk]
+        ).values_list('username', flat=True))
+        rows = []
+        for line, data in chunk:
+            if data['username'] in existing:
+                self.reject(line, data['username'], "username: A user with that username already exists.")
+            else:
+                rows.append((line, data))
+        if not rows:
+            return
+        if self.dry_run:
+            self.created += len(rows)
+            return
+
+        hashes = self.hash_passwords([data['password1'] for line, data in rows])
+        users = [
+            User(
+                username=data['username'], email=data['email'], password=password,
+                first_name=data['first_name'], last_name=data['last_name'],
+            )
+            for (line, data), password in zip(rows, hashes)
+        ]
+        try:
+            # bulk_create sends no post_save, so profiles are created here rather than by the signal
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                profiles = Profile.objects.bulk_create(
+                    [self.profile(user, data) for user, (line, data) in zip(users, rows)]
+                )
+        except DatabaseError as error:
+            for line, data in rows:
+                self.reject(line, data['username'], f"Not saved, the batch failed: {error}")
+            return
+        self.created += len(users)
+
+        # bulk_create also skips the signals that count users for the dashboard
+        # and invalidate the doctor directory
+        deltas = Counter(total_users=len(users))
+        for profile in profiles:
+            deltas.update(stats.profile_counters(profile.user_type, profile.status))
+        stats.adjust(deltas)
+        approved = {data['specialization'] for line, data in rows if data['user_type'] == 'doctor'}
+        if self.approve_doctors and approved:
+            directory.invalidate(approved)
+
+    def profile(self, user, data):
+        profile = Profile(user=user, user_type=data['user_type'], phone=data['phone'])
+        if data['user_type'] == 'doctor':
+            profile.specialization = data['specialization']
+            profile.license_number = data['license_number']
+            profile.experience = data['experience']
+            profile.hospital_name = data['hospital_name']
+            profile.status = 'approved' if self.approve_doctors else 'pending'
+        else:
+            profile.status = 'approved'
+        return profile
+
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.users import throttle
+
+
+class Command(BaseCommand):
+    help = "Show how many login attempts the throttle let through or rejected, and the hashing time it saved"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = throttle.stats()
+        self.stdout.write(f"Allowed attempts:   {stats['allowed']}")
+        self.stdout.write(f"Rejected attempts:  {stats['rejected']}")
+        self.stdout.write(f"Mean hash time:     {stats['mean_hash_ms']:.1f}ms")
+        self.stdout.write(f"CPU time saved:     {stats['saved_cpu_seconds']:.1f}s")
+        if options['reset']:
+            throttle.reset_stats()
+            self.stdout.write("Counters reset.")
@@ -0,0 +1,48 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions from the database in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sessions deleted per statement')
+        parser.add_argument('--daemon', action='store_true', help='Keep running and purge every --interval seconds')
+        parser.add_argument('--interval', type=int, default=3600, help='Seconds between purges in daemon mode')
+
+    def handle(self, *args, **options):
+        if not options['daemon']:
+            self.purge(options['batch_size'])
+            return
+
+        self.stdout.write(f"Purging expired sessions every {options['interval']}s")
+        try:
+            while True:
+                close_old_connections()
+                self.purge(options['batch_size'])
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Session cleaner stopped.")
+
+    def purge(self, batch_size):
+        now = timezone.now()
+        total = 0
+        while True:
+            # Index range scan on expire_date; short deletes keep locks brief
+            batch = list(
+                Session.objects.filter(expire_date__lt=now)
+                .order_by('expire_date')
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            total += Session.objects.filter(session_key__in=batch).delete()[0]
+            if len(batch) < batch_size:
+                break
+
+        if total:
+            self.stdout.write(f"{total} expired session(s) deleted.")
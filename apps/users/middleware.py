@@ -0,0 +1,25 @@
+from django.utils.functional import SimpleLazyObject
+
+from .models import Profile
+
+
+def get_profile(user):
+    """The profile of ``user``, or None for anonymous users and users without one."""
+    if not user.is_authenticated:
+        return None
+    try:
+        # Already loaded with the user by ProfileBackend
+        return user.profile
+    except Profile.DoesNotExist:
+        return None
+
+
+class ProfileMiddleware:
+    """Attach the user's profile to the request as ``request.profile``, loaded on first use"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_profile(request.user))
+        return self.get_response(request)
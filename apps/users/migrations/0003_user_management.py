@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+# auth_user belongs to django.contrib.auth, so its indexes for the admin user
+# list are plain SQL: keyset pages over (date_joined, id), with and without
+# the active filter, and case-insensitive prefix search on username and email.
+USER_INDEXES = {
+    'sqlite': [
+        "CREATE INDEX users_auth_joined_idx ON auth_user (date_joined, id)",
+        "CREATE INDEX users_auth_active_joined_idx ON auth_user (is_active, date_joined, id)",
+        # LIKE is case-insensitive on SQLite and range-scans NOCASE indexes
+        "CREATE INDEX users_auth_username_prefix_idx ON auth_user (username COLLATE NOCASE)",
+        "CREATE INDEX users_auth_email_prefix_idx ON auth_user (email COLLATE NOCASE)",
+    ],
+    'postgresql': [
+        "CREATE INDEX users_auth_joined_idx ON auth_user (date_joined, id)",
+        "CREATE INDEX users_auth_active_joined_idx ON auth_user (is_active, date_joined, id)",
+        # istartswith compiles to UPPER(column::text) LIKE UPPER(prefix) || '%'
+        "CREATE INDEX users_auth_username_prefix_idx ON auth_user (UPPER(username::text) text_pattern_ops)",
+        "CREATE INDEX users_auth_email_prefix_idx ON auth_user (UPPER(email::text) text_pattern_ops)",
+    ],
+}
+
+
+def create_user_indexes(apps, schema_editor):
+    for statement in USER_INDEXES.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_user_indexes(apps, schema_editor):
+    for statement in USER_INDEXES.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(f"DROP INDEX {statement.split()[2]}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_profile_experience_profile_hospital_name_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='deletion_requested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['user_type', 'status'], name='profile_role_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(condition=models.Q(('deletion_requested_at__isnull', False)), fields=['deletion_requested_at'], name='profile_deletion_idx'),
+        ),
+        migrations.RunPython(create_user_indexes, drop_user_indexes),
+    ]
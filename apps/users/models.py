@@ -37,11 +37,54 @@ class Profile(models.Model):
     
     bio = models.TextField(blank=True)
     
+    # Set when an admin deletes the user; the cascade runs in the background
+    deletion_requested_at = models.DateTimeField(null=True, blank=True)
+    
     class Meta:
         app_label = 'users'
+        indexes = [
+            # Role and status filters of the admin user list
+            models.Index(fields=['user_type', 'status'], name='profile_role_status_idx'),
+            models.Index(
+                fields=['deletion_requested_at'], name='profile_deletion_idx',
+                condition=models.Q(deletion_requested_at__isnull=False),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.user_type} - {self.status}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep the loaded values so signal handlers can see what changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def changed_fields(self):
+        """Names of the loaded fields whose value differs from what the database holds"""
+        loaded = getattr(self, '_loaded_values', {})
+        return [
+            field.attname for field in self._meta.concrete_fields
+            if field.attname in loaded and loaded[field.attname] != getattr(self, field.attname)
+        ]
+    
+    def save(self, *args, **kwargs):
+        # Existing rows only write the fields that changed, and nothing if none did
+        if not self._state.adding and hasattr(self, '_loaded_values') and 'update_fields' not in kwargs:
+            changed = self.changed_fields()
+            if not changed:
+                return
+            kwargs['update_fields'] = changed
+        super().save(*args, **kwargs)
+        # The saved values are now what the database holds
+        saved = self._meta.concrete_fields
+        if kwargs.get('update_fields') is not None:
+            saved = [self._meta.get_field(name) for name in kwargs['update_fields']]
+        self._loaded_values = {
+            **getattr(self, '_loaded_values', {}),
+            **{field.attname: getattr(self, field.attname) for field in saved if field.attname in self.__dict__},
+        }
+    
     def is_approved_doctor(self):
         return self.user_type == 'doctor' and self.status == 'approved'
\ No newline at end of file
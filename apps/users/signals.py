@@ -1,16 +1,72 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from .models import Profile
+from . import backends, directory, stats
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
 
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_doctor_directory(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    if instance.user_type != 'doctor' and loaded.get('user_type') != 'doctor':
+        return
+    directory.invalidate([instance.specialization, loaded.get('specialization')])
+
+@receiver(post_save, sender=User)
+def invalidate_doctor_name(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login, which the directory does not show
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    specializations = Profile.objects.filter(
+        user=instance, user_type='doctor'
+    ).values_list('specialization', flat=True)
+    if specializations:
+        directory.invalidate(specializations)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    backends.invalidate([instance.pk])
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile_user(sender, instance, **kwargs):
+    backends.invalidate([instance.user_id])
+
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
-    else:
-        Profile.objects.create(user=instance)
\ No newline at end of file
+def count_user(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust({'total_users': 1})
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    stats.adjust({'total_users': -1})
+
+def _profile_state(values):
+    if 'user_type' in values and 'status' in values:
+        return values['user_type'], values['status']
+    return None
+
+@receiver(post_save, sender=Profile)
+def count_profile(sender, instance, created, **kwargs):
+    new = (instance.user_type, instance.status)
+    if created:
+        stats.adjust(stats.profile_change(None, new))
+        return
+    old = _profile_state(getattr(instance, '_loaded_values', {}))
+    if old is None:
+        # Saved without a known previous state, so the counters cannot be moved
+        transaction.on_commit(stats.invalidate)
+    elif old != new:
+        stats.adjust(stats.profile_change(old, new))
+
+@receiver(post_delete, sender=Profile)
+def uncount_profile(sender, instance, **kwargs):
+    old = _profile_state(getattr(instance, '_loaded_values', {})) or (instance.user_type, instance.status)
+    stats.adjust(stats.profile_change(old, None))
@@ -0,0 +1,90 @@
+"""
+Cached user counters for the admin dashboard and the admin sidebar.
+
+The counters are computed by one conditional aggregation over users and
+their profiles and kept in the cache, one key per counter so that changes
+can be applied with the cache's atomic ``incr``. signals.py adjusts them
+when users and profiles are saved or deleted; the admin approval actions
+and ``import_users`` bypass signals and call ``adjust`` themselves.
+Adjustments run after the transaction commits and are dropped when the
+entry is not cached, since the next read recomputes it anyway.
+"""
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+# Any drift from a lost adjustment lasts at most this long
+CACHE_TIMEOUT = 60 * 60 * 24
+
+COUNTERS = {
+    'total_users': Q(),
+    'total_patients': Q(profile__user_type='patient'),
+    'total_doctors': Q(profile__user_type='doctor'),
+    'pending_doctors': Q(profile__user_type='doctor', profile__status='pending'),
+    'approved_doctors': Q(profile__user_type='doctor', profile__status='approved'),
+}
+
+
+def _key(name):
+    return f'user_stats:{name}'
+
+
+def get():
+    """The counters as a dict, computed in one query when any is missing from the cache."""
+    keys = {_key(name): name for name in COUNTERS}
+    cached = cache.get_many(list(keys))
+    if len(cached) == len(keys):
+        return {keys[key]: value for key, value in cached.items()}
+    counts = User.objects.aggregate(**{
+        name: Count('id', filter=condition) if condition else Count('id')
+        for name, condition in COUNTERS.items()
+    })
+    cache.set_many({_key(name): value for name, value in counts.items()}, CACHE_TIMEOUT)
+    return counts
+
+
+def profile_counters(user_type, status):
+    """The counters one profile in this state contributes to."""
+    if user_type == 'patient':
+        return Counter(total_patients=1)
+    if user_type == 'doctor':
+        counters = Counter(total_doctors=1)
+        if status in ('pending', 'approved'):
+            counters[f'{status}_doctors'] = 1
+        return counters
+    return Counter()
+
+
+def profile_change(old, new):
+    """Counter deltas for a profile moving from ``old`` to ``new`` (user_type, status) pairs, None when absent."""
+    deltas = Counter()
+    if new:
+        deltas.update(profile_counters(*new))
+    if old:
+        deltas.subtract(profile_counters(*old))
+    return deltas
+
+
+def _apply(deltas):
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(_key(name), delta)
+        except ValueError:
+            # Not cached; the next get() counts from scratch
+            pass
+
+
+def adjust(deltas):
+    """Apply counter deltas once the current transaction commits."""
+    deltas = Counter({name: delta for name, delta in deltas.items() if delta})
+    if deltas:
+        transaction.on_commit(lambda: _apply(deltas))
+
+
+def invalidate():
+    cache.delete_many([_key(name) for name in COUNTERS])
@@ -1,3 +1,205 @@
-from django.test import TestCase
+import pickle
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin, messages
+from django.contrib.auth import BACKEND_SESSION_KEY, authenticate
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from . import backends, stats, throttle
+from .models import Profile
+
+FAST_HASHER = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def make_user(username, user_type, status='approved', **fields):
+    user = User.objects.create_user(username=username, password='secret-pass-123', **fields)
+    user.profile.user_type = user_type
+    user.profile.status = status
+    user.profile.specialization = 'general' if user_type == 'doctor' else None
+    user.profile.save()
+    return user
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHER)
+class ProfileBackendTests(TestCase):
+    def setUp(self):
+        self.user = make_user('patient', 'patient')
+
+    def test_login_uses_profile_backend(self):
+        self.assertTrue(self.client.login(username='patient', password='secret-pass-123'))
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'apps.users.backends.ProfileBackend')
+
+    def test_sessions_from_model_backend_stay_logged_in(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_failed_password_is_hashed_once(self):
+        with mock.patch.object(ModelBackend, 'authenticate') as fallback:
+            self.assertIsNone(authenticate(username='patient', password='wrong'))
+            self.assertIsNone(authenticate(username='nobody', password='wrong'))
+        fallback.assert_not_called()
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHER)
+@mock.patch.object(backends, 'CACHE_TIMEOUT', 300)
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('patient', 'patient')
+        self.backend = backends.ProfileBackend()
+
+    def test_only_the_profile_is_cached(self):
+        self.backend.get_user(self.user.pk)
+        cached = cache.get(backends._cache_key(self.user.pk))
+        self.assertIsInstance(cached, Profile)
+        self.assertNotIn('user', cached._state.fields_cache)
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(cached))
+
+    def test_cached_profile_saves_the_join(self):
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(1) as captured:
+            user = self.backend.get_user(self.user.pk)
+            self.assertEqual(user.profile.user_type, 'patient')
+            self.assertIs(user.profile.user, user)
+        self.assertNotIn('JOIN', captured.captured_queries[0]['sql'])
+
+    def test_profile_changes_are_picked_up(self):
+        self.backend.get_user(self.user.pk)
+        profile = Profile.objects.get(user=self.user)
+        profile.status = 'rejected'
+        profile.save()
+        self.assertEqual(self.backend.get_user(self.user.pk).profile.status, 'rejected')
+
+    def test_password_change_ends_sessions_despite_the_cache(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('home')).wsgi_request.user, self.user)
+        # An update() sends no signal, so the cached profile survives it
+        User.objects.filter(pk=self.user.pk).update(password=make_password('new-pass-456'))
+        self.assertIsNotNone(cache.get(backends._cache_key(self.user.pk)))
+        self.assertFalse(self.client.get(reverse('home')).wsgi_request.user.is_authenticated)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHER)
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_user('patient', 'patient')
+        patcher = mock.patch.object(throttle, 'ENABLED', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def attempt(self, username='patient', password='wrong', **extra):
+        return self.client.post(reverse('login'), {'username': username, 'password': password}, **extra)
+
+    def test_burst_is_allowed_then_rejected_with_retry_after(self):
+        size, rate = throttle.IP_BUCKET
+        for number in range(size):
+            self.assertEqual(self.attempt(username=f'guess{number}').status_code, 200)
+        response = self.attempt()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(round(1 / rate)))
+        self.assertContains(response, 'Too many login attempts', status_code=429)
+
+    def test_rejected_attempt_is_not_checked(self):
+        for number in range(throttle.IP_BUCKET[0]):
+            self.attempt(username=f'guess{number}')
+        # Even the right password is turned away, and the session stays anonymous
+        response = self.attempt(password='secret-pass-123')
+        self.assertEqual(response.status_code, 429)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_username_bucket_spans_addresses(self):
+        size, rate = throttle.USERNAME_BUCKET
+        for number in range(size):
+            self.attempt(username='Patient', REMOTE_ADDR=f'10.0.0.{number}')
+        response = self.attempt(REMOTE_ADDR='10.0.1.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(round(1 / rate)))
+
+    def test_proxy_header_is_ignored_unless_trusted(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_REAL_IP='203.0.113.9')
+        with mock.patch.object(throttle, 'IP_HEADER', ''):
+            self.assertEqual(throttle.client_ip(request), '10.0.0.1')
+        with mock.patch.object(throttle, 'IP_HEADER', 'HTTP_X_REAL_IP'):
+            self.assertEqual(throttle.client_ip(request), '203.0.113.9')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHER)
+class StatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_user('patient', 'patient')
+        self.pending = [make_user(f'doctor{number}', 'doctor', status='pending') for number in range(3)]
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass-123')
+
+    def recounted(self):
+        stats.invalidate()
+        return stats.get()
+
+    def test_approving_doctors_moves_the_counters(self):
+        before = stats.get()
+        self.assertEqual(before['pending_doctors'], 3)
+
+        profile_admin = admin.site._registry[Profile]
+        with self.captureOnCommitCallbacks(execute=True):
+            profile_admin.set_doctor_status(
+                Profile.objects.filter(user__in=self.pending[:2]), 'approved',
+            )
+
+        counts = stats.get()
+        self.assertEqual(counts['pending_doctors'], 1)
+        self.assertEqual(counts['approved_doctors'], 2)
+        self.assertEqual(counts['total_doctors'], 3)
+        self.assertEqual(counts, self.recounted())
+
+    def test_rejecting_doctors_leaves_only_the_totals(self):
+        stats.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.site._registry[Profile].set_doctor_status(Profile.objects.filter(user=self.pending[0]), 'rejected')
+        counts = stats.get()
+        self.assertEqual((counts['pending_doctors'], counts['approved_doctors'], counts['total_doctors']), (2, 0, 3))
+        self.assertEqual(counts, self.recounted())
+
+    def test_deactivating_users_keeps_the_counters_exact(self):
+        before = stats.get()
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin_user_management'), {
+                'action': 'deactivate', 'user_ids': [user.id for user in self.pending],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(User.objects.filter(id__in=[user.id for user in self.pending], is_active=True).exists())
+        self.assertEqual(stats.get(), before)
+        self.assertEqual(stats.get(), self.recounted())
+
+    def test_new_users_are_counted(self):
+        stats.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_user('second', 'patient')
+        counts = stats.get()
+        self.assertEqual((counts['total_users'], counts['total_patients']), (6, 2))
+        self.assertEqual(counts, self.recounted())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHER)
+class UserManagementTests(TestCase):
+    def setUp(self):
+        self.patient = make_user('patient', 'patient')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass-123'))
+
+    def test_delete_reports_success(self):
+        with mock.patch('apps.users.deletion.background.submit'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('admin_user_management'), {'action': 'delete', 'user_id': self.patient.id}, follow=True,
+                )
+        [message] = response.context['messages']
+        self.assertEqual(message.level, messages.SUCCESS)
+        self.assertEqual(str(message), '1 user(s) deactivated and queued for deletion.')
+        self.assertFalse(User.objects.get(pk=self.patient.pk).is_active)
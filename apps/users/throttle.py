@@ -0,0 +1,112 @@
+"""
+Token-bucket throttle for password logins.
+
+Every login attempt runs a full password hash, so a burst of guesses can
+occupy every web worker. ``check`` is called before the login form is
+validated and takes one token from the bucket of the client IP and one from
+the bucket of the normalized username; when either is empty the attempt is
+rejected without hashing. Buckets live in the shared cache, so the limits
+hold across workers. The read-modify-write of a bucket is not atomic, which
+at worst lets a few simultaneous attempts through beyond the limit.
+
+Counters of allowed and rejected attempts, and of the time spent hashing
+the allowed ones, are kept in the cache for ``login_throttle_stats``.
+"""
+import hashlib
+import math
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+
+ENABLED = getattr(settings, 'LOGIN_THROTTLE_ENABLED', True)
+
+# (burst size, tokens regained per second)
+IP_BUCKET = getattr(settings, 'LOGIN_THROTTLE_IP_BUCKET', (5, 5 / 60))
+USERNAME_BUCKET = getattr(settings, 'LOGIN_THROTTLE_USERNAME_BUCKET', (5, 5 / 300))
+
+# request.META key holding the client address set by the reverse proxy; only
+# read when every request is known to pass through that proxy
+IP_HEADER = (
+    getattr(settings, 'LOGIN_THROTTLE_IP_HEADER', '')
+    if getattr(settings, 'LOGIN_THROTTLE_TRUST_PROXY', False) else ''
+)
+
+STATS_KEYS = ('allowed', 'rejected', 'hash_ms')
+
+
+def _stats_key(name):
+    return f'login_throttle:stats:{name}'
+
+
+def client_ip(request):
+    return (IP_HEADER and request.META.get(IP_HEADER)) or request.META.get('REMOTE_ADDR', '')
+
+
+def normalize_username(username):
+    # Usernames are stored lower-cased, so case variants are the same account
+    return unicodedata.normalize('NFKC', username or '').strip().lower()
+
+
+def _bucket_keys(request, username):
+    digest = hashlib.sha256(normalize_username(username).encode()).hexdigest()
+    return {
+        f'login_throttle:ip:{client_ip(request)}': IP_BUCKET,
+        f'login_throttle:user:{digest}': USERNAME_BUCKET,
+    }
+
+
+def _refill(state, size, rate, now):
+    tokens, updated = state if state else (size, now)
+    return min(size, tokens + (now - updated) * rate)
+
+
+def check(request, username):
+    """
+    Take a token for a login attempt from both buckets.
+
+    Returns None when the attempt may go ahead, otherwise the number of
+    seconds until it would be allowed (nothing is taken in that case).
+    """
+    if not ENABLED:
+        return None
+    buckets = _bucket_keys(request, username)
+    now = time.time()
+    states = cache.get_many(list(buckets))
+    tokens = {key: _refill(states.get(key), *bucket, now) for key, bucket in buckets.items()}
+
+    waits = [(1 - tokens[key]) / rate for key, (size, rate) in buckets.items() if tokens[key] < 1]
+    if waits:
+        record('rejected')
+        return math.ceil(max(waits))
+
+    for key, (size, rate) in buckets.items():
+        # An untouched bucket is full again after size / rate seconds
+        cache.set(key, (tokens[key] - 1, now), math.ceil(size / rate))
+    record('allowed')
+    return None
+
+
+def record(name, amount=1):
+    key = _stats_key(name)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, amount, None)
+
+
+def stats():
+    """Counters since the last reset, with the hashing time the rejections saved."""
+    values = cache.get_many([_stats_key(name) for name in STATS_KEYS])
+    counts = {name: values.get(_stats_key(name), 0) for name in STATS_KEYS}
+    hash_ms = counts['hash_ms'] / counts['allowed'] if counts['allowed'] else 0
+    counts['mean_hash_ms'] = hash_ms
+    counts['saved_cpu_seconds'] = counts['rejected'] * hash_ms / 1000
+    return counts
+
+
+def reset_stats():
+    cache.delete_many([_stats_key(name) for name in STATS_KEYS])
@@ -1,9 +1,19 @@
+import time
+
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import authenticate, login
+from django.db.models import Q
+from healthcare.pagination import approximate_count, keyset_paginate
 from .forms import CustomUserCreationForm, CustomAuthenticationForm  # Import custom form
 from .models import Profile
+from .middleware import get_profile
+from . import backends, deletion, stats, throttle
+
+# Dashboards show the most recent rows; the list pages paginate the rest
+DASHBOARD_ITEMS = 10
+USER_PAGE_SIZE = 50
 
 # Add the home view function
 def home(request):
@@ -31,12 +41,28 @@ def custom_login(request):
         # Use CustomAuthenticationForm with request.POST data
         form = CustomAuthenticationForm(request, data=request.POST)
         
-        if form.is_valid():
+        # Turn away excess attempts before the form hashes the password
+        retry_after = throttle.check(request, request.POST.get('username'))
+        if retry_after is not None:
+            # An unbound form, as validating the bound one would hash the password
+            form = CustomAuthenticationForm(request, initial={'username': request.POST.get('username', '')})
+            messages.error(request, f'Too many login attempts. Please try again in {retry_after} seconds.')
+            response = render(request, 'registration/login.html', {'form': form}, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+        
+        started = time.perf_counter()
+        valid = form.is_valid()
+        throttle.record('hash_ms', round((time.perf_counter() - started) * 1000))
+        
+        if valid:
             # Authentication successful
             user = form.get_user()
             
             # Check if user is a doctor pending approval
-            if hasattr(user, 'profile') and user.profile.user_type == 'doctor' and user.profile.status == 'pending':
+            # The profile was loaded with the user by ProfileBackend
+            profile = get_profile(user)
+            if profile and profile.user_type == 'doctor' and profile.status == 'pending':
                 # Add error to form instead of using messages
                 form.add_error(None, 'Your account is pending admin approval. Please wait for approval.')
                 return render(request, 'registration/login.html', {'form': form})
@@ -53,9 +79,8 @@ def custom_login(request):
 
 @login_required
 def dashboard(request):
-    try:
-        profile = Profile.objects.get(user=request.user)
-    except Profile.DoesNotExist:
+    profile = request.profile
+    if not profile:
         # Create a profile if it doesn't exist
         profile = Profile.objects.create(
             user=request.user,
@@ -69,8 +94,10 @@ def dashboard(request):
         from apps.appointments.models import Appointment
         from apps.reports.models import MedicalReport
         
-        appointments = Appointment.objects.filter(patient=request.user)
-        reports = MedicalReport.objects.filter(patient=request.user)
+        appointments = Appointment.objects.filter(
+            patient=request.user, status__in=['scheduled', 'confirmed']
+        ).select_related('doctor')[:DASHBOARD_ITEMS]
+        reports = MedicalReport.objects.filter(patient=request.user).defer('extracted_text')[:5]
         
         context = {
             'appointments': appointments,
@@ -81,8 +108,12 @@ def dashboard(request):
         from apps.appointments.models import Appointment
         from apps.reports.models import MedicalReport
         
-        appointments = Appointment.objects.filter(doctor=request.user)
-        shared_reports = MedicalReport.objects.filter(shared_with=request.user)
+        appointments = Appointment.objects.filter(
+            doctor=request.user, status__in=['scheduled', 'confirmed']
+        ).select_related('patient')[:DASHBOARD_ITEMS]
+        shared_reports = MedicalReport.objects.filter(
+            shared_with=request.user
+        ).select_related('patient', 'doctor_response').defer('extracted_text')[:DASHBOARD_ITEMS]
         context = {
             'appointments': appointments,
             'shared_reports': shared_reports,
@@ -98,27 +129,19 @@ from django.contrib.auth.models import User
 @staff_member_required
 def admin_dashboard(request):
     """Custom admin dashboard"""
-    # Get statistics
-    total_users = User.objects.count()
-    total_patients = Profile.objects.filter(user_type='patient').count()
-    total_doctors = Profile.objects.filter(user_type='doctor').count()
-    pending_doctors = Profile.objects.filter(user_type='doctor', status='pending').count()
-    approved_doctors = Profile.objects.filter(user_type='doctor', status='approved').count()
+    # Counters come from the stats cache; only a miss queries the database
+    counters = stats.get()
     
     # Get recent pending doctors
-    pending_doctor_list = Profile.objects.filter(user_type='doctor', status='pending').select_related('user')
-    
-    # Get recent users
-    recent_users = User.objects.order_by('-date_joined')[:10]
+    pending_doctor_list = []
+    if counters['pending_doctors']:
+        pending_doctor_list = Profile.objects.filter(
+            user_type='doctor', status='pending'
+        ).select_related('user').order_by('-user__date_joined')[:DASHBOARD_ITEMS]
     
     context = {
-        'total_users': total_users,
-        'total_patients': total_patients,
-        'total_doctors': total_doctors,
-        'pending_doctors': pending_doctors,
-        'approved_doctors': approved_doctors,
+        **counters,
         'pending_doctor_list': pending_doctor_list,
-        'recent_users': recent_users,
     }
     return render(request, 'admin/dashboard.html', context)
 
@@ -158,32 +181,65 @@ def admin_doctor_approvals(request):
 @staff_member_required
 def admin_user_management(request):
     """Manage all users"""
-    users = User.objects.all().select_related('profile').order_by('-date_joined')
-    
     if request.method == 'POST':
-        user_id = request.POST.get('user_id')
         action = request.POST.get('action')
+        user_ids = [
+            value for value in request.POST.getlist('user_ids') + [request.POST.get('user_id', '')]
+            if value.isdigit()
+        ]
         
-        try:
-            user = User.objects.get(id=user_id)
-            if action == 'deactivate':
-                user.is_active = False
-                user.save()
-                messages.warning(request, f'User {user.username} has been deactivated.')
-            elif action == 'activate':
-                user.is_active = True
-                user.save()
-                messages.success(request, f'User {user.username} has been activated.')
-            elif action == 'delete':
-                user.delete()
-                messages.error(request, f'User {user.username} has been deleted.')
-        except User.DoesNotExist:
-            messages.error(request, 'User not found.')
+        if not user_ids:
+            messages.error(request, 'Select at least one user.')
+        elif action in ('activate', 'deactivate'):
+            is_active = action == 'activate'
+            # One UPDATE for the whole selection; staff and users being deleted are left alone
+            changed = User.objects.filter(id__in=user_ids, is_staff=False).exclude(
+                is_active=is_active
+            ).exclude(profile__deletion_requested_at__isnull=False).update(is_active=is_active)
+            backends.invalidate(user_ids)
+            if is_active:
+                messages.success(request, f'{changed} user(s) activated.')
+            else:
+                messages.warning(request, f'{changed} user(s) deactivated.')
+        elif action == 'delete':
+            scheduled = deletion.request_deletion(user_ids)
+            messages.success(request, f'{scheduled} user(s) deactivated and queued for deletion.')
+        else:
+            messages.error(request, 'Invalid action.')
         
-        return redirect('admin_user_management')
+        # Back to the same filtered page
+        return redirect(request.get_full_path())
+    
+    users = User.objects.select_related('profile')
+    role = request.GET.get('role', '')
+    status = request.GET.get('status', '')
+    active = request.GET.get('active', '')
+    query = request.GET.get('q', '').strip()
+    if role in dict(Profile.USER_TYPES):
+        users = users.filter(profile__user_type=role)
+    if status in dict(Profile.STATUS_CHOICES):
+        users = users.filter(profile__status=status)
+    if active in ('yes', 'no'):
+        users = users.filter(is_active=active == 'yes')
+    if query:
+        # Prefix matches only, so the username and email indexes can be used
+        users = users.filter(Q(username__istartswith=query) | Q(email__istartswith=query))
+    
+    page = keyset_paginate(users, 'date_joined', request.GET.get('cursor'), page_size=USER_PAGE_SIZE)
+    page_query = request.GET.copy()
+    page_query.pop('cursor', None)
     
     context = {
-        'users': users,
+        'users': page,
+        'page': page,
+        'page_query': page_query.urlencode(),
+        'total': approximate_count(users),
+        'role': role,
+        'status': status,
+        'active': active,
+        'query': query,
+        'user_types': Profile.USER_TYPES,
+        'status_choices': Profile.STATUS_CHOICES,
     }
     return render(request, 'admin/user_management.html', context)
 
@@ -202,7 +258,7 @@ def admin_appointments(request):
 def admin_reports(request):
     """View all medical reports"""
     from apps.reports.models import MedicalReport
-    reports = MedicalReport.objects.all().select_related('patient', 'shared_with').order_by('-uploaded_at')
+    reports = MedicalReport.objects.all().select_related('patient', 'shared_with').defer('extracted_text').order_by('-uploaded_at')
     
     context = {
         'reports': reports,
@@ -1,7 +1,7 @@
-from apps.users.models import Profile
+from apps.users import stats
 
 def admin_context(request):
     if request.user.is_authenticated and request.user.is_staff:
-        pending_count = Profile.objects.filter(user_type='doctor', status='pending').count()
+        pending_count = stats.get()['pending_doctors']
         return {'pending_count': pending_count}
     return {}
\ No newline at end of file
@@ -0,0 +1,31 @@
+"""
+Thread pool shared by work that should not hold up a response.
+
+Tasks run in the web process once the view has returned, so anything
+submitted here must also be recoverable by a management command: a restart
+drops whatever was still queued.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+WORKERS = getattr(settings, 'BACKGROUND_WORKERS', 2)
+
+_executor = None
+
+
+def _run(fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # Connections are per thread; do not leave idle ones to the pool threads
+        connections.close_all()
+
+
+def submit(fn, *args, **kwargs):
+    """Run ``fn(*args, **kwargs)`` on the shared pool and return its future."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='background')
+    return _executor.submit(_run, fn, args, kwargs)
@@ -0,0 +1,38 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks never touch the configured database: ``scratch_database`` creates
+a throwaway test database (a temporary file for SQLite so that worker
+threads share it) and destroys it afterwards.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def scratch_database():
+    settings_dict = connection.settings_dict
+    temp_dir = None
+    if connection.vendor == 'sqlite':
+        temp_dir = tempfile.mkdtemp(prefix='bench-')
+        settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(temp_dir, 'bench.sqlite3')
+        # Let concurrent writers queue on the database lock instead of failing
+        settings_dict.setdefault('OPTIONS', {}).update({'timeout': 60, 'transaction_mode': 'IMMEDIATE'})
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if temp_dir:
+            os.rmdir(temp_dir)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
@@ -0,0 +1,123 @@
+"""
+Keyset (cursor) pagination for the per-user list pages.
+
+Pages are read with ``WHERE (key, id) < (last key, last id) ORDER BY key
+DESC, id DESC LIMIT n + 1`` so every page costs the same index range scan
+no matter how deep into the history it is, unlike OFFSET pagination.
+
+Totals for large lists come from ``approximate_count``, which never counts
+more than ``COUNT_LIMIT`` rows.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 20
+COUNT_LIMIT = 10000
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, is_first):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(value, pk):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (datetime, pk) or None for a missing or tampered cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        value = parse_datetime(value)
+        if value is None:
+            return None
+        return value, int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_paginate(queryset, key, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return the page of ``queryset`` after ``cursor``, newest ``key`` first.
+
+    ``key`` is a datetime field; ``id`` breaks ties so the order is total.
+    The queryset should be backed by an index on (filter columns, key, id).
+    """
+    position = decode_cursor(cursor)
+    if position:
+        value, pk = position
+        queryset = queryset.filter(Q(**{f'{key}__lt': value}) | Q(**{key: value, 'id__lt': pk}))
+
+    rows = list(queryset.order_by(f'-{key}', '-id')[:page_size + 1])
+    items = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, key), last.pk)
+    return KeysetPage(items, next_cursor, is_first=position is None)
+
+
+class ApproximateCount:
+    """A row count that may be a planner estimate or a lower bound."""
+
+    def __init__(self, value, estimated=False, truncated=False):
+        self.value = value
+        self.estimated = estimated
+        self.truncated = truncated
+
+    def __int__(self):
+        return self.value
+
+    def __str__(self):
+        if self.estimated:
+            return f'~{self.value:,}'
+        return f'{self.value:,}+' if self.truncated else f'{self.value:,}'
+
+
+def _planner_estimate(queryset):
+    plan = json.loads(queryset.explain(format='json'))
+    if isinstance(plan, list):
+        plan = plan[0]
+    return int(plan['Plan']['Plan Rows'])
+
+
+def approximate_count(queryset, limit=COUNT_LIMIT):
+    """
+    Count ``queryset`` exactly up to ``limit`` rows.
+
+    Beyond that PostgreSQL reports the planner's estimate and other
+    databases report ``limit`` as a lower bound, so a page over a large
+    table never pays for a full COUNT(*).
+    """
+    queryset = queryset.order_by()
+    if connections[queryset.db].vendor == 'postgresql':
+        estimate = _planner_estimate(queryset)
+        if estimate > limit:
+            return ApproximateCount(estimate, estimated=True)
+    count = queryset.values('pk')[:limit + 1].count()
+    if count > limit:
+        return ApproximateCount(limit, truncated=True)
+    return ApproximateCount(count)
@@ -68,6 +68,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.users.middleware.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -111,6 +112,63 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Caches
+# A shared Redis cache keeps per-process caches (availability bitmaps etc.)
+# consistent across gunicorn workers; local memory is fine for development.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Doctors' slot bitmaps are cached for the whole booking window and refreshed
+# by signals in the process that made the change, so only a shared cache
+# keeps every worker's view of availability current.
+AVAILABILITY_CACHE_ENABLED = os.getenv('AVAILABILITY_CACHE_ENABLED', '1' if REDIS_URL else '0').lower() in ['1', 'true', 'yes']
+
+# Session users are loaded with their profile in one query. With a shared
+# cache the profile is kept there between requests (signals invalidate it on
+# every change) and only the user row is read; users, and so their password
+# hashes, are never cached. Local memory caches cannot be invalidated across
+# processes, so they don't.
+# ModelBackend stays listed so sessions created before ProfileBackend keep
+# resolving instead of being logged out; ProfileBackend alone checks passwords.
+AUTHENTICATION_BACKENDS = [
+    'apps.users.backends.ProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', '300' if REDIS_URL else '0'))
+
+# Sessions: 'db' keeps them in django_session only; 'cached_db' also keeps
+# them in the cache, written through to the database, so authenticated
+# requests skip the session SELECT. Like the user cache it needs a shared
+# cache. Expired rows are deleted by the purge_sessions command.
+SESSION_TIER = os.getenv('SESSION_TIER', 'cached_db' if REDIS_URL else 'db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+}[SESSION_TIER]
+
+# Login attempts are throttled per client IP and per username before the
+# password is hashed. The client IP is REMOTE_ADDR unless the app only ever
+# receives requests through a proxy that overwrites the header below (the
+# nginx in docker-compose.prod.yml sets X-Real-IP); anywhere else clients
+# could forge it and get a fresh bucket on every attempt. The buckets need a
+# shared cache, or each worker enforces its own limit.
+LOGIN_THROTTLE_ENABLED = os.getenv('LOGIN_THROTTLE_ENABLED', '1').lower() in ['1', 'true', 'yes']
+LOGIN_THROTTLE_TRUST_PROXY = os.getenv('LOGIN_THROTTLE_TRUST_PROXY', '0').lower() in ['1', 'true', 'yes']
+LOGIN_THROTTLE_IP_HEADER = os.getenv('LOGIN_THROTTLE_IP_HEADER', 'HTTP_X_REAL_IP')
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -133,10 +191,44 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # For production
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are hashed and sniffed while they stream in (see apps/reports/uploads.py)
+FILE_UPLOAD_HANDLERS = [
+    'apps.reports.uploads.FingerprintMemoryFileUploadHandler',
+    'apps.reports.uploads.FingerprintTemporaryFileUploadHandler',
+]
+
+# Report files are served by views that check access. Behind nginx the
+# transfer is handed off via X-Accel-Redirect to this internal location;
+# leave it empty to let Django stream files itself (development).
+PROTECTED_MEDIA_ACCEL_PREFIX = os.getenv('PROTECTED_MEDIA_ACCEL_PREFIX', '' if DEBUG else '/protected-media/')
+
+# Lifetime of presigned URLs when media lives in S3
+PROTECTED_MEDIA_URL_SECONDS = 300
+
 # WhiteNoise configuration for static files
 if not DEBUG:
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Appointment slots
+APPOINTMENT_SLOT_MINUTES = 30
+
+# Default weekly template (0 = Monday) for doctors without their own working hours
+APPOINTMENT_WORKING_HOURS = {
+    weekday: [('09:00', '13:00'), ('14:00', '18:00')] for weekday in range(6)
+}
+
+# Response PDFs: 'inline' renders within the download request, 'background'
+# queues a job for the render_pdfs worker and lets the client poll for it
+PDF_RENDER_MODE = os.getenv('PDF_RENDER_MODE', 'inline')
+
+# Threads per web process for post-response work such as report text extraction
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '2'))
+
+# Processes each bulk PDF export starts to render PDFs that are not stored
+# yet. They exist only while that export runs, so the peak is this many per
+# concurrent export on top of the web workers; 0 renders in the web worker.
+PDF_EXPORT_WORKERS = int(os.getenv('PDF_EXPORT_WORKERS', '2'))
+
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'home'
 
@@ -154,9 +246,22 @@ AWS_S3_REGION_NAME = os.getenv('AWS_S3_REGION_NAME', 'us-east-1')
 AWS_S3_FILE_OVERWRITE = False
 AWS_DEFAULT_ACL = None
 AWS_S3_VERIFY = True
+AWS_S3_SIGNATURE_VERSION = 's3v4'
+# Point at MinIO (or moto's server) to run against a local S3 stand-in
+AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL') or None
+
+# Use S3 for media files when a bucket is configured, local disk otherwise
+STORAGES = {
+    'default': {
+        'BACKEND': 'storages.backends.s3.S3Storage' if AWS_STORAGE_BUCKET_NAME
+        else 'django.core.files.storage.FileSystemStorage',
+    },
+    # Static files remain locally for now
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
 
-# Use S3 for media files
-DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
-
-# Static files remain locally for now
-STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+# With S3 storage, browsers upload report files straight to the bucket
+# through presigned POSTs instead of streaming them through gunicorn
+REPORT_DIRECT_UPLOADS = os.getenv('REPORT_DIRECT_UPLOADS', '1').lower() in ['1', 'true', 'yes']
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from .pagination import approximate_count, decode_cursor, encode_cursor, keyset_paginate
+
+
+class CursorTests(TestCase):
+    def test_round_trip(self):
+        value = timezone.now().replace(microsecond=123456)
+        self.assertEqual(decode_cursor(encode_cursor(value, 42)), (value, 42))
+
+    def test_missing_or_tampered_cursor_is_ignored(self):
+        for cursor in (None, '', 'not-base64!', encode_cursor('yesterday', 1), encode_cursor(timezone.now().isoformat(), 'x')):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+
+
+class KeysetPaginateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        joined = timezone.now()
+        # Pairs of users share a timestamp, so pages must break ties on id
+        for number in range(7):
+            User.objects.create(username=f'user{number}', date_joined=joined - timedelta(minutes=number // 2))
+
+    def pages(self, page_size):
+        cursor, pages = None, []
+        while True:
+            page = keyset_paginate(User.objects.all(), 'date_joined', cursor, page_size=page_size)
+            pages.append(page)
+            if not page.has_next:
+                return pages
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = list(User.objects.order_by('-date_joined', '-id'))
+        for page_size in (1, 2, 3, 7, 10):
+            with self.subTest(page_size=page_size):
+                pages = self.pages(page_size)
+                self.assertEqual([user for page in pages for user in page], expected)
+                self.assertEqual(len(pages), max(1, -(-len(expected) // page_size)))
+                self.assertTrue(pages[0].is_first)
+                self.assertFalse(any(page.is_first for page in pages[1:]))
+
+    def test_tampered_cursor_starts_over(self):
+        page = keyset_paginate(User.objects.all(), 'date_joined', 'garbage', page_size=3)
+        self.assertTrue(page.is_first)
+        self.assertEqual(list(page), list(User.objects.order_by('-date_joined', '-id')[:3]))
+
+    def test_approximate_count(self):
+        self.assertEqual(str(approximate_count(User.objects.all())), '7')
+        truncated = approximate_count(User.objects.all(), limit=5)
+        self.assertEqual((int(truncated), str(truncated)), (5, '5+'))
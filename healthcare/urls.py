@@ -1,7 +1,5 @@
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 from django.views.generic import RedirectView
 
 from apps.users import views as user_views
@@ -15,4 +13,4 @@ urlpatterns = [
     path('users/', include('apps.users.urls')),
     path('appointments/', include('apps.appointments.urls')),
     path('reports/', include('apps.reports.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+]
\ No newline at end of file